@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, Union
 
+import stats
+
 class SymbolicResultError(Exception):
     """Raised when evaluation hits a symbolic variable and cannot return a number."""
     def __init__(self, node):
         self.node = node
+        if stats.enabled:
+            stats.current.symbolic_errors += 1
 
 class Op(enum.Enum):
     ADD = '+'
@@ -19,30 +23,71 @@ class Op(enum.Enum):
     RPAREN = ')'
     COMMA = ','
 
-Expr = Union['Literal', 'Operator', 'UnaryOp', 'Diff', 'Variable']
+Expr = Union['Literal', 'Operator', 'UnaryOp', 'Diff', 'Variable', 'Let']
+
+class _Node:
+    # Gives the slotted node classes a weak reference slot, so hashcons can
+    # intern them; dataclass(weakref_slot=True) would need Python 3.11.
+    __slots__ = ('__weakref__',)
 
-@dataclass(frozen=True)
-class Variable:
+@dataclass(frozen=True, slots=True)
+class Variable(_Node):
     name: str
     def __repr__(self): return f"{self.name}"
 
-@dataclass(frozen=True)
-class Diff:
+@dataclass(frozen=True, slots=True)
+class Diff(_Node):
     expression: Expr
     var: str = 'x'
+    order: int = 1
+    _hash: int = field(default=None, init=False, repr=False, compare=False)
+
+    def __repr__(self):
+        if self.order == 1:
+            return f"Diff({self.expression}, {self.var})"
+        return f"Diff({self.expression}, {self.var}, {self.order})"
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not Diff:
+            return NotImplemented
+        return self.var == other.var and self.order == other.order and self.expression == other.expression
 
-    def __repr__(self): return f"Diff({self.expression}, {self.var})"
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash((Diff, self.expression, self.var, self.order)))
+        return self._hash
 
-@dataclass(frozen=True)
-class UnaryOp:
+    def __reduce__(self):
+        return (Diff, (self.expression, self.var, self.order))
+
+@dataclass(frozen=True, slots=True)
+class UnaryOp(_Node):
     op: Op
     operand: Expr
+    _hash: int = field(default=None, init=False, repr=False, compare=False)
 
     def __repr__(self):
         return f"{self.op.value}({self.operand})"
 
-@dataclass(frozen=True)
-class Literal:
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not UnaryOp:
+            return NotImplemented
+        return self.op == other.op and self.operand == other.operand
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash((UnaryOp, self.op, self.operand)))
+        return self._hash
+
+    def __reduce__(self):
+        return (UnaryOp, (self.op, self.operand))
+
+@dataclass(frozen=True, slots=True)
+class Literal(_Node):
     value: Union[int, float]
 
     def __repr__(self):
@@ -53,16 +98,49 @@ class Literal:
             return self.value == other.value
         return self.value == other
 
-@dataclass(frozen=True)
-class Operator:
+@dataclass(frozen=True, slots=True)
+class Operator(_Node):
     op: Op
     left: Expr
     right: Expr
+    _hash: int = field(default=None, init=False, repr=False, compare=False)
 
     def __repr__(self):
         return f"({self.left} {self.op.value} {self.right})"
 
-AST_NODE_TYPES = (Literal, Operator, UnaryOp, Diff, Variable)
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not Operator:
+            return NotImplemented
+        return self.op == other.op and self.left == other.left and self.right == other.right
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash((Operator, self.op, self.left, self.right)))
+        return self._hash
+
+    def __reduce__(self):
+        # The cached hash depends on per-process string hashing, so never pickle it.
+        return (Operator, (self.op, self.left, self.right))
+
+@dataclass(frozen=True, slots=True)
+class Let(_Node):
+    """Named temporaries followed by the expression that uses them.
+
+    `bindings` is a tuple of (name, expression) pairs; each expression may refer
+    to the names bound before it, and `body` may refer to all of them.
+    """
+    bindings: tuple
+    body: Expr
+
+    def __repr__(self):
+        if not self.bindings:
+            return f"{self.body}"
+        where = ", ".join(f"{name} = {value}" for name, value in self.bindings)
+        return f"{self.body} where {where}"
+
+AST_NODE_TYPES = (Literal, Operator, UnaryOp, Diff, Variable, Let)
 
 def eval(expression):
     if isinstance(expression, Literal):
@@ -106,18 +184,170 @@ def eval(expression):
             elif expression.op == Op.EXPONENT:
                 return left_val ** right_val
         else:
-            new_left = left_val if isinstance(left_val, Expr) else Literal(left_val)
-            new_right = right_val if isinstance(right_val, Expr) else Literal(right_val)
+            new_left = left_val if isinstance(left_val, AST_NODE_TYPES) else Literal(left_val)
+            new_right = right_val if isinstance(right_val, AST_NODE_TYPES) else Literal(right_val)
 
             raise SymbolicResultError(Operator(expression.op, new_left, new_right))
         
     elif isinstance(expression, Diff):
-        from symbolic import differentiate, simplify
-
-        derivative_tree = differentiate(expression.expression, expression.var)
-        simplified_tree = simplify(derivative_tree)
+        simplified_tree = _nth_derivative(expression.expression, expression.var, expression.order)
 
         raise SymbolicResultError(simplified_tree)
 
+    elif isinstance(expression, Let):
+        result = partial_eval(expression)
+        if isinstance(result, AST_NODE_TYPES):
+            raise SymbolicResultError(result)
+        return result
+
+    raise TypeError(f"Unknown expression type: {type(expression)}")
+
+
+def _nth_derivative(node, var_name, order):
+    # symbolic imports this module, so it is loaded on the first Diff rather than
+    # up front; after that this name is rebound to symbolic.nth_derivative itself.
+    global _nth_derivative
+    from symbolic import nth_derivative
+    _nth_derivative = nth_derivative
+    return nth_derivative(node, var_name, order)
+
+def partial_eval(expression, env=None):
+    """Evaluate as far as possible without raising for symbolic variables.
+
+    Variables bound in `env` (to numbers or expressions) are substituted in.
+    Returns a number when the result is fully numeric, otherwise the residual
+    expression. Subtrees that do not change are returned as the same objects.
+    """
+    return _partial_eval(expression, env or {})
+
+def _partial_eval(expression, env):
+    if isinstance(expression, Literal):
+        return expression.value
+
+    if isinstance(expression, Variable):
+        value = env.get(expression.name, expression)
+        return value.value if isinstance(value, Literal) else value
+
+    if isinstance(expression, UnaryOp):
+        val = _partial_eval(expression.operand, env)
+        if isinstance(val, AST_NODE_TYPES):
+            if val is expression.operand:
+                return expression
+            return UnaryOp(expression.op, val)
+        if expression.op == Op.SUBTRACT:
+            return -val
+        return val
+
+    if isinstance(expression, Operator):
+        left_val = _partial_eval(expression.left, env)
+        right_val = _partial_eval(expression.right, env)
+
+        if isinstance(left_val, AST_NODE_TYPES) or isinstance(right_val, AST_NODE_TYPES):
+            new_left = _as_node(left_val, expression.left)
+            new_right = _as_node(right_val, expression.right)
+            if new_left is expression.left and new_right is expression.right:
+                return expression
+            return Operator(expression.op, new_left, new_right)
+
+        if expression.op == Op.ADD:
+            return left_val + right_val
+        elif expression.op == Op.SUBTRACT:
+            return left_val - right_val
+        elif expression.op == Op.MULTIPLY:
+            return left_val * right_val
+        elif expression.op == Op.DIVIDE:
+            if right_val == 0:
+                raise ZeroDivisionError("Cannot divide by zero.")
+            return left_val / right_val
+        elif expression.op == Op.EXPONENT:
+            return left_val ** right_val
+
+    if isinstance(expression, Diff):
+        # Other bindings may be expressions in the differentiation variable, so
+        # substitute them before differentiating and bind the variable itself after.
+        inner_env = {name: value for name, value in env.items() if name != expression.var}
+        inner = _partial_eval(expression.expression, inner_env) if inner_env else expression.expression
+        if not isinstance(inner, AST_NODE_TYPES):
+            return 0.0
+
+        derivative = _nth_derivative(inner, expression.var, expression.order)
+        return _partial_eval(derivative, env)
+
+    if isinstance(expression, Let):
+        if _contains_diff(expression):
+            # A Diff must see the expression behind a temporary, not its name.
+            from cse import expand
+            return _partial_eval(expand(expression), env)
+
+        # Numeric temporaries are folded into the body; symbolic ones stay bound.
+        scope = dict(env)
+        residual = []
+        for name, value in expression.bindings:
+            value = _partial_eval(value, scope)
+            if isinstance(value, AST_NODE_TYPES):
+                residual.append((name, value))
+                scope[name] = Variable(name)
+            else:
+                scope[name] = value
+
+        body = _partial_eval(expression.body, scope)
+        if not isinstance(body, AST_NODE_TYPES):
+            return body
+
+        # Folding can leave temporaries the body no longer refers to; keep only
+        # those it still needs, directly or through later temporaries.
+        needed = _variable_names(body)
+        kept = []
+        for name, value in reversed(residual):
+            if name in needed:
+                kept.append((name, value))
+                needed |= _variable_names(value)
+        if not kept:
+            return body
+        return Let(tuple(reversed(kept)), body)
+
     raise TypeError(f"Unknown expression type: {type(expression)}")
 
+def _variable_names(node):
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Variable):
+            names.add(node.name)
+        elif isinstance(node, UnaryOp):
+            stack.append(node.operand)
+        elif isinstance(node, Operator):
+            stack.extend((node.left, node.right))
+        elif isinstance(node, Diff):
+            stack.append(node.expression)
+        elif isinstance(node, Let):
+            stack.append(node.body)
+            stack.extend(value for _, value in node.bindings)
+    return names
+
+def _contains_diff(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Diff):
+            return True
+        if isinstance(node, UnaryOp):
+            stack.append(node.operand)
+        elif isinstance(node, Operator):
+            stack.extend((node.left, node.right))
+        elif isinstance(node, Let):
+            stack.append(node.body)
+            stack.extend(value for _, value in node.bindings)
+    return False
+
+def _as_node(value, original):
+    # Literal children evaluate to their own value object, so they can be reused too.
+    if value is original or (isinstance(original, Literal) and value is original.value):
+        return original
+    return value if isinstance(value, AST_NODE_TYPES) else Literal(value)
+
+def subs(expression, bindings):
+    """Substitute `bindings` into `expression` and fold, always returning an expression."""
+    result = _partial_eval(expression, bindings)
+    return result if isinstance(result, AST_NODE_TYPES) else Literal(result)
@@ -1,4 +1,5 @@
 import unittest
+import weakref
 
 from ast_eval import *
 
@@ -41,6 +42,54 @@ class TestASTEval(unittest.TestCase):
         expected_expr = Operator(Op.MULTIPLY, Literal(2), expr2)
         self.assertEqual(eval(expected_expr), 2)
 
+    def test_nodes_are_slotted_and_weakly_referenceable(self):
+        x = Variable('x')
+        for node in (x, Literal(1), UnaryOp(Op.SUBTRACT, x), Operator(Op.ADD, x, x), Diff(x), Let((), x)):
+            self.assertFalse(hasattr(node, '__dict__'))
+            self.assertIs(weakref.ref(node)(), node)
+
+
+class TestPartialEval(unittest.TestCase):
+
+    def test_numeric_expression_returns_number(self):
+        expr = Operator(Op.MULTIPLY, Literal(3), Operator(Op.ADD, Literal(1), Literal(2)))
+        self.assertEqual(partial_eval(expr), 9)
+
+    def test_unbound_variable_returns_residual(self):
+        expr = Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(2), Literal(3)), Variable('x'))
+        self.assertEqual(partial_eval(expr), Operator(Op.ADD, Literal(6), Variable('x')))
+
+    def test_bound_variables_are_folded(self):
+        expr = Operator(Op.ADD, Operator(Op.MULTIPLY, Variable('x'), Variable('y')), Literal(1))
+        self.assertEqual(partial_eval(expr, {'x': 2, 'y': 5}), 11)
+        self.assertEqual(partial_eval(expr, {'x': 2}),
+                         Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(2), Variable('y')), Literal(1)))
+
+    def test_unchanged_subtrees_are_reused(self):
+        symbolic = Operator(Op.EXPONENT, Variable('x'), Literal(2))
+        expr = Operator(Op.ADD, symbolic, Operator(Op.MULTIPLY, Literal(2), Literal(3)))
+        result = partial_eval(expr)
+        self.assertIs(result.left, symbolic)
+        self.assertIs(partial_eval(symbolic), symbolic)
+
+    def test_diff_is_differentiated_then_bound(self):
+        expr = Diff(Operator(Op.EXPONENT, Variable('x'), Literal(2)), 'x')
+        self.assertEqual(partial_eval(expr, {'x': 3}), 6)
+
+    def test_diff_substitutes_other_bindings_first(self):
+        expr = Diff(Operator(Op.MULTIPLY, Variable('a'), Literal(3)), 'x')
+        bindings = {'a': Operator(Op.EXPONENT, Variable('x'), Literal(2)), 'x': 2}
+        self.assertEqual(partial_eval(expr, bindings), 12)
+
+    def test_divide_by_zero_still_raises(self):
+        with self.assertRaises(ZeroDivisionError):
+            partial_eval(Operator(Op.DIVIDE, Variable('x'), Literal(0)), {'x': 1})
+
+    def test_subs_returns_expression(self):
+        expr = Operator(Op.SUBTRACT, Variable('x'), Variable('y'))
+        self.assertEqual(subs(expr, {'x': 4, 'y': 1}), Literal(3))
+        self.assertEqual(subs(expr, {'y': Variable('z')}), Operator(Op.SUBTRACT, Variable('x'), Variable('z')))
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
\ No newline at end of file
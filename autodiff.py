@@ -0,0 +1,262 @@
+import math
+
+from ast_eval import *
+from cse import expand
+from symbolic import free_variables, nth_derivative
+
+_ADD, _SUBTRACT, _MULTIPLY, _DIVIDE, _EXPONENT, _NEGATE, _CONSTANT = range(7)
+
+_OPCODES = {
+    Op.ADD: _ADD,
+    Op.SUBTRACT: _SUBTRACT,
+    Op.MULTIPLY: _MULTIPLY,
+    Op.DIVIDE: _DIVIDE,
+    Op.EXPONENT: _EXPONENT,
+}
+
+class Tape:
+    """A flat forward tape of an expression for reverse-mode differentiation.
+
+    Slots 0..len(variables)-1 hold the variable values, followed by one slot
+    per instruction. Each instruction is a tuple (opcode, a, b, varying_b)
+    reading slots a and b and writing the next slot; constant loads read
+    self.constants[a] instead.
+    """
+    def __init__(self, node, variables=None):
+        if variables is None:
+            variables = sorted(free_variables(node))
+        self.variables = tuple(variables)
+        self.constants = []
+        self.instructions = []
+
+        self._slots = {}
+        self._varying = [True] * len(self.variables)
+        self.output = self._record(node)
+
+        del self._slots, self._varying
+
+    def _record(self, node):
+        if isinstance(node, Variable):
+            if node.name not in self.variables:
+                raise ValueError(f"Variable '{node.name}' is not one of {self.variables}")
+            return self.variables.index(node.name)
+
+        if isinstance(node, Diff):
+            return self._record(nth_derivative(node.expression, node.var, node.order))
+
+        if isinstance(node, Let):
+            # Expanding shares each temporary's tree, so it is still recorded once.
+            return self._record(expand(node))
+
+        key = (node.__class__, repr(node.value)) if isinstance(node, Literal) else node
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+
+        if isinstance(node, Literal):
+            self.constants.append(node.value)
+            self.instructions.append((_CONSTANT, len(self.constants) - 1, 0, False))
+            slot = self._new_slot(False)
+
+        elif isinstance(node, UnaryOp):
+            operand = self._record(node.operand)
+            if node.op != Op.SUBTRACT:
+                return operand
+            slot = self._emit(_NEGATE, operand, operand)
+
+        elif isinstance(node, Operator):
+            if node.op not in _OPCODES:
+                raise ValueError(f"Cannot record operator: {node.op}")
+            left = self._record(node.left)
+            right = self._record(node.right)
+            slot = self._emit(_OPCODES[node.op], left, right)
+
+        else:
+            raise TypeError(f"Unknown expression type: {type(node)}")
+
+        self._slots[key] = slot
+        return slot
+
+    def _new_slot(self, varying):
+        self._varying.append(varying)
+        return len(self._varying) - 1
+
+    def _emit(self, opcode, a, b):
+        self.instructions.append((opcode, a, b, self._varying[b]))
+        return self._new_slot(self._varying[a] or self._varying[b])
+
+    def _forward(self, inputs):
+        values = list(inputs)
+        constants = self.constants
+        append = values.append
+
+        for opcode, a, b, _ in self.instructions:
+            if opcode == _CONSTANT:
+                append(constants[a])
+                continue
+
+            x = values[a]
+            y = values[b]
+            if opcode == _ADD:
+                append(x + y)
+            elif opcode == _SUBTRACT:
+                append(x - y)
+            elif opcode == _MULTIPLY:
+                append(x * y)
+            elif opcode == _DIVIDE:
+                if y == 0:
+                    raise ZeroDivisionError("Cannot divide by zero.")
+                append(x / y)
+            elif opcode == _EXPONENT:
+                append(x ** y)
+            else:
+                append(-x)
+        return values
+
+    def _backward(self, values):
+        adjoints = [0.0] * len(values)
+        adjoints[self.output] = 1.0
+        first = len(self.variables)
+
+        for index in range(len(self.instructions) - 1, -1, -1):
+            g = adjoints[first + index]
+            if not g:
+                continue
+
+            opcode, a, b, varying_b = self.instructions[index]
+            if opcode == _CONSTANT:
+                continue
+
+            x = values[a]
+            y = values[b]
+            if opcode == _ADD:
+                adjoints[a] += g
+                adjoints[b] += g
+            elif opcode == _SUBTRACT:
+                adjoints[a] += g
+                adjoints[b] -= g
+            elif opcode == _MULTIPLY:
+                adjoints[a] += g * y
+                adjoints[b] += g * x
+            elif opcode == _DIVIDE:
+                adjoints[a] += g / y
+                adjoints[b] -= g * x / (y * y)
+            elif opcode == _EXPONENT:
+                # d(u^0)/du is 0, even at u = 0 where y * x ** (y - 1) would divide by zero.
+                if y != 0:
+                    adjoints[a] += g * y * x ** (y - 1)
+                # d(u^v)/dv = u^v * ln(u); only needed when the exponent varies, and
+                # 0 wherever u^v is. A negative base has no real logarithm.
+                if varying_b:
+                    power = values[first + index]
+                    if power:
+                        adjoints[b] += g * power * (math.log(x) if x > 0 else math.nan)
+            else:
+                adjoints[a] -= g
+
+        return adjoints[:len(self.variables)]
+
+    def _inputs(self, env):
+        missing = [name for name in self.variables if name not in env]
+        if missing:
+            raise ValueError(f"No value bound for variable '{missing[0]}'")
+        return [env[name] for name in self.variables]
+
+    def value(self, env):
+        return self._forward(self._inputs(env))[self.output]
+
+    def gradient(self, env):
+        """Return (value, {variable: partial derivative}) at the point `env`."""
+        values = self._forward(self._inputs(env))
+        partials = self._backward(values)
+        return values[self.output], dict(zip(self.variables, partials))
+
+    def gradient_batch(self, points):
+        """Value and gradient at many points at once, replaying the tape over numpy arrays.
+
+        `points` maps each variable to an array (or scalar) of values, which are
+        broadcast together. Returns (values, {variable: partials}) as arrays of
+        the broadcast shape. As in vectorised.evaluate_batch, division by zero
+        gives NaN in the affected elements instead of raising.
+        """
+        import numpy as np
+
+        columns = [np.asarray(column, dtype=float) for column in self._inputs(points)]
+        shape = np.broadcast_shapes(*(column.shape for column in columns))
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            values = self._forward_arrays(np, columns)
+            partials = self._backward_arrays(np, values)
+
+        def full(array):
+            return np.broadcast_to(array, shape).astype(float, copy=True)
+        return full(values[self.output]), {name: full(partial) for name, partial in zip(self.variables, partials)}
+
+    def _forward_arrays(self, np, columns):
+        values = list(columns)
+        append = values.append
+
+        for opcode, a, b, _ in self.instructions:
+            if opcode == _CONSTANT:
+                append(np.float64(self.constants[a]))
+                continue
+
+            x = values[a]
+            y = values[b]
+            if opcode == _ADD:
+                append(x + y)
+            elif opcode == _SUBTRACT:
+                append(x - y)
+            elif opcode == _MULTIPLY:
+                append(x * y)
+            elif opcode == _DIVIDE:
+                append(np.where(y == 0, np.nan, x / y))
+            elif opcode == _EXPONENT:
+                append(np.where((x == 0) & (y < 0), np.nan, np.power(x, y)))
+            else:
+                append(-x)
+        return values
+
+    def _backward_arrays(self, np, values):
+        # None marks a slot nothing has flowed back to yet.
+        adjoints = [None] * len(values)
+        adjoints[self.output] = np.float64(1.0)
+        first = len(self.variables)
+
+        def add(slot, term):
+            adjoints[slot] = term if adjoints[slot] is None else adjoints[slot] + term
+
+        for index in range(len(self.instructions) - 1, -1, -1):
+            g = adjoints[first + index]
+            opcode, a, b, varying_b = self.instructions[index]
+            if g is None or opcode == _CONSTANT:
+                continue
+
+            x = values[a]
+            y = values[b]
+            if opcode == _ADD:
+                add(a, g)
+                add(b, g)
+            elif opcode == _SUBTRACT:
+                add(a, g)
+                add(b, -g)
+            elif opcode == _MULTIPLY:
+                add(a, g * y)
+                add(b, g * x)
+            elif opcode == _DIVIDE:
+                add(a, g / y)
+                add(b, -g * x / (y * y))
+            elif opcode == _EXPONENT:
+                # The same guards as _backward, applied elementwise.
+                add(a, np.where(y == 0, 0.0, g * y * np.power(x, y - 1)))
+                if varying_b:
+                    power = values[first + index]
+                    add(b, np.where(power == 0, 0.0, g * power * np.log(x)))
+            else:
+                add(a, -g)
+
+        return [0.0 if adjoint is None else adjoint for adjoint in adjoints[:first]]
+
+def gradient(node, env):
+    """Value and gradient of `node` at `env` via a one-off tape."""
+    return Tape(node, sorted(env)).gradient(env)
@@ -0,0 +1,106 @@
+import importlib.util
+import math
+import unittest
+
+from ast_eval import *
+from autodiff import *
+from frontend import compile
+from symbolic import grad
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+
+class TestAutodiff(unittest.TestCase):
+
+    def assertMatchesSymbolic(self, text, env):
+        expr = compile(text)
+        value, partials = Tape(expr, sorted(env)).gradient(env)
+        self.assertAlmostEqual(value, partial_eval(expr, env))
+        for name, partial in zip(sorted(env), grad(expr, sorted(env))):
+            self.assertAlmostEqual(partials[name], partial_eval(partial, env))
+
+    def test_value_and_gradient_of_polynomial(self):
+        value, partials = gradient(compile("x ^ 2 * y + 3 * y"), {'x': 2.0, 'y': 5.0})
+        self.assertEqual(value, 35.0)
+        self.assertEqual(partials, {'x': 20.0, 'y': 7.0})
+
+    def test_matches_symbolic_path(self):
+        self.assertMatchesSymbolic("x * y / (x + z) - -(z ^ 3)", {'x': 1.5, 'y': -2.0, 'z': 0.25})
+        self.assertMatchesSymbolic("(x - y) ^ -2 + x / y", {'x': 3.0, 'y': 0.5})
+
+    def test_shared_subtrees_are_recorded_once(self):
+        tape = Tape(compile("(x + 1) * (x + 1)"))
+        self.assertEqual(len(tape.instructions), 3)
+        self.assertEqual(tape.gradient({'x': 2.0}), (9.0, {'x': 6.0}))
+
+    def test_handles_non_constant_exponents(self):
+        value, partials = gradient(compile("x ^ y"), {'x': 2.0, 'y': 3.0})
+        self.assertEqual(value, 8.0)
+        self.assertAlmostEqual(partials['x'], 12.0)
+        self.assertAlmostEqual(partials['y'], 8.0 * math.log(2.0))
+
+    def test_constant_exponent_of_negative_base(self):
+        self.assertEqual(gradient(compile("x ^ 3"), {'x': -2.0}), (-8.0, {'x': 12.0}))
+
+    def test_expands_diff_nodes(self):
+        self.assertEqual(gradient(compile("diff(x ^ 3)"), {'x': 2.0}), (12.0, {'x': 12.0}))
+
+    def test_zero_exponent_at_zero(self):
+        self.assertEqual(gradient(compile("x ^ 0"), {'x': 0.0}), (1.0, {'x': 0.0}))
+        self.assertEqual(gradient(compile("x ^ y"), {'x': 0.0, 'y': 0.0})[1]['x'], 0.0)
+
+    def test_varying_exponent_of_zero_or_negative_base(self):
+        self.assertEqual(gradient(compile("x ^ y"), {'x': 0.0, 'y': 2.0}), (0.0, {'x': 0.0, 'y': 0.0}))
+        value, partials = gradient(compile("x ^ y"), {'x': -2.0, 'y': 2.0})
+        self.assertEqual((value, partials['x']), (4.0, -4.0))
+        self.assertTrue(math.isnan(partials['y']))
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_batched_points(self):
+        tape = Tape(compile("x * y"))
+        values, partials = tape.gradient_batch({'x': [1.0, 2.0, 3.0], 'y': [4.0, 5.0, 6.0]})
+        self.assertEqual(values.tolist(), [4.0, 10.0, 18.0])
+        self.assertEqual({name: partial.tolist() for name, partial in partials.items()},
+                         {'x': [4.0, 5.0, 6.0], 'y': [1.0, 2.0, 3.0]})
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_batch_matches_pointwise_gradients(self):
+        tape = Tape(compile("x * y / (x + y) - x ^ y + (x - 1) ^ 0"))
+        xs, ys = [0.5, 1.0, 2.0, 3.0], [2.0, -1.5, 0.25, 3.0]
+        values, partials = tape.gradient_batch({'x': xs, 'y': ys})
+        for i, point in enumerate(zip(xs, ys)):
+            value, expected = tape.gradient(dict(zip('xy', point)))
+            self.assertAlmostEqual(values[i], value)
+            for name in 'xy':
+                self.assertAlmostEqual(partials[name][i], expected[name])
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_batch_negative_power_of_zero_is_nan(self):
+        values, _ = Tape(compile("x ^ -1 + 0 ^ y")).gradient_batch({'x': [0.0, 2.0], 'y': [1.0, -1.0]})
+        self.assertTrue(math.isnan(values[0]))
+        self.assertTrue(math.isnan(values[1]))
+        values, _ = Tape(compile("x ^ -1")).gradient_batch({'x': [0.0, 2.0]})
+        self.assertTrue(math.isnan(values[0]))
+        self.assertEqual(values[1], 0.5)
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_batch_broadcasts_and_guards(self):
+        values, partials = Tape(compile("x ^ y + 1 / x")).gradient_batch({'x': [0.0, -2.0, 1.0], 'y': 0.0})
+        self.assertEqual(values.shape, (3,))
+        self.assertTrue(math.isnan(values[0]))
+        self.assertEqual(values[1:].tolist(), [0.5, 2.0])
+        self.assertEqual(partials['x'][1:].tolist(), [-0.25, -1.0])
+        self.assertTrue(math.isnan(partials['y'][1]))
+        self.assertEqual(partials['y'][2], 0.0)
+
+    def test_unbound_variable_raises(self):
+        with self.assertRaises(ValueError):
+            Tape(compile("x + y")).gradient({'x': 1.0})
+
+    def test_divide_by_zero_raises(self):
+        with self.assertRaises(ZeroDivisionError):
+            gradient(compile("1 / x"), {'x': 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
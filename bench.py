@@ -0,0 +1,211 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from ast_eval import *
+from parser import Parser
+from symbolic import clear_caches, differentiate, simplify
+from tokeniser import Tokeniser
+
+_BINARY_OPS = ['+', '-', '*', '/', '^']
+
+def generate_expression(rng, depth, variables):
+    """Random expression text with nesting up to `depth` over `variables`."""
+    if depth <= 0 or rng.random() < 0.2:
+        if rng.random() < 0.5:
+            return rng.choice(variables)
+        return str(rng.randint(1, 9))
+
+    if rng.random() < 0.1:
+        return f"-{generate_expression(rng, depth - 1, variables)}"
+
+    op = rng.choice(_BINARY_OPS)
+    left = generate_expression(rng, depth - 1, variables)
+    if op == '^':
+        # Keep exponents constant so every expression can be differentiated.
+        return f"({left}) ^ {rng.randint(2, 4)}"
+    right = generate_expression(rng, depth - 1, variables)
+    return f"({left} {op} {right})"
+
+def generate_chain(rng, length, variables, op):
+    """A long product or quotient of small factors, the worst case for differentiate."""
+    factors = [f"({rng.choice(variables)} + {rng.randint(1, 9)})" for _ in range(length)]
+    return f" {op} ".join(factors)
+
+def generate_corpus(size=200, depth=8, variable_count=3, chain_length=30, seed=0):
+    rng = random.Random(seed)
+    variables = [f"x{i}" if i else "x" for i in range(variable_count)]
+
+    corpus = [generate_expression(rng, depth, variables) for _ in range(size)]
+    corpus.append(generate_chain(rng, chain_length, variables, '*'))
+    corpus.append(generate_chain(rng, chain_length, variables, '/'))
+    return corpus
+
+def generate_long_expression(size, distinct_literals=False, seed=0):
+    """One flat sum of products about `size` characters long, for tokeniser throughput.
+
+    Literals are single digits unless `distinct_literals`, when nearly every one
+    is spelled differently and so becomes its own Literal.
+    """
+    rng = random.Random(seed)
+    terms, length = [], 0
+    while length < size:
+        literal = f"{rng.random() * 1000:.{rng.randint(1, 6)}f}" if distinct_literals else str(rng.randint(1, 9))
+        if terms:
+            length += 3
+        terms.append(f"{literal} * x{rng.randint(0, 50)}")
+        length += len(terms[-1])
+    return " + ".join(terms)
+
+def tokenise_throughput(size=3500000, repeat=3, seed=0):
+    """Best time for Tokeniser.tokenise on one long expression, with repeated and with distinct literals."""
+    results = {}
+    for name, distinct in (('repeated-literals', False), ('distinct-literals', True)):
+        text = generate_long_expression(size, distinct, seed)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = Tokeniser(text).tokenise()
+            best = min(best, time.perf_counter() - start)
+        results[name] = {
+            'bytes': len(text),
+            'tokens': len(tokens),
+            'seconds': best,
+            'megabytes_per_second': len(text) / best / 1e6 if best else None,
+        }
+    return results
+
+def _each(function):
+    """Apply `function` to every item, recording None where the generated input is invalid arithmetic."""
+    def apply(items):
+        results = []
+        for item in items:
+            try:
+                results.append(function(item))
+            except SymbolicResultError as e:
+                results.append(e.node)
+            except (ZeroDivisionError, OverflowError):
+                results.append(None)
+        return results
+    return apply
+
+def _measure(function, argument, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        result = function(argument)
+        best = min(best, time.perf_counter() - start)
+
+    clear_caches()
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, best, peak
+
+def run(corpus, repeat=3):
+    """Time each pipeline stage separately over `corpus` and return a results dict."""
+    stages = {}
+
+    def record(name, function, argument, items):
+        result, seconds, peak = _measure(function, argument, repeat)
+        stages[name] = {
+            'items': items,
+            'seconds': seconds,
+            'per_second': items / seconds if seconds else None,
+            'peak_bytes': peak,
+        }
+        return result
+
+    tokens = record('tokenise', lambda texts: [Tokeniser(text).tokenise() for text in texts],
+                    corpus, len(corpus))
+    asts = record('parse', lambda streams: [Parser(stream).parse() for stream in streams],
+                  tokens, len(tokens))
+    record('eval', _each(eval), asts, len(asts))
+    record('partial_eval', _each(partial_eval), asts, len(asts))
+    derivatives = record('differentiate', _each(lambda tree: differentiate(tree, 'x')), asts, len(asts))
+    record('simplify', _each(simplify), derivatives, len(derivatives))
+
+    return {'stages': stages}
+
+def compare(baseline, current, threshold=0.1):
+    """Return (stage, metric, baseline, current) tuples that regressed by more than `threshold`."""
+    regressions = []
+    for stage, before in baseline['stages'].items():
+        after = current['stages'].get(stage)
+        if after is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if after[metric] > before[metric] * (1 + threshold):
+                regressions.append((stage, metric, before[metric], after[metric]))
+    return regressions
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark each stage of the calculator pipeline")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmark and write JSON results")
+    run_parser.add_argument('--size', type=int, default=200, help="number of random expressions")
+    run_parser.add_argument('--depth', type=int, default=8, help="maximum nesting depth")
+    run_parser.add_argument('--variables', type=int, default=3, help="number of distinct variables")
+    run_parser.add_argument('--chain', type=int, default=30, help="length of the product and quotient chains")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=3, help="timing runs per stage; the best is kept")
+    run_parser.add_argument('--output', help="file to write JSON results to (default: stdout)")
+
+    tokenise_parser = commands.add_parser('tokenise', help="measure tokeniser throughput on one long expression")
+    tokenise_parser.add_argument('--size', type=int, default=3500000, help="length of the expression in characters")
+    tokenise_parser.add_argument('--repeat', type=int, default=3, help="timing runs; the best is kept")
+    tokenise_parser.add_argument('--seed', type=int, default=0)
+
+    compare_parser = commands.add_parser('compare', help="flag regressions against a saved baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="allowed relative slowdown or memory growth (default 0.1)")
+
+    args = arg_parser.parse_args(argv)
+
+    if args.command == 'run':
+        config = {name: getattr(args, name) for name in ('size', 'depth', 'variables', 'chain', 'seed', 'repeat')}
+        corpus = generate_corpus(args.size, args.depth, args.variables, args.chain, args.seed)
+        results = {'config': config, **run(corpus, args.repeat)}
+
+        text = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+
+        for stage, result in results['stages'].items():
+            # A stage too quick for the timer has no meaningful rate.
+            rate = "n/a" if result['per_second'] is None else f"{result['per_second']:.0f}"
+            print(f"{stage:>14}: {result['seconds'] * 1000:9.2f} ms "
+                  f"{rate:>12}/s {result['peak_bytes'] / 1024:10.1f} KiB", file=sys.stderr)
+        return 0
+
+    if args.command == 'tokenise':
+        print(json.dumps(tokenise_throughput(args.size, args.repeat, args.seed), indent=2))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    for stage, metric, before, after in regressions:
+        change = f"{after / before - 1:+.1%}" if before else "zero baseline"
+        print(f"REGRESSION {stage} {metric}: {before:.6g} -> {after:.6g} ({change})")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from bench import *
+from parser import Parser
+from tokeniser import Tokeniser
+
+
+class TestBench(unittest.TestCase):
+
+    def test_corpus_is_reproducible(self):
+        self.assertEqual(generate_corpus(size=20, seed=3), generate_corpus(size=20, seed=3))
+        self.assertNotEqual(generate_corpus(size=20, seed=3), generate_corpus(size=20, seed=4))
+
+    def test_corpus_parses(self):
+        for text in generate_corpus(size=20, depth=4, variable_count=2, chain_length=5):
+            Parser(Tokeniser(text).tokenise()).parse()
+
+    def test_run_reports_every_stage(self):
+        results = run(generate_corpus(size=5, depth=3, chain_length=3), repeat=1)
+        self.assertEqual(list(results['stages']),
+                         ['tokenise', 'parse', 'eval', 'partial_eval', 'differentiate', 'simplify'])
+        for stage in results['stages'].values():
+            self.assertEqual(stage['items'], 7)
+            self.assertGreater(stage['peak_bytes'], 0)
+
+    def test_tokenise_throughput(self):
+        self.assertEqual(len(generate_long_expression(1000)), len(generate_long_expression(1000)))
+        results = tokenise_throughput(size=2000, repeat=1)
+        self.assertEqual(list(results), ['repeated-literals', 'distinct-literals'])
+        for result in results.values():
+            self.assertGreaterEqual(result['bytes'], 2000)
+            self.assertGreater(result['tokens'], 200)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'stages': {'parse': {'seconds': 1.0, 'peak_bytes': 100}}}
+        current = {'stages': {'parse': {'seconds': 1.5, 'peak_bytes': 105}}}
+        self.assertEqual(compare(baseline, current, threshold=0.1), [('parse', 'seconds', 1.0, 1.5)])
+        self.assertEqual(compare(baseline, current, threshold=0.6), [])
+
+    def test_compare_reports_zero_baselines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name, seconds in (('baseline', 0.0), ('current', 0.5)):
+                paths.append(os.path.join(directory, name + '.json'))
+                with open(paths[-1], 'w') as f:
+                    json.dump({'stages': {'eval': {'seconds': seconds, 'peak_bytes': 10}}}, f)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                self.assertEqual(main(['compare', *paths]), 1)
+        self.assertEqual(stdout.getvalue(), "REGRESSION eval seconds: 0 -> 0.5 (zero baseline)\n")
+
+    def test_run_prints_placeholder_for_untimeable_stages(self):
+        stages = {'stages': {'eval': {'items': 1, 'seconds': 0.0, 'per_second': None, 'peak_bytes': 1024}}}
+        stderr = io.StringIO()
+        with unittest.mock.patch('bench.run', return_value=stages), \
+                contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+            self.assertEqual(main(['run', '--size', '1']), 0)
+        self.assertEqual(stderr.getvalue().split(), ['eval:', '0.00', 'ms', 'n/a/s', '1.0', 'KiB'])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,47 @@
+import unittest
+
+from cache import *
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_can_store_and_fetch(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.info(), CacheInfo(hits=1, misses=1, maxsize=2, currsize=1))
+        self.assertEqual(cache.hit_rate(), 0.5)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_resize_evicts_oldest(self):
+        cache = LRUCache(maxsize=3)
+        for key in 'abc':
+            cache.put(key, key)
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn('c', cache)
+
+    def test_zero_size_disables_storage(self):
+        cache = LRUCache(maxsize=0)
+        cache.put('a', 1)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,252 @@
+from functools import lru_cache
+from numbers import Number
+
+from ast_eval import Diff, Let, Literal, Op, Operator, UnaryOp, Variable
+from cse import expand
+
+# A canonical sum is a dict mapping monomials to numeric coefficients, where
+# a monomial is a sorted tuple of (atom, exponent) pairs and () is the constant
+# term. Atoms are variables, Diff nodes, symbolic powers, and sums that could
+# not be distributed; they are stored in canonical node form themselves, so
+# equal atoms compare and hash equal.
+#
+# Cancelling a divisor, as in x * y / x, would remove the division by zero at
+# x = 0, so the cancelled atom is kept as a guard factor (x / x): 1 wherever
+# the original is defined, and still dividing by zero where it is not. For the
+# same reason a term that could divide by zero is kept with coefficient 0 when
+# it cancels or is multiplied by 0, so 0 / x stays (0.0 / x) rather than 0.
+
+_ONE = 1.0
+_MAX_PASSES = 10
+
+def canonicalize(node):
+    """Rewrite `node` into canonical n-ary form, repeating until it stops changing.
+
+    Sums and products are flattened and sorted, like terms are collected with
+    their coefficients, and powers of the same base are merged; a divisor that
+    cancels leaves a guard factor such as (x / x) behind. A Let is expanded
+    first, since collecting terms can cut across its temporaries.
+    """
+    if isinstance(node, Let):
+        node = expand(node)
+    for _ in range(_MAX_PASSES):
+        result = _build_sum(_to_sum(node))
+        if result == node:
+            break
+        node = result
+    return result
+
+def build(terms):
+    """Build the canonical node for a coefficient map of monomials (see above)."""
+    return _build_sum({monomial: coefficient for monomial, coefficient in terms.items() if coefficient != 0})
+
+def _constant(value):
+    return {(): value} if value != 0 else {}
+
+def _atom(node):
+    return {((node, _ONE),): _ONE}
+
+def _constant_value(terms):
+    if not terms:
+        return 0.0
+    if len(terms) == 1 and () in terms:
+        return terms[()]
+    return None
+
+def _to_sum(node):
+    if isinstance(node, Literal):
+        return _constant(node.value)
+
+    if isinstance(node, Variable):
+        return _atom(node)
+
+    if isinstance(node, Diff):
+        return _atom(Diff(canonicalize(node.expression), node.var, node.order))
+
+    if isinstance(node, UnaryOp):
+        operand = _to_sum(node.operand)
+        return _scale(operand, -1) if node.op == Op.SUBTRACT else operand
+
+    if isinstance(node, Operator):
+        left = _to_sum(node.left)
+        right = _to_sum(node.right)
+
+        if node.op == Op.ADD:
+            return _add(left, right)
+        if node.op == Op.SUBTRACT:
+            return _add(left, _scale(right, -1))
+        if node.op == Op.MULTIPLY:
+            return _multiply(left, right)
+        if node.op == Op.DIVIDE:
+            return _multiply(left, _power(right, -1))
+        if node.op == Op.EXPONENT:
+            exponent = _constant_value(right)
+            # Powers are only merged for real exponents.
+            if exponent is None or isinstance(exponent, complex):
+                return _atom(Operator(Op.EXPONENT, _build_sum(left), _build_sum(right)))
+            return _power(left, exponent)
+
+    raise TypeError(f"Unknown expression type: {type(node)}")
+
+@lru_cache(maxsize=4096)
+def _may_be_undefined(atom):
+    # Conservative: any division, power that is not a non-negative literal, or
+    # derivative might be undefined somewhere.
+    stack = [atom]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Diff):
+            return True
+        if isinstance(node, UnaryOp):
+            stack.append(node.operand)
+        elif isinstance(node, Operator):
+            if node.op == Op.DIVIDE:
+                return True
+            if node.op == Op.EXPONENT and not (isinstance(node.right, Literal)
+                                               and not isinstance(node.right.value, complex)
+                                               and node.right.value >= 0):
+                return True
+            stack.extend((node.left, node.right))
+    return False
+
+def _is_singular(monomial):
+    return any(exponent < 0 or _may_be_undefined(atom) for atom, exponent in monomial)
+
+def _add(left, right):
+    result = dict(left)
+    for monomial, coefficient in right.items():
+        total = result.get(monomial, 0) + coefficient
+        if total == 0 and not _is_singular(monomial):
+            result.pop(monomial, None)
+        else:
+            result[monomial] = total
+    return result
+
+def _scale(terms, factor):
+    if factor == 0:
+        return {monomial: 0.0 for monomial in terms if _is_singular(monomial)}
+    return {monomial: coefficient * factor for monomial, coefficient in terms.items()}
+
+def _single_term(terms):
+    # Multi-term sums are not distributed, so they take part in products as one atom.
+    if len(terms) == 1:
+        return next(iter(terms.items()))
+    return ((_build_sum(terms), _ONE),), _ONE
+
+def _guard(atom):
+    return Operator(Op.DIVIDE, atom, atom)
+
+def _is_guard(atom):
+    return atom.__class__ is Operator and atom.op == Op.DIVIDE and atom.left == atom.right
+
+def _monomial(exponents):
+    # Guards sort after the factors they sit beside.
+    return tuple(sorted(exponents.items(), key=lambda item: (_is_guard(item[0]), repr(item[0]))))
+
+def _merge_monomials(left, right):
+    exponents = dict(left)
+    for atom, exponent in right:
+        if _is_guard(atom):
+            # Any power of a guard is the guard itself.
+            exponents[atom] = _ONE
+            continue
+        before = exponents.get(atom, 0)
+        total = before + exponent
+        if min(before, exponent) < 0 <= total:
+            exponents[_guard(atom)] = _ONE
+        if total == 0:
+            exponents.pop(atom, None)
+        else:
+            exponents[atom] = total
+    return _monomial(exponents)
+
+def _multiply(left, right):
+    constant = _constant_value(left)
+    if constant is not None:
+        return _scale(right, constant)
+
+    constant = _constant_value(right)
+    if constant is not None:
+        return _scale(left, constant)
+
+    left_monomial, left_coefficient = _single_term(left)
+    right_monomial, right_coefficient = _single_term(right)
+
+    monomial = _merge_monomials(left_monomial, right_monomial)
+    return {monomial: left_coefficient * right_coefficient}
+
+def _power(terms, exponent):
+    constant = _constant_value(terms)
+    if constant is not None:
+        if constant == 0 and exponent < 0:
+            raise ZeroDivisionError("Cannot divide by zero")
+        return _constant(constant ** exponent)
+
+    if exponent == 0:
+        return _constant(_ONE)
+
+    monomial, coefficient = _single_term(terms)
+
+    # (a * b)^n only splits into a^n * b^n for whole n; a lone base can take any power.
+    if float(exponent).is_integer() or (coefficient == 1 and len(monomial) == 1 and monomial[0][1] == 1):
+        exponents = {}
+        for atom, power in monomial:
+            if _is_guard(atom):
+                exponents[atom] = _ONE
+                continue
+            exponents[atom] = power * exponent
+            # (1 / x) ^ -1 is x, but only where 1 / x is defined.
+            if power < 0 < power * exponent:
+                exponents[_guard(atom)] = _ONE
+        return {_monomial(exponents): coefficient ** exponent}
+
+    return _atom(Operator(Op.EXPONENT, _build_sum(terms), Literal(exponent)))
+
+def _degree(monomial):
+    return sum(exponent for atom, exponent in monomial if not _is_guard(atom))
+
+def _build_factor(atom, exponent):
+    if exponent == 1:
+        return atom
+    return Operator(Op.EXPONENT, atom, Literal(exponent))
+
+def _build_product(factors, node=None):
+    for atom, exponent in factors:
+        factor = _build_factor(atom, exponent)
+        node = factor if node is None else Operator(Op.MULTIPLY, node, factor)
+    return node
+
+def _build_term(monomial, coefficient):
+    if not monomial:
+        return Literal(coefficient)
+
+    negate = coefficient == -1
+    leading = None if coefficient == 1 or negate else Literal(coefficient)
+
+    numerator = _build_product(((atom, exponent) for atom, exponent in monomial if exponent > 0), leading)
+    denominator = _build_product((atom, -exponent) for atom, exponent in monomial if exponent < 0)
+
+    if denominator is not None:
+        numerator = Operator(Op.DIVIDE, numerator if numerator is not None else Literal(_ONE), denominator)
+    return UnaryOp(Op.SUBTRACT, numerator) if negate else numerator
+
+def _build_sum(terms):
+    if not terms:
+        return Literal(0.0)
+
+    # Highest degree first, then by spelling; the constant term goes last.
+    monomials = sorted((monomial for monomial in terms if monomial),
+                       key=lambda monomial: (-_degree(monomial), repr(monomial)))
+    if () in terms:
+        monomials.append(())
+
+    node = None
+    for monomial in monomials:
+        coefficient = terms[monomial]
+        if node is None:
+            node = _build_term(monomial, coefficient)
+        elif isinstance(coefficient, Number) and coefficient.real < 0:
+            node = Operator(Op.SUBTRACT, node, _build_term(monomial, -coefficient))
+        else:
+            node = Operator(Op.ADD, node, _build_term(monomial, coefficient))
+    return node
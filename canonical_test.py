@@ -0,0 +1,112 @@
+import random
+import unittest
+
+from ast_eval import *
+from canonical import *
+from symbolic import differentiate, simplify
+
+X = Variable('x')
+Y = Variable('y')
+
+
+def add(left, right): return Operator(Op.ADD, left, right)
+def mul(left, right): return Operator(Op.MULTIPLY, left, right)
+def div(left, right): return Operator(Op.DIVIDE, left, right)
+def power(left, right): return Operator(Op.EXPONENT, left, right)
+
+
+class TestCanonical(unittest.TestCase):
+
+    def test_collects_like_terms(self):
+        expr = add(mul(Literal(2.0), X), mul(X, Literal(2.0)))
+        self.assertEqual(canonicalize(expr), mul(Literal(4.0), X))
+
+    def test_folds_constants_separated_by_variables(self):
+        expr = add(add(mul(mul(Literal(2.0), X), Literal(3.0)), Literal(1.0)), Literal(-5.0))
+        self.assertEqual(canonicalize(expr), Operator(Op.SUBTRACT, mul(Literal(6.0), X), Literal(4.0)))
+
+    def test_merges_powers_of_same_base(self):
+        expr = div(mul(mul(X, X), power(X, Literal(3.0))), X)
+        self.assertEqual(canonicalize(expr), mul(power(X, Literal(4.0)), div(X, X)))
+
+    def test_sorts_commutative_operands(self):
+        self.assertEqual(canonicalize(add(mul(Y, X), mul(X, Y))), mul(mul(Literal(2.0), X), Y))
+
+    def test_cancels_to_zero(self):
+        self.assertEqual(canonicalize(Operator(Op.SUBTRACT, X, X)), Literal(0.0))
+
+    def test_keeps_sums_as_factors(self):
+        base = add(X, Literal(1.0))
+        self.assertEqual(canonicalize(mul(base, base)), power(base, Literal(2.0)))
+
+    def test_distributes_constant_over_sum(self):
+        expr = add(mul(Literal(2.0), add(X, Literal(1.0))), X)
+        self.assertEqual(canonicalize(expr), add(mul(Literal(3.0), X), Literal(2.0)))
+
+    def test_is_idempotent(self):
+        expr = simplify(differentiate(div(power(X, Literal(3.0)), add(X, Literal(1.0))), 'x'))
+        once = canonicalize(expr)
+        self.assertEqual(repr(canonicalize(once)), repr(once))
+
+    def test_shrinks_product_rule_output(self):
+        expr = simplify(differentiate(mul(mul(X, X), X), 'x'))
+        self.assertEqual(canonicalize(expr), mul(Literal(3.0), power(X, Literal(2.0))))
+
+    def test_cancelled_divisors_leave_a_guard(self):
+        guarded = canonicalize(div(mul(X, Y), X))
+        self.assertEqual(guarded, mul(Y, div(X, X)))
+        self.assertEqual(canonicalize(guarded), guarded)
+        self.assertEqual(canonicalize(mul(guarded, div(X, X))), guarded)
+        self.assertEqual(canonicalize(power(div(Literal(1.0), X), Literal(-1.0))), mul(X, div(X, X)))
+        self.assertEqual(canonicalize(div(X, mul(X, X))), div(Literal(1.0), X))
+
+    def test_cancelled_divisors_still_divide_by_zero(self):
+        with self.assertRaises(ZeroDivisionError):
+            partial_eval(canonicalize(div(mul(X, Y), X)), {'x': 0.0, 'y': 3.0})
+        self.assertEqual(partial_eval(canonicalize(div(mul(X, Y), X)), {'x': 2.0, 'y': 3.0}), 3.0)
+
+    def test_cancelled_terms_that_divide_keep_a_zero_coefficient(self):
+        self.assertEqual(canonicalize(add(div(Literal(0.0), X), Literal(1.0))), add(div(Literal(0.0), X), Literal(1.0)))
+        self.assertEqual(canonicalize(div(Operator(Op.SUBTRACT, X, X), Y)), div(Literal(0.0), Y))
+        self.assertEqual(canonicalize(Operator(Op.SUBTRACT, div(Y, X), div(Y, X))), div(Literal(0.0), X))
+        self.assertEqual(canonicalize(mul(Literal(0.0), X)), Literal(0.0))
+        self.assertEqual(canonicalize(Operator(Op.SUBTRACT, X, X)), Literal(0.0))
+
+    def test_agrees_with_simplify_on_where_division_by_zero_happens(self):
+        rng = random.Random(0)
+
+        def expression(depth):
+            if depth == 0 or rng.random() < 0.3:
+                return rng.choice([X, Y, Literal(0.0), Literal(1.0), Literal(2.0), Literal(-1.0)])
+            op = rng.choice([Op.ADD, Op.SUBTRACT, Op.MULTIPLY, Op.DIVIDE, Op.EXPONENT])
+            if op == Op.EXPONENT:
+                return power(expression(depth - 1), Literal(float(rng.choice([-2, -1, 0, 1, 2]))))
+            return Operator(op, expression(depth - 1), expression(depth - 1))
+
+        def outcome(node, env):
+            try:
+                return round(partial_eval(node, env), 9)
+            except ZeroDivisionError:
+                return 'division by zero'
+
+        for _ in range(500):
+            try:
+                simplified = simplify(expression(4))
+                result = canonicalize(simplified)
+            except ZeroDivisionError:
+                continue
+            for env in ({'x': 0.0, 'y': 0.0}, {'x': 0.0, 'y': 1.0}, {'x': 1.0, 'y': 0.0}, {'x': 2.0, 'y': -1.0}):
+                self.assertEqual(outcome(result, env), outcome(simplified, env), f"{simplified} -> {result} at {env}")
+
+    def test_complex_exponents_stay_symbolic(self):
+        expr = power(X, Literal(1 + 2j))
+        self.assertEqual(canonicalize(expr), expr)
+        self.assertEqual(canonicalize(mul(expr, expr)), power(expr, Literal(2.0)))
+
+    def test_constant_division_by_zero_raises(self):
+        with self.assertRaises(ZeroDivisionError):
+            canonicalize(div(X, Operator(Op.SUBTRACT, Literal(1.0), Literal(1.0))))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
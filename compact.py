@@ -0,0 +1,457 @@
+from array import array
+
+from ast_eval import *
+from cse import expand
+
+# Opcodes. Binary operators read nodes left[i] and right[i], unary ones left[i].
+LITERAL, VARIABLE, ADD, SUBTRACT, MULTIPLY, DIVIDE, EXPONENT, NEGATE, PLUS, DIFF = range(10)
+
+_BINARY_OPCODES = {
+    Op.ADD: ADD,
+    Op.SUBTRACT: SUBTRACT,
+    Op.MULTIPLY: MULTIPLY,
+    Op.DIVIDE: DIVIDE,
+    Op.EXPONENT: EXPONENT,
+}
+_BINARY_OPS = {opcode: op for op, opcode in _BINARY_OPCODES.items()}
+
+class CompactExpr:
+    """An expression stored as parallel arrays instead of one object per node.
+
+    Node i has opcode ops[i]. Operators read the earlier nodes left[i] and
+    right[i]; LITERAL and VARIABLE nodes hold an index into `literals` or
+    `names` in left[i]; DIFF nodes hold the expression node in left[i], the
+    `names` index of the variable in right[i] and any order other than 1 in
+    `orders`. Children always come before their parents and structurally
+    equal subtrees are stored once.
+    """
+    __slots__ = ('ops', 'left', 'right', 'literals', 'names', 'orders', 'root')
+
+    def __init__(self):
+        self.ops = array('B')
+        self.left = array('i')
+        self.right = array('i')
+        self.literals = []
+        self.names = []
+        self.orders = {}
+        self.root = -1
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return f"CompactExpr({len(self)} nodes)"
+
+    @property
+    def nbytes(self):
+        """Bytes used by the node arrays, not counting the literal and name pools."""
+        return sum(len(column) * column.itemsize for column in (self.ops, self.left, self.right))
+
+class _Builder:
+    """Appends interned nodes to a CompactExpr."""
+    def __init__(self, expr=None):
+        self.expr = CompactExpr()
+        self._nodes = {}
+        self._literals = {}
+        self._names = {}
+
+        if expr is not None:
+            target = self.expr
+            target.ops.extend(expr.ops)
+            target.left.extend(expr.left)
+            target.right.extend(expr.right)
+            target.literals.extend(expr.literals)
+            target.names.extend(expr.names)
+            target.orders.update(expr.orders)
+
+            self._literals = {repr(value): index for index, value in enumerate(expr.literals)}
+            self._names = {name: index for index, name in enumerate(expr.names)}
+            for index, (op, left, right) in enumerate(zip(expr.ops, expr.left, expr.right)):
+                key = (op, left, right, expr.orders.get(index, 1)) if op == DIFF else (op, left, right)
+                self._nodes[key] = index
+
+    def node(self, op, left, right=0):
+        key = (op, left, right)
+        index = self._nodes.get(key)
+        if index is None:
+            index = self._append(key, op, left, right)
+        return index
+
+    def _append(self, key, op, left, right):
+        expr = self.expr
+        index = len(expr.ops)
+        expr.ops.append(op)
+        expr.left.append(left)
+        expr.right.append(right)
+        self._nodes[key] = index
+        return index
+
+    def literal(self, value):
+        # Keyed on repr so that 2 and 2.0 stay distinct, as in hashcons.
+        key = repr(value)
+        slot = self._literals.get(key)
+        if slot is None:
+            slot = self._literals[key] = len(self.expr.literals)
+            self.expr.literals.append(value)
+        return self.node(LITERAL, slot)
+
+    def name(self, name):
+        slot = self._names.get(name)
+        if slot is None:
+            slot = self._names[name] = len(self.expr.names)
+            self.expr.names.append(name)
+        return slot
+
+    def variable(self, name):
+        return self.node(VARIABLE, self.name(name))
+
+    def diff(self, expression, var, order=1):
+        key = (DIFF, expression, self.name(var), order)
+        index = self._nodes.get(key)
+        if index is None:
+            index = self._append(key, *key[:3])
+            if order != 1:
+                self.expr.orders[index] = order
+        return index
+
+    def value(self, index):
+        """The literal value of node `index`, or None if it is not a literal."""
+        expr = self.expr
+        if expr.ops[index] == LITERAL:
+            return expr.literals[expr.left[index]]
+        return None
+
+    def add(self, root):
+        """Append the object tree `root`, returning the index of its root node."""
+        indices = {}
+        get = indices.get
+        stack = [root]
+
+        while stack:
+            node = stack[-1]
+            cls = node.__class__
+
+            if cls is Operator:
+                left = get(id(node.left))
+                right = get(id(node.right))
+                if left is None or right is None:
+                    # Revisit once both operands have been added.
+                    if right is None:
+                        stack.append(node.right)
+                    if left is None:
+                        stack.append(node.left)
+                    continue
+                opcode = _BINARY_OPCODES.get(node.op)
+                if opcode is None:
+                    raise ValueError(f"Cannot store operator: {node.op}")
+                index = self.node(opcode, left, right)
+
+            elif cls is Literal:
+                index = self.literal(node.value)
+
+            elif cls is Variable:
+                index = self.variable(node.name)
+
+            elif cls is UnaryOp or cls is Diff:
+                child = node.operand if cls is UnaryOp else node.expression
+                operand = get(id(child))
+                if operand is None:
+                    stack.append(child)
+                    continue
+                if cls is Diff:
+                    index = self.diff(operand, node.var, node.order)
+                else:
+                    index = self.node(NEGATE if node.op == Op.SUBTRACT else PLUS, operand)
+
+            else:
+                raise TypeError(f"Unknown expression type: {type(node)}")
+
+            indices[id(node)] = index
+            stack.pop()
+
+        return indices[id(root)]
+
+    def finish(self, root):
+        """A fresh CompactExpr holding only the nodes reachable from `root`."""
+        source = self.expr
+        output = _Builder()
+        mapped = {}
+
+        for index in _reachable(source, root):
+            op = source.ops[index]
+            left = source.left[index]
+            if op == LITERAL:
+                mapped[index] = output.literal(source.literals[left])
+            elif op == VARIABLE:
+                mapped[index] = output.variable(source.names[left])
+            elif op == DIFF:
+                mapped[index] = output.diff(mapped[left], source.names[source.right[index]],
+                                            source.orders.get(index, 1))
+            elif op == NEGATE or op == PLUS:
+                mapped[index] = output.node(op, mapped[left])
+            else:
+                mapped[index] = output.node(op, mapped[left], mapped[source.right[index]])
+
+        output.expr.root = mapped[root]
+        return output.expr
+
+def _reachable(expr, root):
+    """Indices of the nodes under `root`, children before parents."""
+    ops, left, right = expr.ops, expr.left, expr.right
+    live = bytearray(root + 1)
+    live[root] = 1
+
+    for index in range(root, -1, -1):
+        if live[index]:
+            op = ops[index]
+            if op > VARIABLE:
+                live[left[index]] = 1
+                if op <= EXPONENT:
+                    live[right[index]] = 1
+
+    return [index for index in range(root + 1) if live[index]]
+
+def from_expr(node):
+    """Convert an object tree to a CompactExpr."""
+    builder = _Builder()
+    # A Let's temporaries become shared subtrees, which the builder stores once.
+    builder.expr.root = builder.add(expand(node))
+    return builder.expr
+
+def to_expr(expr):
+    """Convert a CompactExpr back to object nodes; shared subtrees become shared objects."""
+    nodes = {}
+    ops, left, right = expr.ops, expr.left, expr.right
+
+    for index in _reachable(expr, expr.root):
+        op = ops[index]
+        a = left[index]
+        if op == LITERAL:
+            node = Literal(expr.literals[a])
+        elif op == VARIABLE:
+            node = Variable(expr.names[a])
+        elif op == NEGATE:
+            node = UnaryOp(Op.SUBTRACT, nodes[a])
+        elif op == PLUS:
+            node = UnaryOp(Op.ADD, nodes[a])
+        elif op == DIFF:
+            node = Diff(nodes[a], expr.names[right[index]], expr.orders.get(index, 1))
+        else:
+            node = Operator(_BINARY_OPS[op], nodes[a], nodes[right[index]])
+        nodes[index] = node
+
+    return nodes[expr.root]
+
+def _differentiate(builder, root, var_name):
+    # Same rules, and so the same output, as symbolic.differentiate.
+    expr = builder.expr
+    ops, left, right = expr.ops, expr.left, expr.right
+    derivatives = {}
+
+    for index in _reachable(expr, root):
+        op = ops[index]
+        a = left[index]
+
+        if op == LITERAL:
+            result = builder.literal(0.0)
+        elif op == VARIABLE:
+            result = builder.literal(1.0 if expr.names[a] == var_name else 0.0)
+        elif op == NEGATE or op == PLUS:
+            result = builder.node(op, derivatives[a])
+        elif op == DIFF:
+            inner = _nth_derivative(builder, a, expr.names[right[index]], expr.orders.get(index, 1))
+            result = _differentiate(builder, inner, var_name)
+        else:
+            u, v = a, right[index]
+            du, dv = derivatives[u], derivatives[v]
+
+            if op == ADD or op == SUBTRACT:
+                result = builder.node(op, du, dv)
+            elif op == MULTIPLY:
+                result = builder.node(ADD, builder.node(MULTIPLY, du, v), builder.node(MULTIPLY, u, dv))
+            elif op == DIVIDE:
+                numerator = builder.node(SUBTRACT, builder.node(MULTIPLY, du, v), builder.node(MULTIPLY, u, dv))
+                result = builder.node(DIVIDE, numerator, builder.node(EXPONENT, v, builder.literal(2.0)))
+            else:
+                exponent = builder.value(v)
+                if exponent is not None:
+                    n = v
+                elif ops[v] == NEGATE and builder.value(left[v]) is not None:
+                    exponent = -builder.value(left[v])
+                    n = builder.literal(exponent)
+                else:
+                    raise ValueError(f"Differentiation not implemented for non-constant exponent: {to_expr(builder.finish(v))}")
+
+                power = builder.node(MULTIPLY, n, builder.node(EXPONENT, u, builder.literal(exponent - 1)))
+                result = builder.node(MULTIPLY, power, du)
+
+        derivatives[index] = result
+
+    return derivatives[root]
+
+def _simplify(builder, root):
+    # Same rules, and so the same output, as symbolic.simplify.
+    expr = builder.expr
+    ops, left, right = expr.ops, expr.left, expr.right
+    value = builder.value
+    simplified = {}
+
+    for index in _reachable(expr, root):
+        op = ops[index]
+
+        if op == LITERAL or op == VARIABLE or op == DIFF:
+            result = index
+
+        elif op == NEGATE or op == PLUS:
+            operand = simplified[left[index]]
+            if value(operand) == 0:
+                result = builder.literal(0.0)
+            elif op == NEGATE and ops[operand] == NEGATE:
+                result = left[operand]
+            else:
+                result = builder.node(op, operand)
+
+        else:
+            l = simplified[left[index]]
+            r = simplified[right[index]]
+            lv = value(l)
+            rv = value(r)
+            result = None
+
+            if lv is not None and rv is not None:
+                if op == ADD: result = builder.literal(lv + rv)
+                elif op == SUBTRACT: result = builder.literal(lv - rv)
+                elif op == MULTIPLY: result = builder.literal(lv * rv)
+                elif op == EXPONENT: result = builder.literal(lv ** rv)
+                else:
+                    if rv == 0.0:
+                        raise ZeroDivisionError("Cannot divide by zero")
+                    result = builder.literal(lv / rv)
+
+            elif op == ADD:
+                if rv == 0: result = l
+                elif lv == 0: result = r
+            elif op == SUBTRACT:
+                if rv == 0: result = l
+            elif op == MULTIPLY:
+                if rv == 1: result = l
+                elif lv == 1: result = r
+                elif rv == 0 or lv == 0: result = builder.literal(0.0)
+            elif op == EXPONENT:
+                if rv == 1: result = l
+                elif rv == 0 and not lv == 0: result = builder.literal(1.0)
+                elif lv == 0: result = builder.literal(0.0)
+
+            if result is None:
+                result = builder.node(op, l, r)
+
+        simplified[index] = result
+
+    return simplified[root]
+
+def _nth_derivative(builder, root, var_name, order):
+    for _ in range(order):
+        root = _simplify(builder, _differentiate(builder, root, var_name))
+    return root
+
+def differentiate(expr, var_name):
+    """Derivative of `expr` with respect to `var_name`, unsimplified like symbolic.differentiate."""
+    builder = _Builder(expr)
+    return builder.finish(_differentiate(builder, expr.root, var_name))
+
+def simplify(expr):
+    builder = _Builder(expr)
+    return builder.finish(_simplify(builder, expr.root))
+
+def nth_derivative(expr, var_name, order=1):
+    builder = _Builder(expr)
+    return builder.finish(_nth_derivative(builder, expr.root, var_name, order))
+
+def evaluate(expr, env=None):
+    """Evaluate with numeric `env` bindings, like partial_eval.
+
+    Returns a number when every variable is bound, otherwise a CompactExpr
+    of the residual with the numeric parts folded.
+    """
+    env = env or {}
+
+    if DIFF in expr.ops:
+        builder = _Builder(expr)
+        expr = builder.finish(_expand_diffs(builder, expr.root))
+
+    ops, left, right = expr.ops, expr.left, expr.right
+    values = {}
+    residual = {}
+    output = _Builder()
+
+    def operand(index):
+        if index in residual:
+            return residual[index]
+        return output.literal(values[index])
+
+    for index in _reachable(expr, expr.root):
+        op = ops[index]
+        a = left[index]
+
+        if op == LITERAL:
+            values[index] = expr.literals[a]
+
+        elif op == VARIABLE:
+            name = expr.names[a]
+            if name in env:
+                value = env[name]
+                values[index] = value.value if isinstance(value, Literal) else value
+            else:
+                residual[index] = output.variable(name)
+
+        elif op == NEGATE or op == PLUS:
+            if a in residual:
+                residual[index] = output.node(op, residual[a])
+            else:
+                values[index] = -values[a] if op == NEGATE else values[a]
+
+        else:
+            b = right[index]
+            if a in residual or b in residual:
+                residual[index] = output.node(op, operand(a), operand(b))
+                continue
+
+            x = values[a]
+            y = values[b]
+            if op == ADD:
+                values[index] = x + y
+            elif op == SUBTRACT:
+                values[index] = x - y
+            elif op == MULTIPLY:
+                values[index] = x * y
+            elif op == DIVIDE:
+                if y == 0:
+                    raise ZeroDivisionError("Cannot divide by zero.")
+                values[index] = x / y
+            else:
+                values[index] = x ** y
+
+    if expr.root in values:
+        return values[expr.root]
+    output.expr.root = residual[expr.root]
+    return output.expr
+
+def _expand_diffs(builder, root):
+    # Replace every DIFF node under `root` with the derivative it stands for.
+    expr = builder.expr
+    ops, left, right = expr.ops, expr.left, expr.right
+    mapped = {}
+
+    for index in _reachable(expr, root):
+        op = ops[index]
+        a = left[index]
+        if op == LITERAL or op == VARIABLE:
+            mapped[index] = index
+        elif op == DIFF:
+            mapped[index] = _nth_derivative(builder, mapped[a], expr.names[right[index]], expr.orders.get(index, 1))
+        elif op == NEGATE or op == PLUS:
+            mapped[index] = builder.node(op, mapped[a])
+        else:
+            mapped[index] = builder.node(op, mapped[a], mapped[right[index]])
+
+    return mapped[root]
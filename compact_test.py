@@ -0,0 +1,103 @@
+import pickle
+import unittest
+
+from ast_eval import *
+from compact import *
+import symbolic
+from parser import Parser
+from tokeniser import Tokeniser
+
+
+def parse(text):
+    return Parser(Tokeniser(text).tokenise()).parse()
+
+
+EXPRESSIONS = [
+    "(x + 1) / (x * x + 1)",
+    "x ^ 3 - -x ^ 2 * y",
+    "+x * (y - 2) ^ -2",
+    "diff(x ^ 2 * y, y, 2) + 3",
+    "diff(diff(x ^ 4), x, 2)",
+]
+
+
+class TestConversion(unittest.TestCase):
+
+    def test_round_trip(self):
+        for text in EXPRESSIONS:
+            tree = parse(text)
+            self.assertEqual(repr(to_expr(from_expr(tree))), repr(tree))
+
+    def test_repeated_subtrees_are_stored_once(self):
+        compact = from_expr(parse("(x + 1) * (x + 1)"))
+        self.assertEqual(list(compact.ops), [VARIABLE, LITERAL, ADD, MULTIPLY])
+        self.assertEqual(compact.literals, [1.0])
+        self.assertEqual(compact.names, ['x'])
+        self.assertEqual(compact.root, 3)
+
+    def test_int_and_float_literals_stay_distinct(self):
+        compact = from_expr(Operator(Op.ADD, Literal(2), Literal(2.0)))
+        self.assertEqual(repr(to_expr(compact)), "(2 + 2.0)")
+
+    def test_deep_tree_does_not_recurse(self):
+        tree = Variable('x')
+        for i in range(5000):
+            tree = Operator(Op.ADD, tree, Literal(1.0))
+        compact = from_expr(tree)
+        self.assertEqual(len(compact), 5002)
+        self.assertEqual(evaluate(compact, {'x': 0.0}), 5000.0)
+
+    def test_nodes_have_no_instance_dict(self):
+        self.assertFalse(hasattr(parse("x + 1"), '__dict__'))
+        node = parse("-(x * 2)")
+        hash(node)
+        self.assertEqual(pickle.loads(pickle.dumps(node)), node)
+
+
+class TestOperations(unittest.TestCase):
+
+    def test_differentiate_matches_symbolic(self):
+        for text in EXPRESSIONS:
+            tree = parse(text)
+            for var in 'xy':
+                expected = symbolic.differentiate(tree, var)
+                self.assertEqual(repr(to_expr(differentiate(from_expr(tree), var))), repr(expected))
+
+    def test_simplify_matches_symbolic(self):
+        for text in EXPRESSIONS + ["0 * x + -(-(y)) ^ 1", "-(0) + x ^ 0", "(2 + 3) * x - 0"]:
+            tree = symbolic.differentiate(parse(text), 'x')
+            self.assertEqual(repr(to_expr(simplify(from_expr(tree)))), repr(symbolic.simplify(tree)))
+
+    def test_nth_derivative(self):
+        tree = parse("x ^ 4 * y")
+        self.assertEqual(repr(to_expr(nth_derivative(from_expr(tree), 'x', 3))),
+                         repr(symbolic.nth_derivative(tree, 'x', 3)))
+
+    def test_non_constant_exponent_raises(self):
+        with self.assertRaises(ValueError):
+            differentiate(from_expr(parse("x ^ y")), 'x')
+
+    def test_evaluate_matches_partial_eval(self):
+        env = {'x': 2.0, 'y': 3.0}
+        for text in EXPRESSIONS:
+            tree = parse(text)
+            self.assertAlmostEqual(evaluate(from_expr(tree), env), partial_eval(tree, env))
+
+    def test_evaluate_returns_folded_residual(self):
+        tree = parse("x * (2 + 3) + y")
+        residual = evaluate(from_expr(tree), {'y': 1})
+        self.assertIsInstance(residual, CompactExpr)
+        self.assertEqual(repr(to_expr(residual)), repr(partial_eval(tree, {'y': 1})))
+
+    def test_evaluate_divide_by_zero(self):
+        with self.assertRaises(ZeroDivisionError):
+            evaluate(from_expr(parse("x / (y - 1)")), {'x': 1.0, 'y': 1.0})
+
+    def test_results_only_keep_reachable_nodes(self):
+        result = simplify(from_expr(parse("x * 1 + 0")))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(to_expr(result), Variable('x'))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,112 @@
+import functools
+import math
+
+from ast_eval import *
+
+_BINARY_SYMBOLS = {
+    Op.ADD: '+',
+    Op.SUBTRACT: '-',
+    Op.MULTIPLY: '*',
+    Op.DIVIDE: '/',
+    Op.EXPONENT: '**',
+}
+
+class _CodeBuilder:
+    """Flattens an expression tree into straight-line Python statements.
+
+    Every interior node becomes one assignment to a temporary, so the generated
+    source never nests and structurally equal subtrees are computed only once.
+    """
+    def __init__(self, variables):
+        self.params = {name: f"_v{i}" for i, name in enumerate(variables)}
+        self.scope = dict(self.params)
+        self.constants = {}
+        self.lines = []
+        self.temps = {}
+        self.count = 0
+
+    def emit(self, node):
+        if isinstance(node, Literal):
+            return self.constant(node.value)
+
+        if isinstance(node, Variable):
+            if node.name not in self.scope:
+                raise ValueError(f"Unbound variable '{node.name}' in compiled expression")
+            return self.scope[node.name]
+
+        if isinstance(node, Let):
+            # Each temporary is computed once and then read by name. Temporaries
+            # are keyed by structure, so the Let's names and the subtrees that
+            # read them stay inside it.
+            outer = self.scope, self.temps
+            self.scope, self.temps = dict(self.scope), {}
+            try:
+                for name, value in node.bindings:
+                    self.scope[name] = self.emit(value)
+                return self.emit(node.body)
+            finally:
+                self.scope, self.temps = outer
+
+        if isinstance(node, Diff):
+            from symbolic import nth_derivative
+            return self.emit(nth_derivative(node.expression, node.var, node.order))
+
+        if node in self.temps:
+            return self.temps[node]
+
+        if isinstance(node, UnaryOp):
+            operand = self.emit(node.operand)
+            source = f"-{operand}" if node.op == Op.SUBTRACT else operand
+
+        elif isinstance(node, Operator):
+            if node.op not in _BINARY_SYMBOLS:
+                raise ValueError(f"Cannot compile operator: {node.op}")
+            left = self.emit(node.left)
+            right = self.emit(node.right)
+            source = f"{left} {_BINARY_SYMBOLS[node.op]} {right}"
+
+        else:
+            raise TypeError(f"Unknown expression type: {type(node)}")
+
+        temp = f"_t{self.count}"
+        self.count += 1
+        self.lines.append(f"    {temp} = {source}")
+        self.temps[node] = temp
+        return temp
+
+    def constant(self, value):
+        if isinstance(value, (int, float)) and math.isfinite(value):
+            return f"({value!r})"
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+@functools.lru_cache(maxsize=256)
+def _compile(ast, variables):
+    builder = _CodeBuilder(variables)
+    result = builder.emit(ast)
+
+    params = ", ".join(builder.params.values())
+    source = "\n".join([f"def _compiled({params}):", *builder.lines, f"    return {result}"])
+
+    namespace = dict(builder.constants)
+    exec(compile(source, "<compiled expression>", "exec"), namespace)
+
+    function = namespace["_compiled"]
+    function.source = source
+    function.variables = variables
+    return function
+
+def compile_expression(ast, variables=()):
+    """Compile an expression tree into a Python function of the given variables.
+
+    The returned callable takes one positional argument per entry in
+    `variables` and returns a number. Results are cached per (ast, variables).
+    """
+    return _compile(ast, tuple(variables))
+
+def cache_info():
+    return _compile.cache_info()
+
+def cache_clear():
+    _compile.cache_clear()
@@ -0,0 +1,64 @@
+import unittest
+
+from ast_eval import *
+from compiler import *
+
+X = Variable('x')
+Y = Variable('y')
+
+
+class TestCompiler(unittest.TestCase):
+
+    def test_can_compile_literal(self):
+        function = compile_expression(Literal(41))
+        self.assertEqual(function(), 41)
+
+    def test_can_compile_with_variables(self):
+        expr = Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(2), X), Y)
+        function = compile_expression(expr, ['x', 'y'])
+        self.assertEqual(function(3, 4), 10)
+        self.assertEqual(function(0.5, 1), 2)
+
+    def test_matches_eval_on_literal_tree(self):
+        expr_l = Operator(Op.ADD, Literal(41), Literal(1))
+        expr_r = Operator(Op.MULTIPLY, Literal(7), Literal(2))
+        expr = Operator(Op.DIVIDE, expr_l, Operator(Op.ADD, expr_r, Literal(1)))
+        self.assertEqual(compile_expression(expr)(), eval(expr))
+
+    def test_can_compile_unary_and_exponent(self):
+        expr = UnaryOp(Op.SUBTRACT, Operator(Op.EXPONENT, X, Literal(2)))
+        self.assertEqual(compile_expression(expr, ['x'])(3), -9)
+
+    def test_can_compile_diff(self):
+        expr = Diff(Operator(Op.EXPONENT, X, Literal(3)), 'x')
+        self.assertEqual(compile_expression(expr, ['x'])(2), 12)
+
+    def test_repeated_compile_is_cached(self):
+        expr = Operator(Op.SUBTRACT, X, Literal(1))
+        self.assertIs(compile_expression(expr, ['x']), compile_expression(expr, ('x',)))
+
+    def test_shared_subtrees_are_computed_once(self):
+        shared = Operator(Op.ADD, X, Literal(1))
+        expr = Operator(Op.MULTIPLY, shared, shared)
+        function = compile_expression(expr, ['x'])
+        self.assertEqual(function(2), 9)
+        self.assertEqual(function.source.count('+'), 1)
+
+    def test_deeply_nested_expression_compiles(self):
+        expr = X
+        for _ in range(300):
+            expr = Operator(Op.ADD, expr, Literal(1))
+        self.assertEqual(compile_expression(expr, ['x'])(0), 300)
+
+    def test_unbound_variable_raises(self):
+        with self.assertRaises(ValueError):
+            compile_expression(Operator(Op.ADD, X, Y), ['x'])
+
+    def test_divide_by_zero_raises(self):
+        function = compile_expression(Operator(Op.DIVIDE, Literal(1), X), ['x'])
+        with self.assertRaises(ZeroDivisionError):
+            function(0)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,113 @@
+import itertools
+
+from ast_eval import Diff, Let, Literal, Operator, UnaryOp, Variable
+from hashcons import hashcons
+
+def cse(node, prefix='t'):
+    """Common subexpression elimination: bind each repeated subtree to a temporary once.
+
+    Returns a Let whose bindings are named `t0`, `t1`, ... (skipping names
+    already used in `node`) in dependency order, so each one only refers to
+    earlier ones. Diff nodes are kept whole, since rewriting inside them would
+    change what is being differentiated. Trees without repeats come back as a
+    Let with no bindings.
+    """
+    node = hashcons(node)
+
+    counts = {}
+    _count(node, counts)
+
+    taken = _names(node, set())
+    names = (name for name in (f"{prefix}{i}" for i in itertools.count()) if name not in taken)
+
+    bindings = []
+    body = _rewrite(node, counts, {}, bindings, names)
+    return Let(tuple(bindings), body)
+
+def _is_leaf(node):
+    # Temporaries for x or -x would only make the output longer.
+    if isinstance(node, UnaryOp):
+        node = node.operand
+    return isinstance(node, (Literal, Variable))
+
+def _count(node, counts):
+    # Interned nodes are shared, so each distinct subtree is walked only once and
+    # the count is the number of places it is used from.
+    if _is_leaf(node):
+        return
+
+    key = id(node)
+    counts[key] = counts.get(key, 0) + 1
+    if counts[key] > 1:
+        return
+
+    if isinstance(node, UnaryOp):
+        _count(node.operand, counts)
+    elif isinstance(node, Operator):
+        _count(node.left, counts)
+        _count(node.right, counts)
+
+def _names(node, names):
+    if isinstance(node, Variable):
+        names.add(node.name)
+    elif isinstance(node, UnaryOp):
+        _names(node.operand, names)
+    elif isinstance(node, Operator):
+        _names(node.left, names)
+        _names(node.right, names)
+    elif isinstance(node, Diff):
+        names.add(node.var)
+        _names(node.expression, names)
+    return names
+
+def _rewrite(node, counts, done, bindings, names):
+    if _is_leaf(node):
+        return node
+
+    key = id(node)
+    if key in done:
+        return done[key]
+
+    if isinstance(node, UnaryOp):
+        operand = _rewrite(node.operand, counts, done, bindings, names)
+        result = node if operand is node.operand else UnaryOp(node.op, operand)
+    elif isinstance(node, Operator):
+        left = _rewrite(node.left, counts, done, bindings, names)
+        right = _rewrite(node.right, counts, done, bindings, names)
+        result = node if left is node.left and right is node.right else Operator(node.op, left, right)
+    else:
+        result = node
+
+    if counts[key] > 1:
+        name = next(names)
+        bindings.append((name, result))
+        result = Variable(name)
+
+    done[key] = result
+    return result
+
+def expand(node):
+    """Substitute the temporaries of a Let back in, giving a plain expression tree."""
+    if not isinstance(node, Let):
+        return node
+
+    scope = {}
+    for name, value in node.bindings:
+        scope[name] = _substitute(value, scope)
+    return _substitute(node.body, scope)
+
+def _substitute(node, scope):
+    if isinstance(node, Variable):
+        return scope.get(node.name, node)
+    if isinstance(node, UnaryOp):
+        return UnaryOp(node.op, _substitute(node.operand, scope))
+    if isinstance(node, Operator):
+        return Operator(node.op, _substitute(node.left, scope), _substitute(node.right, scope))
+    if isinstance(node, Diff):
+        return Diff(_substitute(node.expression, scope), node.var, node.order)
+    if isinstance(node, Let):
+        scope = dict(scope)
+        for name, value in node.bindings:
+            scope[name] = _substitute(value, scope)
+        return _substitute(node.body, scope)
+    return node
@@ -0,0 +1,119 @@
+import importlib.util
+import unittest
+
+from ast_eval import *
+from compiler import compile_expression
+from cse import cse, expand
+from parser import Parser
+from symbolic import differentiate
+from tokeniser import Tokeniser
+
+
+def parse(text):
+    return Parser(Tokeniser(text).tokenise()).parse()
+
+
+class TestCse(unittest.TestCase):
+
+    def test_binds_repeated_subtree_once(self):
+        result = cse(parse("(x + 1) * (x + 1) - (x + 1)"))
+        self.assertEqual(result.bindings, (('t0', parse("x + 1")),))
+        self.assertEqual(result.body, parse("t0 * t0 - t0"))
+        self.assertEqual(repr(result), "((t0 * t0) - t0) where t0 = (x + 1.0)")
+
+    def test_no_repeats_gives_empty_let(self):
+        result = cse(parse("x * y + 2"))
+        self.assertEqual(result.bindings, ())
+        self.assertEqual(repr(result), "((x * y) + 2.0)")
+
+    def test_leaves_and_negated_leaves_are_not_bound(self):
+        self.assertEqual(cse(parse("x * x + -y * -y")).bindings, ())
+
+    def test_nested_bindings_refer_to_earlier_ones(self):
+        result = cse(parse("((x + 1) * 2 + (x + 1) * 2) / (x + 1)"))
+        self.assertEqual(result.bindings, (('t0', parse("x + 1")), ('t1', parse("t0 * 2"))))
+        self.assertEqual(result.body, parse("(t1 + t1) / t0"))
+
+    def test_temporary_names_avoid_existing_variables(self):
+        result = cse(parse("(t0 + t1) * (t0 + t1)"))
+        self.assertEqual([name for name, _ in result.bindings], ['t2'])
+
+    def test_expand_restores_expression(self):
+        tree = differentiate(parse("(x + 1) / (x * x + 1)"), 'x')
+        result = cse(tree)
+        self.assertTrue(result.bindings)
+        self.assertEqual(expand(result), tree)
+
+    def test_partial_eval_folds_numeric_temporaries(self):
+        tree = differentiate(parse("(x + 1) / (x * x + 1)"), 'x')
+        result = cse(tree)
+        self.assertAlmostEqual(partial_eval(result, {'x': 2.0}), partial_eval(tree, {'x': 2.0}))
+
+        residual = partial_eval(cse(parse("(x + y) * (x + y) + (x * 2) * (x * 2)")), {'x': 3})
+        self.assertEqual(residual, Let((('t0', parse("3 + y")),), parse("t0 * t0 + 36")))
+
+    def test_partial_eval_drops_unused_temporaries(self):
+        tree = Let((('t0', parse("x + y")), ('t1', parse("t0 * 2")), ('t2', parse("y - 1"))),
+                   parse("t1 * x + t2 * t2"))
+        self.assertEqual(partial_eval(tree, {'y': 1}), Let((('t0', parse("x + 1")), ('t1', parse("t0 * 2"))),
+                                                           parse("t1 * x + 0")))
+        self.assertEqual(partial_eval(Let((('t0', parse("x + 1")),), parse("y + 1")), {'y': Variable('z')}),
+                         parse("z + 1"))
+
+    def test_tree_consumers_accept_let(self):
+        import autodiff
+        import canonical
+        import compact
+        from hashcons import hashcons
+        from symbolic import free_variables, grad, simplify
+
+        tree = parse("(x + 1) * (x + 1) + (x + 1) * y")
+        result = cse(tree)
+        self.assertIs(hashcons(result), hashcons(cse(tree)))
+        self.assertEqual(repr(simplify(result)), repr(result))
+        self.assertEqual(differentiate(result, 'x'), differentiate(tree, 'x'))
+        self.assertEqual(grad(result, ['x', 'y']), grad(tree, ['x', 'y']))
+        self.assertEqual(free_variables(result), {'x', 'y'})
+        self.assertEqual(canonical.canonicalize(result), canonical.canonicalize(tree))
+        self.assertEqual(compact.to_expr(compact.from_expr(result)), tree)
+        self.assertEqual(autodiff.gradient(result, {'x': 2.0, 'y': 3.0}), autodiff.gradient(tree, {'x': 2.0, 'y': 3.0}))
+
+    def test_compiled_let_computes_temporaries_once(self):
+        tree = differentiate(parse("(x + 1) / (x * x + 1)"), 'x')
+        function = compile_expression(cse(tree), ['x'])
+        self.assertAlmostEqual(function(2.0), partial_eval(tree, {'x': 2.0}))
+        self.assertEqual(function(2.0), compile_expression(tree, ['x'])(2.0))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), "numpy is not installed")
+    def test_vectorised_evaluation_of_let(self):
+        from vectorised import evaluate_batch
+        tree = differentiate(parse("(x + 1) / (x * x + 1)"), 'x')
+        expected = evaluate_batch(tree, x=[0.0, 1.0, 2.0])
+        self.assertEqual(evaluate_batch(cse(tree), x=[0.0, 1.0, 2.0]).tolist(), expected.tolist())
+
+    def sibling_lets(self):
+        # The same subtree t * 2 means something different in each Let.
+        return Operator(Op.ADD, Let((('t', Variable('x')),), parse("t * 2")),
+                        Let((('t', Variable('y')),), parse("t * 2")))
+
+    def test_compiled_lets_keep_their_own_scope(self):
+        tree = self.sibling_lets()
+        self.assertEqual(partial_eval(tree, {'x': 1, 'y': 10}), 22.0)
+        self.assertEqual(compile_expression(tree, ['x', 'y'])(1, 10), 22.0)
+        with self.assertRaises(ValueError):
+            compile_expression(Operator(Op.ADD, Let((('t', Variable('x')),), Variable('t')), Variable('t')), ['x'])
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), "numpy is not installed")
+    def test_vectorised_lets_keep_their_own_scope(self):
+        from vectorised import evaluate_batch
+        self.assertEqual(evaluate_batch(self.sibling_lets(), x=[1.0, 2.0], y=10.0).tolist(), [22.0, 24.0])
+
+    def test_temporaries_are_substituted_into_diff(self):
+        tree = Let((('t0', parse("x ^ 2")),), Diff(Variable('t0'), 'x'))
+        self.assertEqual(expand(tree), Diff(parse("x ^ 2"), 'x'))
+        self.assertEqual(partial_eval(tree, {'x': 3.0}), 6.0)
+        self.assertEqual(repr(partial_eval(tree)), "(2.0 * x)")
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
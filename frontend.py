@@ -0,0 +1,164 @@
+import re
+
+from ast_eval import AST_NODE_TYPES, partial_eval
+from cache import LRUCache
+from parser import Parser
+import stats
+from tokeniser import Tokeniser
+
+_MISSING = object()
+
+_SPACED_OP_RE = re.compile(r" ?([-+*/^(),]) ?")
+
+ast_cache = LRUCache(maxsize=1024)
+result_cache = LRUCache(maxsize=1024)
+stats.current.register_cache('ast', ast_cache)
+stats.current.register_cache('result', result_cache)
+
+# Optional persistent_cache.PersistentCache behind ast_cache and result_cache;
+# see use_persistent_cache.
+persistent_cache = None
+
+# Whether compile folds literal-only subtrees while parsing; see parser.Parser.
+fold_constants = False
+
+# Whether symbolic results and derivatives that are polynomials are expanded
+# and collected through polynomial.Polynomial; see use_polynomials.
+expand_polynomials = False
+
+# Bound by _load_symbolic on the first symbolic result, so purely numeric input
+# never imports the symbolic engine.
+simplify = canonicalize = None
+
+def normalise(text):
+    """Canonical spelling of `text`: single spaces, and none around operators."""
+    return _SPACED_OP_RE.sub(r"\1", " ".join(text.split()))
+
+def compile(text):
+    """Parse `text` into an AST, reusing the cached tree for repeated inputs.
+
+    Only the cache key is normalised; `text` itself is parsed, so error
+    positions refer to it as written.
+    """
+    key = normalise(text)
+    # Folded and unfolded parses of the same text are different trees.
+    cache_key = (key, fold_constants)
+    kind = 'folded-ast' if fold_constants else 'ast'
+    ast = ast_cache.get(cache_key, _MISSING)
+    if ast is _MISSING and persistent_cache is not None:
+        ast = persistent_cache.get(kind, key, _MISSING)
+        if ast is not _MISSING:
+            ast_cache.put(cache_key, ast)
+
+    if ast is _MISSING:
+        if stats.enabled:
+            tokens = stats.current.timed('tokenise', Tokeniser(text).tokenise)
+            parser = Parser(tokens, fold_constants)
+            ast = stats.current.timed('parse', parser.parse)
+            stats.current.folded_nodes += parser.folded_nodes
+        else:
+            ast = Parser(Tokeniser(text).tokenise(), fold_constants).parse()
+        ast_cache.put(cache_key, ast)
+        if persistent_cache is not None:
+            persistent_cache.put(kind, key, ast)
+    return ast
+
+def evaluate(text, cache_result=True):
+    """Return the number, or simplified symbolic tree, that `text` evaluates to.
+
+    With `cache_result` the final result is memoised as well as the parse;
+    symbolic results also go to the persistent cache, if one is in use.
+    """
+    if not cache_result:
+        return _evaluate(compile(text))
+
+    key = normalise(text)
+    # Expanded and tree-simplified results of the same text are different trees.
+    cache_key = (key, expand_polynomials)
+    kind = 'expanded-result' if expand_polynomials else 'result'
+    result = result_cache.get(cache_key, _MISSING)
+    if result is _MISSING and persistent_cache is not None:
+        result = persistent_cache.get(kind, key, _MISSING)
+        if result is not _MISSING:
+            result_cache.put(cache_key, result)
+
+    if result is _MISSING:
+        result = _evaluate(compile(text))
+        result_cache.put(cache_key, result)
+        if persistent_cache is not None and isinstance(result, AST_NODE_TYPES):
+            persistent_cache.put(kind, key, result)
+    return result
+
+def evaluate_tree(ast, env=None):
+    """Evaluate and simplify an already parsed tree under `env`, without caching the result."""
+    return _evaluate(ast, env)
+
+def _evaluate(ast, env=None):
+    if stats.enabled:
+        return _evaluate_timed(ast, env)
+
+    result = partial_eval(ast, env)
+    if isinstance(result, AST_NODE_TYPES):
+        if simplify is None:
+            _load_symbolic()
+        result = _simplify_polynomial(result) if expand_polynomials else canonicalize(simplify(result))
+    return result
+
+def _evaluate_timed(ast, env):
+    timed = stats.current.timed
+    result = timed('eval', partial_eval, ast, env)
+    if isinstance(result, AST_NODE_TYPES):
+        if simplify is None:
+            _load_symbolic()
+        if expand_polynomials:
+            simplified = timed('simplify', _simplify_polynomial, result)
+            stats.current.simplified(result, simplified)
+            return simplified
+        simplified = timed('simplify', simplify, result)
+        stats.current.simplified(result, simplified)
+        result = timed('canonicalize', canonicalize, simplified)
+    return result
+
+def _simplify_polynomial(node):
+    # Polynomials skip the tree rewrites: expanding and collecting terms gives
+    # a canonical tree directly. Anything else takes the usual path.
+    from polynomial import NotPolynomialError, from_expr
+    try:
+        return from_expr(node).to_expr()
+    except NotPolynomialError:
+        return canonicalize(simplify(node))
+
+def _load_symbolic():
+    global simplify, canonicalize
+    from canonical import canonicalize
+    from symbolic import simplify
+
+def use_persistent_cache(cache):
+    """Share parses, derivatives and symbolic results through `cache`, a PersistentCache, or stop with None."""
+    global persistent_cache
+    import symbolic
+    persistent_cache = cache
+    symbolic.persistent_cache = cache
+    if cache is None:
+        stats.current.caches.pop('persistent', None)
+    else:
+        stats.current.register_cache('persistent', cache)
+
+def use_polynomials(enabled=True):
+    """Expand polynomial results and derivatives through polynomial.Polynomial, or stop with False."""
+    global expand_polynomials
+    import symbolic
+    expand_polynomials = symbolic.expand_polynomials = enabled
+
+def configure_caches(ast_size=None, result_size=None):
+    if ast_size is not None:
+        ast_cache.resize(ast_size)
+    if result_size is not None:
+        result_cache.resize(result_size)
+
+def cache_info():
+    return {'ast': ast_cache.info(), 'result': result_cache.info()}
+
+def clear_caches():
+    ast_cache.clear()
+    result_cache.clear()
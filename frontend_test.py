@@ -0,0 +1,87 @@
+import unittest
+
+from ast_eval import *
+from frontend import *
+
+
+class TestFrontend(unittest.TestCase):
+
+    def setUp(self):
+        clear_caches()
+
+    def test_can_compile_text(self):
+        expected = Operator(Op.ADD, Literal(2), Operator(Op.MULTIPLY, Literal(3), Variable('x')))
+        self.assertEqual(compile("2 + 3 * x"), expected)
+
+    def test_whitespace_variants_share_a_cache_entry(self):
+        first = compile("2+3 *x")
+        second = compile("  2+3   *x ")
+        self.assertIs(first, second)
+        self.assertEqual(cache_info()['ast'].hits, 1)
+        self.assertEqual(cache_info()['ast'].currsize, 1)
+
+    def test_errors_refer_to_the_text_as_written(self):
+        with self.assertRaisesRegex(ValueError, "Unknown character '\\$' at position 7"):
+            compile("x  +   $")
+        with self.assertRaisesRegex(ValueError, "at position 7"):
+            evaluate("x  +   $")
+
+    def test_can_evaluate_numeric_text(self):
+        self.assertEqual(evaluate("2 * (3 + 4)"), 14)
+
+    def test_can_evaluate_symbolic_text(self):
+        self.assertEqual(evaluate("diff(x ^ 2)"), Operator(Op.MULTIPLY, Literal(2.0), Variable('x')))
+
+    def test_results_are_cached(self):
+        evaluate("x * 1")
+        evaluate("x*1")
+        self.assertEqual(cache_info()['result'].hits, 1)
+        self.assertEqual(cache_info()['ast'].misses, 1)
+
+    def test_results_can_bypass_cache(self):
+        evaluate("x * 1", cache_result=False)
+        self.assertEqual(cache_info()['result'].currsize, 0)
+        self.assertEqual(cache_info()['ast'].currsize, 1)
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(ZeroDivisionError):
+            evaluate("1 / 0")
+        self.assertEqual(cache_info()['result'].currsize, 0)
+
+    def test_cache_size_is_bounded(self):
+        configure_caches(ast_size=2)
+        try:
+            for text in ["1", "2", "3"]:
+                compile(text)
+            self.assertEqual(cache_info()['ast'].currsize, 2)
+        finally:
+            configure_caches(ast_size=1024)
+
+    def test_folded_and_unfolded_parses_are_cached_apart(self):
+        import frontend
+
+        unfolded = compile("2*3+x")
+        frontend.fold_constants = True
+        try:
+            self.assertEqual(compile("2*3+x"), Operator(Op.ADD, Literal(6.0), Variable('x')))
+        finally:
+            frontend.fold_constants = False
+        self.assertIs(compile("2*3+x"), unfolded)
+
+    def test_can_fold_constants_while_compiling(self):
+        import frontend
+
+        texts = ["2 * 3 * x + 4 ^ 0.5", "diff(x ^ 3 * -(2 * 1))", "x * -1 - (3 - 3)"]
+        expected = [evaluate(text) for text in texts]
+        clear_caches()
+        frontend.fold_constants = True
+        try:
+            self.assertEqual(compile("2 * 3 * x + 4 ^ 0.5"),
+                             Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(6.0), Variable('x')), Literal(2.0)))
+            self.assertEqual([evaluate(text) for text in texts], expected)
+        finally:
+            frontend.fold_constants = False
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
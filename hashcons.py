@@ -0,0 +1,78 @@
+import weakref
+
+from ast_eval import Diff, Let, Literal, Operator, UnaryOp, Variable
+
+# Maps a node's structural key to the single live instance with that structure.
+# Interior keys use the ids of already-interned children, which stay valid for
+# as long as the parent entry is alive because the parent holds its children.
+_table = weakref.WeakValueDictionary()
+
+def _lookup(key, build):
+    node = _table.get(key)
+    if node is None:
+        node = build()
+        _table[key] = node
+    return node
+
+def literal(value):
+    return _lookup((Literal, repr(value)), lambda: Literal(value))
+
+def variable(name):
+    return _lookup((Variable, name), lambda: Variable(name))
+
+def unary(op, operand):
+    operand = hashcons(operand)
+    return _lookup((UnaryOp, op, id(operand)), lambda: UnaryOp(op, operand))
+
+def operator(op, left, right):
+    left = hashcons(left)
+    right = hashcons(right)
+    return _lookup((Operator, op, id(left), id(right)), lambda: Operator(op, left, right))
+
+def diff(expression, var='x', order=1):
+    expression = hashcons(expression)
+    return _lookup((Diff, id(expression), var, order), lambda: Diff(expression, var, order))
+
+def let(bindings, body):
+    bindings = tuple((name, hashcons(value)) for name, value in bindings)
+    body = hashcons(body)
+    key = (Let, tuple((name, id(value)) for name, value in bindings), id(body))
+    return _lookup(key, lambda: Let(bindings, body))
+
+def _key(node):
+    if isinstance(node, Literal):
+        return (Literal, repr(node.value))
+    if isinstance(node, Variable):
+        return (Variable, node.name)
+    if isinstance(node, UnaryOp):
+        return (UnaryOp, node.op, id(node.operand))
+    if isinstance(node, Operator):
+        return (Operator, node.op, id(node.left), id(node.right))
+    if isinstance(node, Diff):
+        return (Diff, id(node.expression), node.var, node.order)
+    if isinstance(node, Let):
+        return (Let, tuple((name, id(value)) for name, value in node.bindings), id(node.body))
+
+    raise TypeError(f"Unknown expression type: {type(node)}")
+
+def hashcons(node):
+    """Return the shared instance structurally equal to `node`, interning its subtrees."""
+    # Already-interned nodes (or nodes whose children already are) resolve in one lookup.
+    shared = _table.get(_key(node))
+    if shared is not None:
+        return shared
+
+    if isinstance(node, Literal):
+        return literal(node.value)
+    if isinstance(node, Variable):
+        return variable(node.name)
+    if isinstance(node, UnaryOp):
+        return unary(node.op, node.operand)
+    if isinstance(node, Operator):
+        return operator(node.op, node.left, node.right)
+    if isinstance(node, Diff):
+        return diff(node.expression, node.var, node.order)
+    return let(node.bindings, node.body)
+
+def table_size():
+    return len(_table)
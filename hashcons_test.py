@@ -0,0 +1,61 @@
+import gc
+import pickle
+import unittest
+
+from ast_eval import *
+from hashcons import *
+from symbolic import differentiate
+
+X = Variable('x')
+
+
+class TestHashcons(unittest.TestCase):
+
+    def test_equal_leaves_are_shared(self):
+        self.assertIs(literal(2.0), literal(2.0))
+        self.assertIs(variable('x'), variable('x'))
+
+    def test_int_and_float_literals_stay_distinct(self):
+        self.assertIsNot(literal(2), literal(2.0))
+
+    def test_equal_trees_are_shared(self):
+        first = Operator(Op.ADD, Operator(Op.MULTIPLY, X, Literal(2.0)), Literal(1.0))
+        second = Operator(Op.ADD, Operator(Op.MULTIPLY, Variable('x'), Literal(2.0)), Literal(1.0))
+        self.assertIsNot(first, second)
+        self.assertIs(hashcons(first), hashcons(second))
+
+    def test_interned_subtrees_are_shared(self):
+        expr = hashcons(differentiate(Operator(Op.MULTIPLY, X, X), 'x'))
+        self.assertIs(expr.left.right, expr.right.left)
+        self.assertIs(expr.left.left, expr.right.right)
+
+    def test_interned_tree_is_equal_to_original(self):
+        expr = Diff(UnaryOp(Op.SUBTRACT, Operator(Op.EXPONENT, X, Literal(3.0))), 'x')
+        self.assertEqual(hashcons(expr), expr)
+        self.assertEqual(hash(hashcons(expr)), hash(expr))
+
+    def test_unreferenced_nodes_leave_the_table(self):
+        # Collect garbage left by earlier tests first, so only this test's nodes are counted.
+        gc.collect()
+        before = table_size()
+        operator(Op.SUBTRACT, variable('unused'), literal(123.5))
+        gc.collect()
+        self.assertEqual(table_size(), before)
+
+
+class TestNodeHashing(unittest.TestCase):
+
+    def test_equality_short_circuits_on_identity(self):
+        expr = Operator(Op.ADD, X, Literal(1))
+        self.assertTrue(expr == expr)
+
+    def test_hash_is_not_pickled(self):
+        expr = Operator(Op.ADD, X, Literal(1))
+        hash(expr)
+        copy = pickle.loads(pickle.dumps(expr))
+        self.assertIsNone(copy._hash)
+        self.assertEqual(copy, expr)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -1,45 +1,191 @@
-from tokeniser import Tokeniser
-from parser import Parser
-# Import evaluate and the custom exception
-from ast_eval import eval, SymbolicResultError
-# We still need simplify if we want to clean up the final symbolic output
-from symbolic import simplify 
-
-def main():
+import itertools
+import os
+import sys
+from collections import deque
+
+from ast_eval import AST_NODE_TYPES
+# The front door tokenises, parses, evaluates and simplifies, caching by source text
+import frontend
+import stats
+
+# Everything else (argparse, cse, the session and symbolic modules) is imported
+# where it is first needed, so that `main.py -e EXPR` starts quickly; see
+# main_test.TestOneShot for the modules it may import.
+
+def format_result(text, session=None):
+    """Evaluate one input line and format it the way the REPL prints it.
+
+    With a `session`, lines of the form `name = expr` define session variables
+    that later lines can use.
+    """
+    try:
+        if session is None:
+            name, result = None, frontend.evaluate(text)
+        else:
+            name, result = session.execute(text)
+
+        # Numbers come back as-is; symbolic results come back simplified, with
+        # repeated subterms printed once as 'where t0 = ...'
+        if isinstance(result, AST_NODE_TYPES):
+            from cse import cse
+            result = cse(result)
+        return f"{name} = {result}" if name else f"= {result}"
+    except Exception as e:
+        # Catch all other unexpected/real errors
+        return f"Error: {e}"
+
+def evaluate_once(text, out=None):
+    """Print the result of a single expression to `out` (default stdout); returns the exit status."""
+    result = format_result(text)
+    (out or sys.stdout).write(f"{result}\n")
+    return 1 if result.startswith("Error: ") else 0
+
+def evaluate_chunk(lines):
+    return [format_result(line) if line.strip() else "" for line in lines]
+
+def _chunks(lines, size):
+    lines = iter(lines)
+    while chunk := list(itertools.islice(lines, size)):
+        yield chunk
+
+def run_batch(lines, out, workers=1, chunk_size=1000):
+    """Evaluate one expression per line, writing one result per line in input order.
+
+    With more than one worker, chunks of lines are evaluated in a process pool.
+    At most two chunks per worker are in flight, so input is streamed rather
+    than read up front.
+    """
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers and chunk_size must be at least 1")
+    lines = (line.rstrip("\r\n") for line in lines)
+
+    if workers == 1:
+        for chunk in _chunks(lines, chunk_size):
+            out.write("".join(f"{result}\n" for result in evaluate_chunk(chunk)))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in _chunks(lines, chunk_size):
+            pending.append(pool.submit(evaluate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                out.write("".join(f"{result}\n" for result in pending.popleft().result()))
+        while pending:
+            out.write("".join(f"{result}\n" for result in pending.popleft().result()))
+
+def stats_command(text):
+    """Handle ':stats', ':stats on', ':stats off' and ':stats reset'."""
+    argument = text[len(":stats"):].strip().lower()
+    if argument == "on":
+        stats.enable()
+        return "Instrumentation on."
+    if argument == "off":
+        stats.disable()
+        return "Instrumentation off."
+    if argument == "reset":
+        stats.current.reset()
+        return "Statistics reset."
+    if argument:
+        return f"Error: Unknown :stats option '{argument}'"
+    return stats.current.format()
+
+def vars_command(session):
+    if not session.definitions:
+        return "No variables defined."
+    return "\n".join(f"{name} = {source}" for name, (source, _) in session.definitions.items())
+
+def repl():
     print("--- Python CAS Calculator ---")
-    print("Type 'exit' or 'quit' to stop.")
-    
+    print("Type 'exit' or 'quit' to stop; 'name = expr' defines a variable, ':vars' lists them.")
+    from session import Session
+    session = Session()
+
     while True:
         try:
             text = input("calc> ").strip()
-            if text.lower() in ['exit', 'quit']: 
-                print("Goodbye!")
-                break
-            if not text: continue
-
-            lexer = Tokeniser(text)
-            tokens = lexer.tokenise()
-            
-            parser = Parser(tokens)
-            ast = parser.parse()
-            
-            # Attempt to evaluate everything
-            result = eval(ast)
-            
-            # If successful (no exception raised), print the number
-            print(f"= {result}")
-
-        except SymbolicResultError as e:
-            # If we catch the custom error, the result is the symbolic formula tree (e.node).
-            
-            # We simplify the result one last time before displaying
-            final_formula = simplify(e.node) 
-            
-            print(f"= {final_formula}") 
-
-        except Exception as e:
-            # Catch all other unexpected/real errors
-            print(f"Error: {e}")
+        except EOFError:
+            break
+
+        if text.lower() in ['exit', 'quit']:
+            print("Goodbye!")
+            break
+        if not text: continue
+
+        if text.startswith(":stats"):
+            print(stats_command(text))
+            continue
+        if text == ":vars":
+            print(vars_command(session))
+            continue
+
+        print(format_result(text, session))
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Scripts call `-e EXPR` on its own many times over, so skip argparse for it.
+    if len(argv) == 2 and argv[0] == "-e":
+        return evaluate_once(argv[1])
+
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Python CAS Calculator")
+    arg_parser.add_argument("-e", metavar="EXPR", dest="expression",
+                            help="evaluate EXPR, print the result and exit (status 1 on error)")
+    arg_parser.add_argument("--batch", metavar="FILE", nargs="?", const="-",
+                            help="evaluate one expression per line from FILE (or stdin) instead of the REPL")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="number of worker processes in batch mode")
+    arg_parser.add_argument("--chunk-size", type=int, default=1000,
+                            help="lines sent to a worker at a time in batch mode")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="record per-stage timings and counters (see :stats in the REPL)")
+    arg_parser.add_argument("--stats-json", metavar="PATH",
+                            help="enable --stats and write the statistics to PATH as JSON on exit; "
+                                 "batch workers are separate processes, so profile batches with --workers 1")
+    arg_parser.add_argument("--fold-constants", action="store_true",
+                            help="evaluate literal-only subexpressions while parsing")
+    arg_parser.add_argument("--expand-polynomials", action="store_true",
+                            help="expand and collect polynomial results and derivatives instead of simplifying them as trees")
+    arg_parser.add_argument("--cache", metavar="PATH",
+                            help="keep parsed expressions and derivatives in an SQLite file shared across runs")
+    args = arg_parser.parse_args(argv)
+    for option, value in (("--workers", args.workers), ("--chunk-size", args.chunk_size)):
+        if value < 1:
+            arg_parser.error(f"{option} must be at least 1")
+
+    if args.stats or args.stats_json:
+        stats.enable()
+
+    if args.fold_constants:
+        frontend.fold_constants = True
+
+    if args.expand_polynomials:
+        frontend.use_polynomials()
+
+    if args.cache:
+        from persistent_cache import PersistentCache
+        frontend.use_persistent_cache(PersistentCache(args.cache))
+
+    status = 0
+    try:
+        if args.expression is not None:
+            status = evaluate_once(args.expression)
+        elif args.batch is None:
+            repl()
+        elif args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, args.workers, args.chunk_size)
+        else:
+            with open(args.batch) as lines:
+                run_batch(lines, sys.stdout, args.workers, args.chunk_size)
+    finally:
+        if args.stats_json:
+            stats.current.dump(args.stats_json)
+        if args.cache:
+            frontend.persistent_cache.close()
+            frontend.use_persistent_cache(None)
+    return status
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import unittest
+
+from main import *
+
+
+class TestBatchMode(unittest.TestCase):
+
+    LINES = ["1 + 2\n", "diff(x ^ 2)\n", "\n", "1 / 0\n", "2 *\n", "x * 1\n"]
+    EXPECTED = [
+        "= 3.0",
+        "= (2.0 * x)",
+        "",
+        "Error: Cannot divide by zero.",
+        "Error: Expected number, found None",
+        "= x",
+    ]
+
+    def test_formats_results_like_the_repl(self):
+        self.assertEqual(format_result("2 ^ 3"), "= 8.0")
+        self.assertEqual(format_result("1 / 0"), "Error: Cannot divide by zero.")
+
+    def test_prints_repeated_subterms_once(self):
+        self.assertEqual(format_result("diff(y * (x + y) ^ 3, y)"),
+                         "= (((3.0 * (t0 ^ 2.0)) * y) + (t0 ^ 3.0)) where t0 = (x + y)")
+
+    def test_runs_in_process(self):
+        out = io.StringIO()
+        run_batch(self.LINES, out, workers=1, chunk_size=4)
+        self.assertEqual(out.getvalue().splitlines(), self.EXPECTED)
+
+    def test_runs_in_worker_pool_in_order(self):
+        out = io.StringIO()
+        run_batch(self.LINES * 20, out, workers=2, chunk_size=3)
+        self.assertEqual(out.getvalue().splitlines(), self.EXPECTED * 20)
+
+    def test_rejects_non_positive_workers_and_chunk_sizes(self):
+        with self.assertRaises(ValueError):
+            run_batch(self.LINES, io.StringIO(), chunk_size=0)
+        for option, value in (("--chunk-size", "0"), ("--workers", "0"), ("--workers", "-2")):
+            stderr = io.StringIO()
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(stderr):
+                main(["--batch", "-", option, value])
+            self.assertIn(f"{option} must be at least 1", stderr.getvalue())
+
+
+class TestOneShot(unittest.TestCase):
+
+    MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    # Modules that `main.py -e` must not import for input that needs no symbolic work.
+    DEFERRED = {"argparse", "symbolic", "canonical", "cse", "hashcons", "session",
+                "multiprocessing", "concurrent", "sqlite3", "json", "persistent_cache"}
+    # The only project modules `main.py -e` may import for numeric input.
+    EAGER = {"ast_eval", "cache", "frontend", "parser", "stats", "tokeniser"}
+
+    def run_main(self, *args):
+        return subprocess.run([sys.executable, "-X", "importtime", self.MAIN, *args],
+                              capture_output=True, text=True, timeout=60)
+
+    def imports(self, stderr):
+        """Top-level names of the modules imported after site."""
+        modules, started = set(), False
+        for line in stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            name = line.split("|")[-1].strip()
+            if started:
+                modules.add(name.split(".")[0])
+            elif name == "site":
+                started = True
+        return modules
+
+    def test_prints_result_and_exit_status(self):
+        process = self.run_main("-e", "1 + 2")
+        self.assertEqual((process.stdout, process.returncode), ("= 3.0\n", 0))
+        process = self.run_main("-e", "1 / 0")
+        self.assertEqual((process.stdout, process.returncode), ("Error: Cannot divide by zero.\n", 1))
+
+    def test_evaluates_in_process(self):
+        out = io.StringIO()
+        self.assertEqual(evaluate_once("diff(x ^ 2)", out), 0)
+        self.assertEqual(out.getvalue(), "= (2.0 * x)\n")
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(main(["--chunk-size", "10", "-e", "2 *"]), 1)
+        self.assertEqual(stdout.getvalue(), "Error: Expected number, found None\n")
+
+    def test_numeric_input_skips_the_symbolic_engine(self):
+        modules = self.imports(self.run_main("-e", "2 ^ 10").stderr)
+        self.assertIn("frontend", modules)
+        self.assertEqual(modules & self.DEFERRED, set())
+
+    def test_diff_loads_only_the_symbolic_engine(self):
+        process = self.run_main("-e", "diff(x ^ 3, x, 2)")
+        self.assertEqual(process.stdout, "= (6.0 * x)\n")
+        modules = self.imports(process.stderr)
+        self.assertLessEqual({"symbolic", "canonical", "cse"}, modules)
+        self.assertEqual(modules & {"argparse", "session", "multiprocessing", "concurrent", "sqlite3"}, set())
+
+    def test_imports_only_the_front_door(self):
+        # Checked by module rather than by time, which varies with the machine's load.
+        modules = self.imports(self.run_main("-e", "1 + 2").stderr)
+        directory = os.path.dirname(self.MAIN)
+        project = {name for name in modules if os.path.exists(os.path.join(directory, name + ".py"))}
+        self.assertEqual(project, self.EAGER)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
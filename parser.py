@@ -1,17 +1,66 @@
-from ast_eval import *
+from ast_eval import Diff, Literal, Op, Operator, UnaryOp, Variable
+
+# Left binding powers of the infix operators. Prefix + and - parse their operand
+# at UNARY_POWER, so they bind tighter than * and / but looser than ^.
+_BINARY_POWER = {
+    Op.ADD: 10,
+    Op.SUBTRACT: 10,
+    Op.MULTIPLY: 20,
+    Op.DIVIDE: 20,
+    Op.EXPONENT: 40,
+}
+UNARY_POWER = 30
+
+def _right_power(op):
+    # ^ is right associative and its right operand may itself start with a sign.
+    if op == Op.EXPONENT:
+        return UNARY_POWER
+    return _BINARY_POWER[op]
+
+# Kinds of pending work kept on the parser's explicit stack.
+_BINARY, _UNARY, _GROUP, _DIFF = range(4)
+
+def _fold(op, left, right):
+    """The value ast_eval.eval gives `left op right`, or None to leave the node unfolded."""
+    try:
+        if op == Op.ADD:
+            value = left + right
+        elif op == Op.SUBTRACT:
+            value = left - right
+        elif op == Op.MULTIPLY:
+            value = left * right
+        elif op == Op.DIVIDE:
+            # Division by zero stays in the tree, so evaluating it raises
+            # ZeroDivisionError exactly as it does without folding.
+            if right == 0:
+                return None
+            value = left / right
+        else:
+            value = left ** right
+    except ArithmeticError:
+        return None
+    return None if isinstance(value, complex) else value
 
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0
-        self.current_token = self.tokens[0] if tokens else None
+    """Builds an expression tree from a token stream.
+
+    With `fold_constants`, an operator whose operands are all literals is
+    evaluated as it is parsed and becomes a single Literal, so `2 * 3 ^ 2 + x`
+    parses to `18 + x`. Operations that would raise or give a complex number are
+    left in the tree for evaluation to handle. `folded_nodes` counts the
+    Operator and UnaryOp nodes folded away instead of being built.
+    """
+    def __init__(self, tokens, fold_constants=False):
+        self.fold_constants = fold_constants
+        self.folded_nodes = 0
+        self.tokens = iter(tokens)
+        self.pos = -1
+        self.current_token = None
+        self.advance()
 
     def advance(self):
         self.pos += 1
-        if self.pos < len(self.tokens):
-            self.current_token = self.tokens[self.pos]
-        else:
-            self.current_token = None
+        self.current_token = next(self.tokens, None)
 
     def parse(self):
         result = self.parse_expression()
@@ -22,89 +71,115 @@ class Parser:
         return result
 
     def parse_expression(self):
-        left_node = self.parse_term()
-
-        while self.current_token in [Op.ADD, Op.SUBTRACT]:
-            op = self.current_token
-            self.advance()
-            right_node = self.parse_term()
-            left_node = Operator(op, left_node, right_node)
-
-        return left_node
+        """Pratt parser driven by an explicit stack instead of recursion.
 
-    def parse_term(self):
-        left_node = self.parse_unary()
+        Each stack entry records an operator or bracket still waiting for its
+        operand, together with the binding power in force outside it.
+        """
+        stack = []
+        power = 0
 
-        while self.current_token in [Op.MULTIPLY, Op.DIVIDE]:
-            op = self.current_token
-            self.advance()
-            right_node = self.parse_unary()
-            left_node = Operator(op, left_node, right_node)
+        while True:
+            # Prefix position: push signs and openers until an operand is found.
+            token = self.current_token
 
-        return left_node
+            if token == Op.ADD or token == Op.SUBTRACT:
+                stack.append((_UNARY, token, power))
+                power = UNARY_POWER
+                self.advance()
+                continue
 
-    def parse_unary(self):
-        if self.current_token in [Op.ADD, Op.SUBTRACT]:
-            op = self.current_token
-            self.advance()
-            operand = self.parse_unary()
-            return UnaryOp(op, operand)
+            if token == Op.LPAREN:
+                stack.append((_GROUP, None, power))
+                power = 0
+                self.advance()
+                continue
 
-        return self.parse_exponent()
+            if isinstance(token, Literal):
+                node = token
+                self.advance()
 
-    def parse_exponent(self):
-        left_node = self.parse_factor()
+            elif isinstance(token, Variable):
+                self.advance()
+                if token.name != 'diff':
+                    node = token
+                else:
+                    if self.current_token != Op.LPAREN: raise ValueError("Expected '(' after diff")
+                    self.advance()
+                    stack.append((_DIFF, None, power))
+                    power = 0
+                    continue
 
-        while self.current_token == Op.EXPONENT:
-            op = self.current_token
-            self.advance()
-            right_node = self.parse_unary()
-            left_node = Operator(op, left_node, right_node)
+            else:
+                raise ValueError(f"Expected number, found {token}")
 
-        return left_node
+            # Infix position: extend the operand or close pending stack entries.
+            while True:
+                token = self.current_token
+                op_power = _BINARY_POWER.get(token, 0) if isinstance(token, Op) else 0
 
-    def parse_factor(self):
-        token = self.current_token
+                if op_power > power:
+                    stack.append((_BINARY, (token, node), power))
+                    power = _right_power(token)
+                    self.advance()
+                    break
 
-        if isinstance(token, Literal):
-            self.advance()
-            return token
+                if not stack:
+                    return node
 
-        if isinstance(token, Variable):
-            if token.name == 'diff':
-                self.advance()
+                kind, pending, power = stack.pop()
 
-                if self.current_token != Op.LPAREN: raise ValueError("Expected '(' after diff")
-                self.advance()
+                if kind == _BINARY:
+                    op, left_node = pending
+                    node = self.binary(op, left_node, node)
 
-                expr = self.parse_expression()
+                elif kind == _UNARY:
+                    node = self.unary(pending, node)
 
-                target_var = 'x'
-                if self.current_token == Op.COMMA:
+                elif kind == _GROUP:
+                    if self.current_token != Op.RPAREN:
+                        raise ValueError(f"Missing closing parenthesis")
                     self.advance()
 
-                    if isinstance(self.current_token, Variable):
-                        target_var = self.current_token.name
-                        self.advance()
-                    else:
-                        raise ValueError("Expected variable name after comma in diff")
-                    
-                if self.current_token != Op.RPAREN: raise ValueError("Missing ')' for diff")
-                self.advance()
-
-                return Diff(expr, target_var)
-
+                else:
+                    node = Diff(node, *self.parse_diff_target())
+
+    def binary(self, op, left, right):
+        if self.fold_constants and isinstance(left, Literal) and isinstance(right, Literal):
+            value = _fold(op, left.value, right.value)
+            if value is not None:
+                self.folded_nodes += 1
+                return Literal(value)
+        return Operator(op, left, right)
+
+    def unary(self, op, operand):
+        if self.fold_constants and isinstance(operand, Literal):
+            self.folded_nodes += 1
+            return Literal(-operand.value) if op == Op.SUBTRACT else operand
+        return UnaryOp(op, operand)
+
+    def parse_diff_target(self):
+        target_var = 'x'
+        order = 1
+        if self.current_token == Op.COMMA:
             self.advance()
-            return token
 
-        if self.current_token == Op.LPAREN:
-            self.advance()
-            result = self.parse_expression()
+            if isinstance(self.current_token, Variable):
+                target_var = self.current_token.name
+                self.advance()
+            else:
+                raise ValueError("Expected variable name after comma in diff")
+
+            if self.current_token == Op.COMMA:
+                self.advance()
 
-            if self.current_token == Op.RPAREN:
+                token = self.current_token
+                if not (isinstance(token, Literal) and float(token.value).is_integer() and token.value >= 1):
+                    raise ValueError("Expected a positive whole number for the order of diff")
+                order = int(token.value)
                 self.advance()
-                return result
 
-            raise ValueError(f"Missing closing parenthesis")
+        if self.current_token != Op.RPAREN: raise ValueError("Missing ')' for diff")
+        self.advance()
 
-        raise ValueError(f"Expected number, found {token}")
\ No newline at end of file
+        return target_var, order
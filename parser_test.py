@@ -2,6 +2,7 @@ from math import exp
 import token
 import unittest
 
+import ast_eval
 from parser import *
 from tokeniser import *
 
@@ -63,6 +64,95 @@ class TestASTEval(unittest.TestCase):
         expected_expr = Operator(Op.MULTIPLY, Literal(2), expr2)
 
         self.assertEqual(parser.parse(), expected_expr)
+    def test_exponent_is_right_associative(self):
+        tokens = Tokeniser("2 ^ 3 ^ 2").tokenise()
+        expected = Operator(Op.EXPONENT, Literal(2), Operator(Op.EXPONENT, Literal(3), Literal(2)))
+        self.assertEqual(Parser(tokens).parse(), expected)
+
+    def test_unary_minus_binds_looser_than_exponent(self):
+        tokens = Tokeniser("-2 ^ -x * 3").tokenise()
+        power = Operator(Op.EXPONENT, Literal(2), UnaryOp(Op.SUBTRACT, Variable('x')))
+        expected = Operator(Op.MULTIPLY, UnaryOp(Op.SUBTRACT, power), Literal(3))
+        self.assertEqual(Parser(tokens).parse(), expected)
+
+    def test_can_parse_diff(self):
+        tokens = Tokeniser("diff(x * y, y) + 1").tokenise()
+        expected = Operator(Op.ADD, Diff(Operator(Op.MULTIPLY, Variable('x'), Variable('y')), 'y'), Literal(1))
+        self.assertEqual(Parser(tokens).parse(), expected)
+
+    def test_can_parse_diff_with_order(self):
+        tokens = Tokeniser("diff(x ^ 3, x, 2)").tokenise()
+        expected = Diff(Operator(Op.EXPONENT, Variable('x'), Literal(3)), 'x', 2)
+        self.assertEqual(Parser(tokens).parse(), expected)
+
+    def test_rejects_fractional_diff_order(self):
+        with self.assertRaisesRegex(ValueError, "order of diff"):
+            Parser(Tokeniser("diff(x, x, 1.5)").tokenise()).parse()
+
+    def test_can_parse_from_token_iterator(self):
+        tokens = Tokeniser("2 * (x + 1)").iter_tokenise()
+        expected = Operator(Op.MULTIPLY, Literal(2), Operator(Op.ADD, Variable('x'), Literal(1)))
+        self.assertEqual(Parser(tokens).parse(), expected)
+
+    def test_can_parse_deeply_nested_brackets(self):
+        depth = 5000
+        tokens = Tokeniser("(" * depth + "x" + ")" * depth).iter_tokenise()
+        self.assertEqual(Parser(tokens).parse(), Variable('x'))
+
+    def test_can_parse_long_unary_chain(self):
+        node = Parser(Tokeniser("-" * 5000 + "1").iter_tokenise()).parse()
+        for _ in range(5000):
+            self.assertEqual(node.op, Op.SUBTRACT)
+            node = node.operand
+        self.assertEqual(node, Literal(1))
+
+    def test_reports_missing_closing_parenthesis(self):
+        with self.assertRaisesRegex(ValueError, "Missing closing parenthesis"):
+            Parser(Tokeniser("(1 + 2").tokenise()).parse()
+
+    def test_reports_leftover_tokens(self):
+        with self.assertRaisesRegex(ValueError, "Unexpected token remaining"):
+            Parser(Tokeniser("1 + 2)").tokenise()).parse()
+
+
+class TestConstantFolding(unittest.TestCase):
+
+    def parse(self, text):
+        parser = Parser(Tokeniser(text).tokenise(), fold_constants=True)
+        return parser.parse(), parser.folded_nodes
+
+    def test_folds_literal_subtrees(self):
+        self.assertEqual(self.parse("2 * 3 ^ 2 + 4"), (Literal(22.0), 3))
+        node, folded = self.parse("-(2 + 3) * x + 2 ^ -1")
+        self.assertEqual(node, Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(-5.0), Variable('x')), Literal(0.5)))
+        self.assertEqual(folded, 4)
+
+    def test_is_off_by_default(self):
+        parser = Parser(Tokeniser("2 * 3").tokenise())
+        self.assertEqual(parser.parse(), Operator(Op.MULTIPLY, Literal(2), Literal(3)))
+        self.assertEqual(parser.folded_nodes, 0)
+
+    def test_does_not_fold_across_variables_or_into_diff(self):
+        node, folded = self.parse("diff(2 * x * 3, x)")
+        self.assertEqual(node, Diff(Operator(Op.MULTIPLY, Operator(Op.MULTIPLY, Literal(2), Variable('x')),
+                                             Literal(3)), 'x', 1))
+        self.assertEqual(folded, 0)
+
+    def test_leaves_failing_operations_for_evaluation(self):
+        node, folded = self.parse("1 + 1 / (2 - 2)")
+        self.assertEqual(node, Operator(Op.ADD, Literal(1), Operator(Op.DIVIDE, Literal(1), Literal(0))))
+        self.assertEqual(folded, 1)
+        with self.assertRaisesRegex(ZeroDivisionError, "Cannot divide by zero."):
+            ast_eval.eval(node)
+
+        for text in ["0 ^ -1", "(-8) ^ (1 / 3)", "10 ^ 400"]:
+            self.assertIsInstance(self.parse(text)[0], Operator)
+
+    def test_matches_unfolded_evaluation(self):
+        for text in ["1 - 2 - 3", "2 ^ 3 ^ 2", "-2 ^ 2", "+4 / 8 * 3", "7 - -(2 * 3)"]:
+            unfolded = Parser(Tokeniser(text).tokenise()).parse()
+            self.assertEqual(self.parse(text)[0].value, ast_eval.eval(unfolded))
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
\ No newline at end of file
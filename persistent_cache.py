@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import compact
+
+# A hit only rewrites last_used when it is older than this, which keeps
+# read-mostly workloads from contending for the write lock.
+TOUCH_INTERVAL = 1.0
+
+# Size limits are enforced every this many writes rather than on each one.
+EVICT_EVERY = 64
+
+# Stored in the file's user_version; files written in an older format are emptied on open.
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+def structural_key(node):
+    """A key for `node` that is stable across processes, unlike hash()."""
+    return hashlib.sha256(repr(node).encode()).hexdigest()
+
+def _derivative_key(node, var_name, order):
+    return f"{structural_key(node)}:{var_name}:{order}"
+
+def _encode(node):
+    # Plain JSON arrays rather than pickle, so reading a shared file cannot run code.
+    expr = compact.from_expr(node)
+    return json.dumps({
+        'ops': expr.ops.tolist(),
+        'left': expr.left.tolist(),
+        'right': expr.right.tolist(),
+        'literals': [[value.real, value.imag] if isinstance(value, complex) else value for value in expr.literals],
+        'names': expr.names,
+        'orders': list(expr.orders.items()),
+        'root': expr.root,
+    }, separators=(',', ':')).encode()
+
+def _decode(value):
+    data = json.loads(value)
+    expr = compact.CompactExpr()
+    expr.ops.extend(data['ops'])
+    expr.left.extend(data['left'])
+    expr.right.extend(data['right'])
+    expr.literals = [complex(*literal) if isinstance(literal, list) else literal for literal in data['literals']]
+    expr.names = data['names']
+    expr.orders = dict(data['orders'])
+    expr.root = data['root']
+    return compact.to_expr(expr)
+
+class PersistentCache:
+    """An LRU cache of expression trees in an SQLite file.
+
+    Entries are grouped by `kind` ('ast', 'folded-ast' and 'result' for parses,
+    constant-folded parses and symbolic results keyed by normalised source,
+    'derivative' for simplified derivatives keyed by structural_key, and
+    'expanded-result' and 'expanded-derivative' for those made with
+    frontend.use_polynomials) and stored as the JSON-encoded arrays of their
+    compact form. The file uses WAL journaling and writes take the lock up
+    front, so any number of processes can share it.
+    Past `max_entries` entries or `max_bytes` bytes of stored trees, the least
+    recently used entries are evicted.
+    """
+    def __init__(self, path, max_entries=100000, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._connection = None
+        self._pid = None
+
+        with self._transaction() as connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] < FORMAT_VERSION:
+                connection.execute("DROP TABLE IF EXISTS entries")
+                connection.execute(f"PRAGMA user_version = {FORMAT_VERSION}")
+        self._connect().executescript(_SCHEMA)
+        self.evict()
+
+    def _connect(self):
+        # A connection must not be shared with a forked child, so each process opens its own.
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    def get(self, kind, key, default=None):
+        connection = self._connect()
+        # fetchall() finishes the statement, so no read transaction is left open
+        # to block the UPDATE below from taking the write lock.
+        rows = connection.execute("SELECT value, last_used FROM entries WHERE kind = ? AND key = ?",
+                                  (kind, key)).fetchall()
+        if not rows:
+            self.misses += 1
+            return default
+
+        value, last_used = rows[0]
+        now = time.time()
+        if now - last_used > TOUCH_INTERVAL:
+            connection.execute("UPDATE entries SET last_used = ? WHERE kind = ? AND key = ?", (now, kind, key))
+
+        self.hits += 1
+        return _decode(value)
+
+    def put(self, kind, key, node):
+        value = _encode(node)
+        with self._transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                               (kind, key, value, len(value), time.time()))
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(connection)
+
+    def derivative(self, node, var_name, order, kind='derivative'):
+        """The cached simplified derivative of `node`, or None."""
+        return self.get(kind, _derivative_key(node, var_name, order))
+
+    def put_derivative(self, node, var_name, order, result, kind='derivative'):
+        self.put(kind, _derivative_key(node, var_name, order), result)
+
+    def _evict(self, connection):
+        count, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and (self.max_bytes is None or total <= self.max_bytes):
+            return
+
+        doomed = []
+        for kind, key, size in connection.execute("SELECT kind, key, size FROM entries ORDER BY last_used").fetchall():
+            if count <= self.max_entries and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            doomed.append((kind, key))
+            count -= 1
+            total -= size
+        connection.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", doomed)
+
+    def evict(self):
+        """Enforce the size limits now instead of at the next periodic check."""
+        with self._transaction() as connection:
+            self._evict(connection)
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM entries")
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolling back on error."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,161 @@
+import io
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+import unittest.mock
+from concurrent.futures import ProcessPoolExecutor
+
+from ast_eval import *
+import frontend
+import main
+from persistent_cache import *
+import symbolic
+
+
+def fill(path, worker):
+    cache = PersistentCache(path)
+    for i in range(30):
+        cache.put('ast', f"{worker}-{i}", Operator(Op.ADD, Variable('x'), Literal(i)))
+        cache.get('ast', f"{(worker + 1) % 4}-{i}")
+    cache.close()
+    return worker
+
+
+class TestPersistentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite")
+
+    def tearDown(self):
+        frontend.use_persistent_cache(None)
+        frontend.clear_caches()
+        self.directory.cleanup()
+
+    def test_round_trip_survives_reopening(self):
+        tree = Operator(Op.MULTIPLY, Diff(Variable('x'), 'x', 2), Literal(2))
+        cache = PersistentCache(self.path)
+        cache.put('ast', "key", tree)
+        cache.close()
+
+        cache = PersistentCache(self.path)
+        self.assertEqual(repr(cache.get('ast', "key")), repr(tree))
+        self.assertIsNone(cache.get('ast', "other"))
+        self.assertIsNone(cache.get('derivative', "key"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.close()
+
+    def test_stores_plain_arrays(self):
+        tree = Operator(Op.ADD, Diff(Variable('y'), 'y', 3), Operator(Op.MULTIPLY, Literal(1j), Literal(math.inf)))
+        cache = PersistentCache(self.path)
+        cache.put('ast', "key", tree)
+        value, = cache._connect().execute("SELECT value FROM entries").fetchone()
+        self.assertEqual(json.loads(value)['names'], ['y'])
+        self.assertEqual(repr(cache.get('ast', "key")), repr(tree))
+        cache.close()
+
+    def test_empties_files_in_an_older_format(self):
+        connection = sqlite3.connect(self.path)
+        connection.executescript("CREATE TABLE entries (kind TEXT, key TEXT, value BLOB, size INTEGER, last_used REAL);"
+                                  "INSERT INTO entries VALUES ('ast', 'key', x'80049500', 4, 0);")
+        connection.close()
+        cache = PersistentCache(self.path)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('ast', "key"))
+        cache.close()
+
+    def test_evicts_least_recently_used(self):
+        cache = PersistentCache(self.path, max_entries=3)
+        for i in range(4):
+            cache.put('ast', str(i), Literal(i))
+            cache._connect().execute("UPDATE entries SET last_used = ? WHERE key = ?", (i, str(i)))
+        cache.evict()
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('ast', "0"))
+        self.assertEqual(cache.get('ast', "3"), Literal(3))
+        cache.close()
+
+    def test_evicts_by_size(self):
+        cache = PersistentCache(self.path, max_bytes=1)
+        cache.put('ast', "a", Variable('x'))
+        cache.evict()
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+    def test_concurrent_processes(self):
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            self.assertEqual(sorted(pool.map(fill, [self.path] * 4, range(4))), [0, 1, 2, 3])
+        cache = PersistentCache(self.path)
+        self.assertEqual(len(cache), 120)
+        cache.close()
+
+    def test_frontend_reuses_results_parses_and_derivatives(self):
+        text = "diff((x + 1) / (x * x + 1), x, 2)"
+        frontend.use_persistent_cache(PersistentCache(self.path))
+        expected = frontend.evaluate(text)
+        frontend.persistent_cache.close()
+
+        # A fresh process: empty in-memory caches, same file.
+        frontend.clear_caches()
+        symbolic.clear_caches()
+        cache = PersistentCache(self.path)
+        frontend.use_persistent_cache(cache)
+        self.assertEqual(repr(frontend.evaluate(text)), repr(expected))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+        # Without the stored result, the parse and the derivative are still reused.
+        self.assertEqual(repr(frontend.evaluate(text, cache_result=False)), repr(expected))
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(symbolic.differentiate_cache.misses, 0)
+        cache.close()
+
+    def test_folded_parses_are_stored_apart(self):
+        cache = PersistentCache(self.path)
+        frontend.use_persistent_cache(cache)
+        frontend.compile("2 * 3 + x")
+        frontend.clear_caches()
+        frontend.fold_constants = True
+        try:
+            self.assertEqual(frontend.compile("2 * 3 + x"), Operator(Op.ADD, Literal(6.0), Variable('x')))
+        finally:
+            frontend.fold_constants = False
+        self.assertEqual(repr(cache.get('ast', "2*3+x")), "((2.0 * 3.0) + x)")
+        self.assertEqual(repr(cache.get('folded-ast', "2*3+x")), "(6.0 + x)")
+        cache.close()
+
+    def test_expanded_results_and_derivatives_are_stored_apart(self):
+        cache = PersistentCache(self.path)
+        frontend.use_persistent_cache(cache)
+        frontend.evaluate("diff((x + 1) ^ 2) * (x + 1)")
+        frontend.clear_caches()
+        symbolic.clear_caches()
+        frontend.use_polynomials()
+        try:
+            self.assertEqual(repr(frontend.evaluate("diff((x + 1) ^ 2) * (x + 1)")),
+                             "(((2.0 * (x ^ 2.0)) + (4.0 * x)) + 2.0)")
+        finally:
+            frontend.use_polynomials(False)
+        key = "diff((x+1)^2)*(x+1)"
+        self.assertNotEqual(repr(cache.get('result', key)), repr(cache.get('expanded-result', key)))
+        self.assertIsNotNone(cache.derivative(frontend.compile("(x + 1) ^ 2"), 'x', 1, 'expanded-derivative'))
+        cache.close()
+
+    def test_main_cache_flag(self):
+        batch = os.path.join(self.directory.name, "input.txt")
+        with open(batch, "w") as f:
+            f.write("diff(x ^ 3)\n")
+        stdout = io.StringIO()
+        with unittest.mock.patch('sys.stdout', stdout):
+            main.main(["--batch", batch, "--workers", "1", "--cache", self.path])
+        self.assertEqual(stdout.getvalue(), "= (3.0 * (x ^ 2.0))\n")
+        self.assertIsNone(frontend.persistent_cache)
+        cache = PersistentCache(self.path)
+        self.assertEqual(len(cache), 3)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,230 @@
+from ast_eval import *
+import canonical
+import symbolic
+
+# Expanding something like (a + b + c) ^ 40 is worse than the tree path, so
+# conversion gives up past this many terms.
+MAX_TERMS = 10000
+
+class NotPolynomialError(ValueError):
+    """Raised when an expression cannot be represented as a sparse polynomial."""
+
+class Polynomial:
+    """A sparse polynomial: exponent tuples over `variables` mapped to coefficients."""
+    def __init__(self, variables, terms):
+        self.variables = tuple(variables)
+        self.terms = {exponents: coefficient for exponents, coefficient in terms.items() if coefficient != 0}
+        self._scheme = None
+
+    def __repr__(self):
+        return f"Polynomial({self.variables}, {self.terms})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Polynomial):
+            return NotImplemented
+        return self.variables == other.variables and self.terms == other.terms
+
+    @classmethod
+    def constant(cls, variables, value):
+        return cls(variables, {(0,) * len(variables): value})
+
+    @classmethod
+    def variable(cls, variables, name):
+        exponents = tuple(1 if variable == name else 0 for variable in variables)
+        return cls(variables, {exponents: 1.0})
+
+    def constant_value(self):
+        if not self.terms:
+            return 0.0
+        if len(self.terms) == 1 and not any(next(iter(self.terms))):
+            return next(iter(self.terms.values()))
+        return None
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for exponents, coefficient in other.terms.items():
+            terms[exponents] = terms.get(exponents, 0) + coefficient
+        return Polynomial(self.variables, terms)
+
+    def __neg__(self):
+        return self.scale(-1)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __mul__(self, other):
+        terms = {}
+        for left_exponents, left_coefficient in self.terms.items():
+            for right_exponents, right_coefficient in other.terms.items():
+                exponents = tuple(a + b for a, b in zip(left_exponents, right_exponents))
+                terms[exponents] = terms.get(exponents, 0) + left_coefficient * right_coefficient
+            if len(terms) > MAX_TERMS:
+                raise NotPolynomialError(f"Polynomial expansion exceeds {MAX_TERMS} terms")
+        return Polynomial(self.variables, terms)
+
+    def __pow__(self, exponent):
+        result = Polynomial.constant(self.variables, 1.0)
+        base = self
+        while exponent:
+            if exponent & 1:
+                result = result * base
+            exponent >>= 1
+            if exponent:
+                base = base * base
+        return result
+
+    def scale(self, factor):
+        return Polynomial(self.variables, {exponents: coefficient * factor
+                                           for exponents, coefficient in self.terms.items()})
+
+    def differentiate(self, var_name):
+        if var_name not in self.variables:
+            return Polynomial(self.variables, {})
+
+        index = self.variables.index(var_name)
+        terms = {}
+        for exponents, coefficient in self.terms.items():
+            power = exponents[index]
+            if power:
+                lowered = exponents[:index] + (power - 1,) + exponents[index + 1:]
+                terms[lowered] = terms.get(lowered, 0) + coefficient * power
+        return Polynomial(self.variables, terms)
+
+    def evaluate(self, env):
+        """Evaluate at numeric values for every variable using nested Horner schemes."""
+        missing = [name for name in self.variables if name not in env]
+        if missing:
+            raise ValueError(f"No value bound for variable '{missing[0]}'")
+
+        if self._scheme is None:
+            self._scheme = _horner_scheme(self.terms, len(self.variables), 0)
+        return _evaluate_scheme(self._scheme, [env[name] for name in self.variables], 0)
+
+    def to_expr(self):
+        terms = {}
+        for exponents, coefficient in self.terms.items():
+            monomial = tuple((Variable(name), float(power))
+                             for name, power in zip(self.variables, exponents) if power)
+            terms[monomial] = coefficient
+        return canonical.build(terms)
+
+def _horner_scheme(terms, count, index):
+    # (degree, coefficient) pairs for the variable at `index`, highest degree
+    # first, each coefficient a scheme over the remaining variables. Only the
+    # degrees present are kept, so x ^ 1000000 + 1 has two entries.
+    if index == count:
+        return sum(terms.values())
+
+    groups = {}
+    for exponents, coefficient in terms.items():
+        groups.setdefault(exponents[index], {})[exponents] = coefficient
+
+    return [(degree, _horner_scheme(groups[degree], count, index + 1)) for degree in sorted(groups, reverse=True)]
+
+def _evaluate_scheme(scheme, values, index):
+    if not isinstance(scheme, list):
+        return scheme
+
+    x = values[index]
+    result = 0
+    previous = scheme[0][0]
+    for degree, coefficient in scheme:
+        # Skipping over absent degrees multiplies by x once per gap.
+        result = result * x ** (previous - degree) + _evaluate_scheme(coefficient, values, index + 1)
+        previous = degree
+    return result * x ** previous
+
+def _variables(node, names):
+    if isinstance(node, Variable):
+        names.add(node.name)
+    elif isinstance(node, UnaryOp):
+        _variables(node.operand, names)
+    elif isinstance(node, Operator):
+        _variables(node.left, names)
+        _variables(node.right, names)
+    elif isinstance(node, Diff):
+        _variables(node.expression, names)
+    return names
+
+def from_expr(node, variables=None):
+    """Convert an expression tree to a Polynomial, raising NotPolynomialError if it is not one."""
+    if variables is None:
+        variables = sorted(_variables(node, set()))
+    return _convert(node, tuple(variables))
+
+def _convert(node, variables):
+    if isinstance(node, Literal):
+        return Polynomial.constant(variables, node.value)
+
+    if isinstance(node, Variable):
+        if node.name not in variables:
+            raise NotPolynomialError(f"Unknown variable '{node.name}'")
+        return Polynomial.variable(variables, node.name)
+
+    if isinstance(node, UnaryOp):
+        operand = _convert(node.operand, variables)
+        return -operand if node.op == Op.SUBTRACT else operand
+
+    if isinstance(node, Diff):
+        result = _convert(node.expression, variables)
+        for _ in range(node.order):
+            result = result.differentiate(node.var)
+        return result
+
+    if isinstance(node, Operator):
+        left = _convert(node.left, variables)
+        right = _convert(node.right, variables)
+
+        if node.op == Op.ADD:
+            return left + right
+        if node.op == Op.SUBTRACT:
+            return left - right
+        if node.op == Op.MULTIPLY:
+            return left * right
+        if node.op == Op.DIVIDE:
+            divisor = right.constant_value()
+            if divisor is None:
+                raise NotPolynomialError("Division by a non-constant expression")
+            if divisor == 0:
+                # The tree path keeps x / 0 as it is, so evaluating it still raises.
+                raise NotPolynomialError("Division by zero")
+            return left.scale(1 / divisor)
+        if node.op == Op.EXPONENT:
+            exponent = right.constant_value()
+            if (exponent is None or isinstance(exponent, complex) or exponent < 0
+                    or not float(exponent).is_integer()):
+                raise NotPolynomialError(f"Exponent is not a non-negative integer: {node.right}")
+            return left ** int(exponent)
+
+    raise NotPolynomialError(f"Not a polynomial node: {node}")
+
+def is_polynomial(node):
+    try:
+        from_expr(node)
+    except NotPolynomialError:
+        return False
+    return True
+
+def differentiate(node, var_name):
+    """Simplified derivative, through the polynomial form when `node` is a polynomial."""
+    try:
+        return from_expr(node).differentiate(var_name).to_expr()
+    except NotPolynomialError:
+        return symbolic.simplify(symbolic.differentiate(node, var_name))
+
+def simplify(node):
+    try:
+        return from_expr(node).to_expr()
+    except NotPolynomialError:
+        return symbolic.simplify(node)
+
+def evaluate(node, env):
+    """Numeric value of `node` under `env`, with Horner evaluation for polynomials."""
+    try:
+        polynomial = from_expr(node)
+    except NotPolynomialError:
+        return partial_eval(node, env)
+
+    if any(name not in env for name in polynomial.variables):
+        return partial_eval(node, env)
+    return polynomial.evaluate(env)
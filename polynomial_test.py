@@ -0,0 +1,82 @@
+import unittest
+
+from ast_eval import *
+import frontend
+from frontend import compile
+from polynomial import *
+import symbolic
+
+
+class TestPolynomial(unittest.TestCase):
+
+    def test_can_convert_polynomial(self):
+        poly = from_expr(compile("3 * x ^ 2 * y + x - 4"))
+        self.assertEqual(poly.variables, ('x', 'y'))
+        self.assertEqual(poly.terms, {(2, 1): 3.0, (1, 0): 1.0, (0, 0): -4.0})
+
+    def test_expands_products_and_powers(self):
+        poly = from_expr(compile("(x + 1) ^ 2 - (x - 1) * (x + 1)"))
+        self.assertEqual(poly.terms, {(1,): 2.0, (0,): 2.0})
+
+    def test_detects_non_polynomials(self):
+        self.assertTrue(is_polynomial(compile("x ^ 3 / 2 + y")))
+        self.assertFalse(is_polynomial(compile("1 / x")))
+        self.assertFalse(is_polynomial(compile("x ^ 0.5")))
+        self.assertFalse(is_polynomial(compile("2 ^ x")))
+
+    def test_round_trips_to_expression(self):
+        expr = compile("2 * x * x + 3 * x * y - 1")
+        self.assertEqual(from_expr(from_expr(expr).to_expr()), from_expr(expr))
+
+    def test_differentiates_polynomial(self):
+        result = differentiate(compile("x ^ 3 + 2 * x * y"), 'x')
+        self.assertEqual(from_expr(result).terms, {(2, 0): 3.0, (0, 1): 2.0})
+
+    def test_differentiate_falls_back_to_tree_path(self):
+        expr = compile("1 / x")
+        self.assertEqual(differentiate(expr, 'x'), symbolic.simplify(symbolic.differentiate(expr, 'x')))
+
+    def test_simplify_collects_terms(self):
+        self.assertEqual(simplify(compile("x * 2 + 2 * x")), Operator(Op.MULTIPLY, Literal(4.0), Variable('x')))
+
+    def test_evaluates_with_horner(self):
+        expr = compile("x ^ 3 * y - 2 * x * y ^ 2 + 7")
+        env = {'x': 1.5, 'y': -2.0}
+        self.assertAlmostEqual(evaluate(expr, env), partial_eval(expr, env))
+
+    def test_evaluates_sparse_high_degrees(self):
+        poly = from_expr(compile("x ^ 100000000 * y ^ 3 + 2 * y ^ 50000000 - 1"))
+        self.assertEqual(poly.evaluate({'x': 1.0, 'y': -1.0}), 0.0)
+        self.assertEqual(poly.evaluate({'x': 0.5, 'y': 1.0}), 1.0)
+        self.assertEqual(poly.evaluate({'x': 0.0, 'y': 0.0}), -1.0)
+
+    def test_evaluate_falls_back_for_non_polynomials(self):
+        self.assertEqual(evaluate(compile("1 / x"), {'x': 4}), 0.25)
+        self.assertEqual(evaluate(compile("x + y"), {'x': 1}), partial_eval(compile("x + y"), {'x': 1}))
+
+    def test_division_by_zero_takes_the_tree_path(self):
+        expr = compile("x / 0 + 1")
+        self.assertFalse(is_polynomial(expr))
+        self.assertEqual(simplify(expr), symbolic.simplify(expr))
+        with self.assertRaises(ZeroDivisionError):
+            evaluate(expr, {'x': 1.0})
+
+    def test_frontend_and_derivatives_can_use_polynomials(self):
+        frontend.clear_caches()
+        self.assertEqual(repr(frontend.evaluate("(x + 1) ^ 2 - x")), "(((x + 1.0) ^ 2.0) - x)")
+        frontend.use_polynomials()
+        try:
+            self.assertEqual(repr(frontend.evaluate("(x + 1) ^ 2 - x")), "(((x ^ 2.0) + x) + 1.0)")
+            self.assertEqual(repr(frontend.evaluate("diff((x + 1) ^ 3)")), "(((3.0 * (x ^ 2.0)) + (6.0 * x)) + 3.0)")
+            self.assertEqual(repr(symbolic.nth_derivative(compile("x ^ 3 * y"), 'x', 2)), "((6.0 * x) * y)")
+            self.assertEqual(repr(frontend.evaluate("diff(1 / x)")), "-((1.0 / (x ^ 2.0)))")
+        finally:
+            frontend.use_polynomials(False)
+        self.assertEqual(repr(frontend.evaluate("(x + 1) ^ 2 - x")), "(((x + 1.0) ^ 2.0) - x)")
+
+    def test_gives_up_on_huge_expansions(self):
+        self.assertFalse(is_polynomial(compile("(a + b + c + d + e) ^ 40")))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from ast_eval import AST_NODE_TYPES, Literal, Operator, UnaryOp
+import stats
+
+# Patterns. A pattern is matched against a node and, on success, adds the
+# parts it names to a dict of bindings that is passed to the rule's action.
+
+@dataclass(frozen=True)
+class Wild:
+    """Any node, or any node of class `kind`, bound to `name`."""
+    name: str
+    kind: Optional[type] = None
+
+@dataclass(frozen=True)
+class Lit:
+    """A Literal, equal to `value` unless that is None; its number is bound to `name`, if given."""
+    value: Optional[float] = None
+    name: Optional[str] = None
+
+@dataclass(frozen=True)
+class Bin:
+    """An Operator node with operator `op` and matching operands."""
+    op: object
+    left: object
+    right: object
+
+@dataclass(frozen=True)
+class Unary:
+    """A UnaryOp node with operator `op` and a matching operand."""
+    op: object
+    operand: object
+
+@dataclass(frozen=True)
+class Rule:
+    """Rewrites a node matching `pattern` to `action(**bindings)`.
+
+    A `guard`, if given, is called with the same bindings and must return true
+    for the rule to fire.
+    """
+    name: str
+    pattern: object
+    action: Callable
+    guard: Optional[Callable] = None
+
+def _shapes(pattern):
+    """The node classes `pattern` can match at its root."""
+    if isinstance(pattern, Wild):
+        return AST_NODE_TYPES if pattern.kind is None else (pattern.kind,)
+    if isinstance(pattern, Lit):
+        return (Literal,)
+    if isinstance(pattern, Bin):
+        return (Operator,)
+    if isinstance(pattern, Unary):
+        return (UnaryOp,)
+    raise TypeError(f"Unknown pattern type: {type(pattern)}")
+
+def _keys(pattern):
+    # Index keys are the root operator plus the classes of its operands.
+    if isinstance(pattern, Bin):
+        return [(pattern.op, left, right) for left in _shapes(pattern.left) for right in _shapes(pattern.right)]
+    if isinstance(pattern, Unary):
+        return [(pattern.op, operand) for operand in _shapes(pattern.operand)]
+    raise ValueError(f"Rule patterns must be rooted at an operator, not {pattern}")
+
+def _key(node):
+    if isinstance(node, Operator):
+        return (node.op, type(node.left), type(node.right))
+    if isinstance(node, UnaryOp):
+        return (node.op, type(node.operand))
+    return None
+
+def match(pattern, node, bindings):
+    """Whether `node` matches `pattern`, adding the named parts to `bindings` if so."""
+    if isinstance(pattern, Wild):
+        if pattern.kind is not None and not isinstance(node, pattern.kind):
+            return False
+        bindings[pattern.name] = node
+        return True
+
+    if isinstance(pattern, Lit):
+        if not isinstance(node, Literal) or (pattern.value is not None and node.value != pattern.value):
+            return False
+        if pattern.name is not None:
+            bindings[pattern.name] = node.value
+        return True
+
+    if isinstance(pattern, Bin):
+        return (isinstance(node, Operator) and node.op == pattern.op
+                and match(pattern.left, node.left, bindings) and match(pattern.right, node.right, bindings))
+
+    if isinstance(pattern, Unary):
+        return isinstance(node, UnaryOp) and node.op == pattern.op and match(pattern.operand, node.operand, bindings)
+
+    raise TypeError(f"Unknown pattern type: {type(pattern)}")
+
+class RuleSet:
+    """Rewrite rules indexed by root operator and operand classes.
+
+    Looking up a node's index key gives just the rules that could match it, in
+    the order they were added, so the cost of a visit depends on how many
+    rules share that key rather than on the size of the rule set. The first
+    candidate that matches (and whose guard passes) fires.
+
+    While stats are enabled, `tried` and `fired` count, per rule name, how
+    often each rule was a candidate and how often it fired.
+    """
+    def __init__(self, rules=()):
+        self.rules = []
+        self.tried = {}
+        self.fired = {}
+        self._index = {}
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        if any(existing.name == rule.name for existing in self.rules):
+            raise ValueError(f"Duplicate rule name '{rule.name}'")
+        self.rules.append(rule)
+        for key in _keys(rule.pattern):
+            self._index.setdefault(key, []).append(rule)
+
+    def candidates(self, node):
+        return self._index.get(_key(node), ())
+
+    def apply(self, node):
+        """The rewrite of `node` by the first rule that matches it, or None."""
+        for rule in self._index.get(_key(node), ()):
+            if stats.enabled:
+                self.tried[rule.name] = self.tried.get(rule.name, 0) + 1
+            bindings = {}
+            if match(rule.pattern, node, bindings) and (rule.guard is None or rule.guard(**bindings)):
+                if stats.enabled:
+                    self.fired[rule.name] = self.fired.get(rule.name, 0) + 1
+                return rule.action(**bindings)
+        return None
+
+    def rewrite(self, node, visit=None):
+        """One bottom-up pass: rewrite the operands with `visit`, then apply one rule to the result.
+
+        `visit` defaults to this method, so the whole tree is rewritten; a
+        caller can pass a memoising wrapper instead. Leaves and Diff nodes are
+        returned unchanged.
+        """
+        visit = visit or self.rewrite
+        if isinstance(node, Operator):
+            node = Operator(node.op, visit(node.left), visit(node.right))
+        elif isinstance(node, UnaryOp):
+            node = UnaryOp(node.op, visit(node.operand))
+        else:
+            return node
+
+        result = self.apply(node)
+        return node if result is None else result
+
+    def profile(self):
+        """(name, tried, fired) for every rule tried so far, most often fired first."""
+        return sorted(((name, self.tried[name], self.fired.get(name, 0)) for name in self.tried),
+                      key=lambda entry: (-entry[2], -entry[1], entry[0]))
+
+    def reset_profile(self):
+        self.tried.clear()
+        self.fired.clear()
@@ -0,0 +1,93 @@
+import unittest
+
+from ast_eval import *
+from rewrite import *
+import stats
+from symbolic import SIMPLIFY_RULES, simplify
+
+X = Variable('x')
+Y = Variable('y')
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_binds_named_parts(self):
+        bindings = {}
+        pattern = Bin(Op.MULTIPLY, Lit(name='n'), Unary(Op.SUBTRACT, Wild('a')))
+        self.assertTrue(match(pattern, Operator(Op.MULTIPLY, Literal(2.0), UnaryOp(Op.SUBTRACT, X)), bindings))
+        self.assertEqual(bindings, {'n': 2.0, 'a': X})
+
+    def test_checks_operators_values_and_kinds(self):
+        self.assertFalse(match(Bin(Op.ADD, Wild('a'), Lit(0)), Operator(Op.SUBTRACT, X, Literal(0)), {}))
+        self.assertFalse(match(Lit(1), Literal(2), {}))
+        self.assertTrue(match(Lit(1), Literal(1.0), {}))
+        self.assertFalse(match(Wild('a', Variable), Literal(1), {}))
+
+
+class TestRuleSet(unittest.TestCase):
+
+    def test_only_tries_rules_for_the_node_shape(self):
+        rules = RuleSet([Rule('add-zero', Bin(Op.ADD, Wild('a'), Lit(0)), lambda a: a)])
+        for i in range(300):
+            rules.add(Rule(f"noise-{i}", Bin(Op.ADD, Wild('a', Variable), Wild('b', Variable)), lambda a, b: a))
+
+        self.assertEqual([rule.name for rule in rules.candidates(Operator(Op.ADD, X, Literal(0)))], ['add-zero'])
+        self.assertEqual(len(rules.candidates(Operator(Op.ADD, X, Y))), 300)
+        self.assertEqual(rules.candidates(Operator(Op.MULTIPLY, X, Y)), ())
+
+    def test_first_matching_rule_fires(self):
+        rules = RuleSet([
+            Rule('never', Bin(Op.ADD, Wild('a'), Wild('b')), lambda a, b: a, guard=lambda a, b: False),
+            Rule('swap', Bin(Op.ADD, Wild('a'), Wild('b')), lambda a, b: Operator(Op.ADD, b, a)),
+            Rule('left', Bin(Op.ADD, Wild('a'), Wild('b')), lambda a, b: a),
+        ])
+        self.assertEqual(rules.apply(Operator(Op.ADD, X, Y)), Operator(Op.ADD, Y, X))
+        self.assertIsNone(rules.apply(Operator(Op.SUBTRACT, X, Y)))
+
+    def test_rewrites_bottom_up_in_one_pass(self):
+        rules = RuleSet([
+            Rule('times-one', Bin(Op.MULTIPLY, Wild('a'), Lit(1)), lambda a: a),
+            Rule('one-plus', Bin(Op.ADD, Lit(1), Wild('b')), lambda b: Operator(Op.MULTIPLY, b, Literal(1))),
+        ])
+        tree = Operator(Op.SUBTRACT, Operator(Op.MULTIPLY, X, Literal(1)), Operator(Op.ADD, Literal(1), Y))
+        # Each node is rewritten once, after its operands; results are not revisited.
+        self.assertEqual(rules.rewrite(tree), Operator(Op.SUBTRACT, X, Operator(Op.MULTIPLY, Y, Literal(1))))
+
+    def test_rejects_bad_rules(self):
+        rules = RuleSet([Rule('a', Unary(Op.SUBTRACT, Wild('a')), lambda a: a)])
+        with self.assertRaises(ValueError):
+            rules.add(Rule('a', Unary(Op.ADD, Wild('a')), lambda a: a))
+        with self.assertRaises(ValueError):
+            rules.add(Rule('b', Wild('a'), lambda a: a))
+
+    def test_profiles_rule_firings_while_stats_are_enabled(self):
+        rules = RuleSet([
+            Rule('times-zero', Bin(Op.MULTIPLY, Wild('a'), Lit(0)), lambda a: Literal(0.0)),
+            Rule('times-any', Bin(Op.MULTIPLY, Wild('a'), Wild('b', Literal)), lambda a, b: a),
+        ])
+        rules.rewrite(Operator(Op.MULTIPLY, X, Literal(0)))
+        self.assertEqual(rules.profile(), [])
+
+        stats.enable()
+        try:
+            rules.rewrite(Operator(Op.MULTIPLY, Operator(Op.MULTIPLY, X, Literal(0)), Literal(2)))
+        finally:
+            stats.disable()
+        self.assertEqual(rules.profile(), [('times-zero', 2, 1), ('times-any', 1, 1)])
+        rules.reset_profile()
+        self.assertEqual(rules.profile(), [])
+
+
+class TestSimplifyRules(unittest.TestCase):
+
+    def test_simplify_identities_are_rules(self):
+        self.assertEqual(len(SIMPLIFY_RULES.rules), 18)
+        self.assertEqual(simplify(Operator(Op.ADD, Operator(Op.MULTIPLY, Literal(1), X), Literal(0))), X)
+        self.assertEqual(simplify(UnaryOp(Op.SUBTRACT, UnaryOp(Op.SUBTRACT, Y))), Y)
+        self.assertEqual(simplify(Operator(Op.EXPONENT, X, Literal(0))), Literal(1.0))
+        with self.assertRaisesRegex(ZeroDivisionError, "Cannot divide by zero"):
+            simplify(Operator(Op.DIVIDE, Literal(1), Operator(Op.SUBTRACT, Literal(2), Literal(2))))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
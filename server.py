@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ast_eval import *
+from canonical import canonicalize
+import frontend
+from symbolic import simplify
+
+# Longest request line accepted, in bytes.
+LINE_LIMIT = 1 << 20
+
+def evaluate_ast(ast, env):
+    """Evaluate a parsed request in a worker; returns (result, is_symbolic)."""
+    result = partial_eval(ast, env)
+    if isinstance(result, AST_NODE_TYPES):
+        return repr(canonicalize(simplify(result))), True
+    return result, False
+
+def encode(response):
+    """One response line; results JSON cannot represent (complex, NaN, infinite) become errors."""
+    try:
+        return json.dumps(response, allow_nan=False)
+    except (TypeError, ValueError):
+        return json.dumps({'id': response.get('id'),
+                           'error': f"Result {response.get('result')!r} cannot be represented in JSON"})
+
+class EvaluationServer:
+    """Answers JSON-lines evaluation requests from a bounded process pool.
+
+    Each request line is an object {"id": ..., "expr": "...", "vars": {...}},
+    where "vars" is optional and maps names to numbers or expression strings.
+    Each response line echoes "id" with either "result" and "symbolic" (a
+    number, or the simplified expression as a string) or "error". Responses
+    are written as requests finish, so a pipelining client matches them by id.
+
+    Expressions are parsed in the server process through frontend's AST cache,
+    so hot expressions skip parsing and workers only receive trees. At most
+    `max_pending` requests are in flight across all connections; past that the
+    server stops reading, which pushes back on clients. A request taking longer
+    than `timeout` seconds gets an error response, although a worker that has
+    already started on it runs it to completion.
+    """
+    def __init__(self, workers=None, max_pending=None, timeout=10.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self.timeout = timeout
+        self._pool = None
+        self._slots = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Listen on a Unix socket at `path`, or on TCP `host`:`port` (0 picks a free port)."""
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+        # Start the workers before accepting connections: forked workers would
+        # otherwise inherit client sockets and keep them open after we close them.
+        await asyncio.get_running_loop().run_in_executor(self._pool, abs, 0)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=LINE_LIMIT)
+        return self._server
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def evaluate(self, line):
+        """The response object for one request line."""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get('id')
+            if not isinstance(request.get('expr'), str):
+                raise ValueError("Request needs an 'expr' string")
+
+            ast = frontend.compile(request['expr'])
+            env = {name: frontend.compile(value) if isinstance(value, str) else value
+                   for name, value in request.get('vars', {}).items()}
+
+            work = asyncio.get_running_loop().run_in_executor(self._pool, evaluate_ast, ast, env)
+            result, symbolic = await asyncio.wait_for(work, self.timeout)
+        except asyncio.TimeoutError:
+            return {'id': request_id, 'error': f"Timed out after {self.timeout} seconds"}
+        except Exception as e:
+            return {'id': request_id, 'error': str(e)}
+
+        return {'id': request_id, 'result': result, 'symbolic': symbolic}
+
+    async def _handle(self, reader, writer):
+        pending = set()
+        lock = asyncio.Lock()
+        try:
+            while True:
+                # Take a slot before reading, so a full server leaves requests unread.
+                await self._slots.acquire()
+                try:
+                    line = await reader.readline()
+                except Exception:
+                    self._slots.release()
+                    raise
+
+                if not line.strip():
+                    self._slots.release()
+                    if not line:
+                        break
+                    continue
+
+                task = asyncio.create_task(self._respond(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(self, line, writer, lock):
+        try:
+            response = await self.evaluate(line)
+            async with lock:
+                writer.write(encode(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            self._slots.release()
+
+async def serve(host='127.0.0.1', port=8765, path=None, workers=None, max_pending=None, timeout=10.0):
+    server = EvaluationServer(workers, max_pending, timeout)
+    listener = await server.start(host, port, path)
+    for sock in listener.sockets:
+        print(f"Listening on {sock.getsockname()}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="JSON-lines evaluation server for the calculator")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="number of worker processes")
+    arg_parser.add_argument('--max-pending', type=int,
+                            help="requests in flight before the server stops reading (default 4 per worker)")
+    arg_parser.add_argument('--timeout', type=float, default=10.0, help="seconds allowed per request")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.max_pending, args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import frontend
+from server import *
+
+
+async def exchange(server, lines, path=None):
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        host, port = server._server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+
+    for line in lines:
+        writer.write(line.encode() + b"\n")
+    await writer.drain()
+    writer.write_eof()
+
+    responses = [json.loads(line) async for line in reader]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+class TestEvaluationServer(unittest.TestCase):
+
+    def run_server(self, lines, path=None, **options):
+        async def scenario():
+            server = EvaluationServer(workers=1, **options)
+            await server.start(path=path)
+            try:
+                return await exchange(server, lines, path)
+            finally:
+                await server.close()
+        return asyncio.run(scenario())
+
+    def test_numeric_symbolic_and_error_responses(self):
+        requests = [
+            {'id': 1, 'expr': "2 * (3 + 4)"},
+            {'id': 2, 'expr': "x ^ 2 + y", 'vars': {'x': 3}},
+            {'id': 3, 'expr': "diff(x * y, x)", 'vars': {'y': "z + 1"}},
+            {'id': 4, 'expr': "1 / 0"},
+            {'id': 5, 'expr': "2 *"},
+            {'id': 6},
+        ]
+        responses = self.run_server([json.dumps(request) for request in requests] + ["", "not json"])
+        by_id = {response['id']: response for response in responses}
+
+        self.assertEqual(by_id[1], {'id': 1, 'result': 14.0, 'symbolic': False})
+        self.assertEqual(by_id[2], {'id': 2, 'result': "(y + 9.0)", 'symbolic': True})
+        self.assertEqual(by_id[3], {'id': 3, 'result': "(z + 1.0)", 'symbolic': True})
+        self.assertEqual(by_id[4]['error'], "Cannot divide by zero.")
+        self.assertEqual(by_id[5]['error'], "Expected number, found None")
+        self.assertEqual(by_id[6]['error'], "Request needs an 'expr' string")
+        self.assertIn('error', by_id[None])
+        self.assertEqual(len(responses), 7)
+
+    def test_results_json_cannot_hold_become_errors(self):
+        requests = [
+            {'id': 1, 'expr': "(0 - 8) ^ 0.5"},
+            {'id': 2, 'expr': "x * 10", 'vars': {'x': 1e308}},
+            {'id': 3, 'expr': "x * 10 - x * 10", 'vars': {'x': 1e308}},
+        ]
+        responses = self.run_server([json.dumps(request) for request in requests])
+        by_id = {response['id']: response for response in responses}
+
+        self.assertEqual(len(responses), 3)
+        self.assertRegex(by_id[1]['error'], r"^Result \(.*j\) cannot be represented in JSON$")
+        self.assertEqual(by_id[2]['error'], "Result inf cannot be represented in JSON")
+        self.assertEqual(by_id[3]['error'], "Result nan cannot be represented in JSON")
+
+    def test_close_before_start(self):
+        asyncio.run(EvaluationServer(workers=1).close())
+
+    def test_hot_expressions_skip_parsing(self):
+        frontend.clear_caches()
+        lines = [json.dumps({'id': i, 'expr': "x * 2 + 1", 'vars': {'x': i}}) for i in range(20)]
+        responses = self.run_server(lines, max_pending=2)
+        self.assertEqual(sorted(response['result'] for response in responses), [i * 2 + 1 for i in range(20)])
+        self.assertEqual(frontend.ast_cache.misses, 1)
+        self.assertEqual(frontend.ast_cache.hits, 19)
+
+    def test_timeout(self):
+        # Repeated quotient-rule derivatives swell; this takes a few tenths of a second.
+        request = {'id': 1, 'expr': "diff((x + 1) / (x * x + 1), x, 6)"}
+        responses = self.run_server([json.dumps(request)], timeout=0.05)
+        self.assertEqual(responses, [{'id': 1, 'error': "Timed out after 0.05 seconds"}])
+
+    @unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), "Unix sockets are not available")
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "calc.sock")
+            responses = self.run_server([json.dumps({'id': 'a', 'expr': "2 ^ 10"})], path=path)
+        self.assertEqual(responses, [{'id': 'a', 'result': 1024.0, 'symbolic': False}])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,191 @@
+import re
+
+from ast_eval import *
+import frontend
+from symbolic import free_variables, nth_derivative
+
+_ASSIGNMENT_RE = re.compile(r"\s*([^\W\d_][^\W_]*)\s*=(.*)", re.DOTALL)
+
+class CircularDefinitionError(ValueError):
+    """Raised when a definition would depend on itself."""
+
+class Session:
+    """Named definitions that refer to each other, recomputed only when something they use changes.
+
+    A definition's form is its expression with the forms of the non-constant
+    definitions it uses substituted in; a `diff` is taken before its own
+    variable is substituted, so it still sees that variable even when it is
+    defined. The value is the form with the constant definitions then bound. Both are
+    cached. Redefining or removing a name drops the cached forms and values of
+    that name and of everything depending on it, directly or not; those are
+    recomputed when next needed and every other result is reused. Names
+    without a definition stay symbolic.
+    """
+    def __init__(self):
+        self.definitions = {}
+        self.uses = {}
+        self.used_by = {}
+        self.forms = {}
+        self.results = {}
+        self.evaluations = 0
+
+    def execute(self, text):
+        """Run one line: `name = expr` defines name, anything else is evaluated.
+
+        Returns (name, result), with name None for a plain expression.
+        """
+        match = _ASSIGNMENT_RE.fullmatch(text)
+        if match:
+            name = match.group(1)
+            return name, self.define(name, match.group(2))
+        return None, self.evaluate(text)
+
+    def define(self, name, text):
+        """(Re)define `name` as the expression `text` and return its value."""
+        if name == 'diff':
+            raise ValueError("Cannot assign to 'diff'")
+
+        tree = frontend.compile(text)
+        source = frontend.normalise(text)
+
+        previous = self.definitions.get(name)
+        if previous is not None and previous[0] == source:
+            return self.value(name)
+
+        self._check_cycle(name, free_variables(tree))
+        self._store(name, source, tree)
+        try:
+            return self.value(name)
+        except Exception:
+            # A definition that cannot be evaluated is not kept; restore the old one, if any.
+            if previous is not None:
+                self._store(name, *previous)
+            else:
+                self.remove(name)
+            raise
+
+    def _store(self, name, source, tree):
+        uses = free_variables(tree)
+        self._unlink(name)
+        self.definitions[name] = (source, tree)
+        self.uses[name] = uses
+        for used in uses:
+            self.used_by.setdefault(used, set()).add(name)
+        self._invalidate(name)
+
+    def remove(self, name):
+        """Forget `name`; definitions that use it become symbolic in it again."""
+        if name not in self.definitions:
+            raise ValueError(f"'{name}' is not defined")
+        self._unlink(name)
+        del self.definitions[name]
+        del self.uses[name]
+        self._invalidate(name)
+
+    def value(self, name):
+        if name not in self.results:
+            self.results[name] = self._bind_constants(self.form(name))
+        return self.results[name]
+
+    def form(self, name):
+        if name in self.forms:
+            return self.forms[name]
+        if name not in self.definitions:
+            raise ValueError(f"'{name}' is not defined")
+
+        # Compute stale definitions that `name` needs, dependencies first.
+        stack = [name]
+        while stack:
+            current = stack[-1]
+            if current in self.forms:
+                stack.pop()
+                continue
+
+            missing = [used for used in self.uses[current] if used in self.definitions and used not in self.forms]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            self.evaluations += 1
+            self.forms[current] = frontend.evaluate_tree(self._expand(self.definitions[current][1]))
+
+        return self.forms[name]
+
+    def evaluate(self, text):
+        """Evaluate `text` against the current definitions without storing it."""
+        tree = frontend.compile(text)
+        return self._bind_constants(frontend.evaluate_tree(self._expand(tree)))
+
+    def _expand(self, node, hold=frozenset()):
+        # Substitute the non-constant definitions into `node`, leaving the names
+        # in `hold` symbolic. A Diff is expanded with its variable held, then
+        # differentiated, and only then is the variable substituted.
+        if isinstance(node, Variable):
+            name = node.name
+            if name in hold or name not in self.definitions or _is_constant(self.form(name)):
+                return node
+            if not hold:
+                return self.form(name)
+            return self._expand(self.definitions[name][1], hold)
+
+        if isinstance(node, UnaryOp):
+            return UnaryOp(node.op, self._expand(node.operand, hold))
+
+        if isinstance(node, Operator):
+            return Operator(node.op, self._expand(node.left, hold), self._expand(node.right, hold))
+
+        if isinstance(node, Diff):
+            inner = self._expand(node.expression, hold | {node.var})
+            return self._expand(nth_derivative(inner, node.var, node.order), hold)
+
+        return node
+
+    def _bind_constants(self, form):
+        if _is_constant(form):
+            return form
+
+        env = {}
+        for name in free_variables(form):
+            if name in self.definitions:
+                env[name] = self.form(name)
+        return frontend.evaluate_tree(form, env) if env else form
+
+    def _check_cycle(self, name, uses):
+        # Depth-first search from the new dependencies back to `name`.
+        parents = {used: name for used in uses}
+        stack = list(uses)
+        while stack:
+            current = stack.pop()
+            if current == name:
+                path = [name]
+                current = parents[name]
+                while current != name:
+                    path.append(current)
+                    current = parents[current]
+                path.append(name)
+                raise CircularDefinitionError(f"Circular definition: {' -> '.join(reversed(path))}")
+
+            for used in self.uses.get(current, ()):
+                if used not in parents:
+                    parents[used] = current
+                    stack.append(used)
+
+    def _unlink(self, name):
+        for used in self.uses.get(name, ()):
+            self.used_by[used].discard(name)
+
+    def _invalidate(self, name):
+        stack = [name]
+        seen = {name}
+        while stack:
+            current = stack.pop()
+            self.forms.pop(current, None)
+            self.results.pop(current, None)
+            for dependent in self.used_by.get(current, ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+
+def _is_constant(result):
+    return not isinstance(result, AST_NODE_TYPES) or isinstance(result, Literal)
@@ -0,0 +1,104 @@
+import unittest
+
+from ast_eval import *
+from main import format_result
+from session import *
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Session()
+
+    def define(self, text):
+        return self.session.execute(text)[1]
+
+    def test_definitions_refer_to_each_other(self):
+        self.assertEqual(repr(self.define("a = x ^ 2 + 1")), "((x ^ 2.0) + 1.0)")
+        self.assertEqual(repr(self.define("b = diff(a) * 3")), "(6.0 * x)")
+        self.assertEqual(self.session.execute("b + 1"), (None, self.session.evaluate("1 + b")))
+
+    def test_constants_are_bound_after_differentiating(self):
+        self.define("a = x ^ 2 + 1")
+        self.define("b = diff(a) * 3")
+        self.assertEqual(self.define("x = 2"), 2.0)
+        self.assertEqual(self.session.value('b'), 12.0)
+        self.assertEqual(self.session.evaluate("a + b"), 17.0)
+
+    def test_differentiates_before_substituting_a_defined_variable(self):
+        self.define("a = x ^ 2 + 1")
+        self.define("b = diff(a) * 3")
+        self.assertEqual(repr(self.define("x = t ^ 2")), "(t ^ 2.0)")
+        self.assertEqual(repr(self.session.value('b')), "(6.0 * (t ^ 2.0))")
+        self.assertEqual(repr(self.session.evaluate("diff(a, t)")), "(4.0 * (t ^ 3.0))")
+        self.assertEqual(repr(self.session.evaluate("diff(diff(a) * x)")), "(4.0 * (t ^ 2.0))")
+
+    def test_only_dependents_are_recomputed(self):
+        for line in ["x = 2", "a = x * 3", "b = a + 1", "c = y * 5", "d = c + b"]:
+            self.define(line)
+        self.assertEqual(repr(self.session.value('d')), "((5.0 * y) + 7.0)")
+        count = self.session.evaluations
+
+        self.define("c = y * 6")
+        self.assertEqual(repr(self.session.value('d')), "((6.0 * y) + 7.0)")
+        self.assertEqual(self.session.evaluations - count, 2)
+        self.assertIn('a', self.session.forms)
+        self.assertIn('b', self.session.forms)
+
+    def test_unchanged_redefinition_keeps_cached_results(self):
+        self.define("a = x + 1")
+        self.define("b = a * 2")
+        count = self.session.evaluations
+        self.define("a = x+1")
+        self.session.value('b')
+        self.assertEqual(self.session.evaluations, count)
+
+    def test_defining_a_symbol_updates_its_users(self):
+        self.assertEqual(repr(self.define("a = y * 2")), "(2.0 * y)")
+        self.define("y = 4")
+        self.assertEqual(self.session.value('a'), 8.0)
+        self.session.remove('y')
+        self.assertEqual(repr(self.session.value('a')), "(2.0 * y)")
+
+    def test_cycles_are_rejected(self):
+        self.define("a = b + 1")
+        with self.assertRaises(CircularDefinitionError) as error:
+            self.define("b = a * 2")
+        self.assertEqual(str(error.exception), "Circular definition: b -> a -> b")
+        self.assertNotIn('b', self.session.definitions)
+
+        with self.assertRaises(CircularDefinitionError):
+            self.define("c = c + 1")
+
+    def test_failed_definitions_are_rolled_back(self):
+        self.define("a = 1")
+        with self.assertRaises(ZeroDivisionError):
+            self.define("b = a / 0")
+        self.assertNotIn('b', self.session.definitions)
+        self.assertNotIn('b', self.session.used_by['a'])
+        self.assertEqual(repr(self.define("c = b + 1")), "(b + 1.0)")
+
+        self.define("b = a + 1")
+        with self.assertRaises(ZeroDivisionError):
+            self.define("b = 1 / (a - 1)")
+        self.assertEqual(self.session.definitions['b'][0], "a+1")
+        self.assertEqual(self.session.value('c'), 3.0)
+        self.assertEqual(self.session.used_by['a'], {'b'})
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.define("diff = 2")
+        with self.assertRaises(ValueError):
+            self.session.value('missing')
+        with self.assertRaises(ValueError):
+            self.define("a = 2 *")
+        self.assertNotIn('a', self.session.definitions)
+
+    def test_repl_formatting(self):
+        self.assertEqual(format_result("a = x * 2", self.session), "a = (2.0 * x)")
+        self.assertEqual(format_result("a + 1", self.session), "= ((2.0 * x) + 1.0)")
+        self.assertEqual(format_result("b = a / 0", self.session), "Error: Cannot divide by zero")
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
@@ -0,0 +1,73 @@
+from collections import namedtuple
+
+import numpy as np
+
+from ast_eval import AST_NODE_TYPES
+import frontend
+from symbolic import free_variables, nth_derivative
+from vectorised import evaluate_batch
+
+# roots holds the last iterate for every point; the masks say which of them are
+# roots. Points in neither mask ran out of iterations.
+NewtonResult = namedtuple('NewtonResult', ['roots', 'converged', 'diverged', 'iterations'])
+
+def solve(expression, var, x0, env=None, tolerance=1e-12, max_iterations=50):
+    """Find roots of `expression` in `var` by Newton's method from every start in `x0` at once.
+
+    The expression (a string or tree) is simplified and differentiated once;
+    each iteration then evaluates it and its derivative over all the points
+    still running with numpy. `env` binds any other variables to numbers or
+    arrays, which are broadcast against `x0`, so one call can solve a whole
+    family of equations.
+
+    A point converges when the function is exactly zero there or a step is no
+    bigger than `tolerance` relative to max(1, |x|). It diverges when the next
+    iterate is not finite or the derivative is zero or infinite. Points that do
+    neither within `max_iterations` steps are left unconverged. Returns a
+    NewtonResult of arrays with the broadcast shape: roots, converged and
+    diverged masks, and the number of steps taken at each point.
+    """
+    tree = frontend.compile(expression) if isinstance(expression, str) else expression
+    function = frontend.evaluate_tree(tree)
+    if not isinstance(function, AST_NODE_TYPES) or var not in free_variables(function):
+        raise ValueError(f"Expression does not depend on '{var}'")
+    derivative = nth_derivative(function, var)
+
+    arrays = {name: np.asarray(value, dtype=float) for name, value in (env or {}).items()}
+    x = np.asarray(x0, dtype=float)
+    shape = np.broadcast_shapes(x.shape, *(array.shape for array in arrays.values()))
+    x = np.broadcast_to(x, shape).astype(float).ravel()
+    arrays = {name: np.broadcast_to(array, shape).ravel() for name, array in arrays.items()}
+
+    converged = np.zeros(x.shape, dtype=bool)
+    diverged = np.zeros(x.shape, dtype=bool)
+    iterations = np.zeros(x.shape, dtype=int)
+
+    # Indices of the points still iterating; finished points are not evaluated again.
+    active = np.arange(x.size)
+    for _ in range(max_iterations):
+        if not active.size:
+            break
+
+        current = x[active]
+        bindings = {name: array[active] for name, array in arrays.items()}
+        bindings[var] = current
+        values = evaluate_batch(function, **bindings)
+        slopes = evaluate_batch(derivative, **bindings)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # An exact zero is a root even where the slope is zero or infinite.
+            step = np.where(values == 0, 0.0, values / slopes)
+            following = current - step
+
+        failed = ~np.isfinite(following) | ((values != 0) & ((slopes == 0) | ~np.isfinite(slopes)))
+        done = ~failed & (np.abs(step) <= tolerance * np.maximum(1.0, np.abs(current)))
+
+        x[active[~failed]] = following[~failed]
+        iterations[active[~failed]] += 1
+        converged[active[done]] = True
+        diverged[active[failed]] = True
+        active = active[~failed & ~done]
+
+    return NewtonResult(x.reshape(shape), converged.reshape(shape), diverged.reshape(shape),
+                        iterations.reshape(shape))
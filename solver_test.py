@@ -0,0 +1,66 @@
+import importlib.util
+import math
+import unittest
+
+from ast_eval import *
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+if HAS_NUMPY:
+    import numpy as np
+    from solver import *
+
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+class TestSolve(unittest.TestCase):
+
+    def test_finds_roots_from_every_start(self):
+        starts = np.linspace(-10, 10, 1000)
+        starts = starts[starts != 0]
+        result = solve("x ^ 2 - 2", 'x', starts)
+        self.assertTrue(result.converged.all())
+        self.assertFalse(result.diverged.any())
+        np.testing.assert_allclose(result.roots, np.sign(starts) * math.sqrt(2))
+        self.assertLessEqual(result.iterations.max(), 12)
+
+    def test_solves_a_family_of_equations(self):
+        a = np.array([[1.0], [4.0], [9.0]])
+        result = solve(Operator(Op.SUBTRACT, Operator(Op.EXPONENT, Variable('x'), Literal(3.0)), Variable('a')),
+                       'x', [1.0, 2.0], env={'a': a})
+        self.assertEqual(result.roots.shape, (3, 2))
+        self.assertTrue(result.converged.all())
+        np.testing.assert_allclose(result.roots, np.cbrt(a) * np.ones((1, 2)))
+
+    def test_differentiates_diff_nodes_first(self):
+        result = solve("diff(x ^ 3, x) - 3", 'x', [-5.0, 0.5])
+        np.testing.assert_allclose(result.roots, [-1.0, 1.0])
+
+    def test_marks_divergence(self):
+        result = solve("x ^ 2 - 2", 'x', [0.0, 1.0])
+        self.assertEqual(result.diverged.tolist(), [True, False])
+        self.assertEqual(result.converged.tolist(), [False, True])
+        self.assertEqual(result.roots[0], 0.0)
+        self.assertEqual(result.iterations[0], 0)
+
+        result = solve("x ^ 0.5 + 1", 'x', [4.0])
+        self.assertTrue(result.diverged.all())
+
+    def test_exact_roots_converge_despite_flat_slope(self):
+        result = solve("x ^ 2", 'x', [0.0])
+        self.assertTrue(result.converged.all())
+
+    def test_stops_at_iteration_cap(self):
+        result = solve("x ^ 2 - 2", 'x', [100.0, 1.5], max_iterations=2)
+        self.assertEqual(result.converged.tolist(), [False, False])
+        self.assertEqual(result.diverged.tolist(), [False, False])
+        self.assertEqual(result.iterations.tolist(), [2, 2])
+
+    def test_rejects_expressions_without_the_variable(self):
+        with self.assertRaises(ValueError):
+            solve("y + 1", 'x', [1.0])
+        with self.assertRaises(ValueError):
+            solve("x * y", 'x', [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
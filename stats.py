@@ -0,0 +1,119 @@
+import time
+
+# Checked at every instrumented call site, so instrumentation costs a single
+# attribute lookup while it is off.
+enabled = False
+
+class Stats:
+    """Counters filled in by the pipeline while instrumentation is enabled.
+
+    Stage times are exclusive: time spent in a nested stage (differentiating
+    inside eval, say) is counted only against the inner stage. Cache counters
+    are read from the registered caches and are not affected by reset();
+    registered rule sets only count while enabled, and reset() clears them.
+    """
+    def __init__(self):
+        self.caches = {}
+        self.rules = {}
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}
+        self.calls = {}
+        self.nodes_before_simplify = 0
+        self.nodes_after_simplify = 0
+        self.folded_nodes = 0
+        self.symbolic_errors = 0
+        self._stack = []
+        for rule_set in self.rules.values():
+            rule_set.reset_profile()
+
+    def timed(self, stage, function, *args):
+        """Call `function(*args)`, charging its run time to `stage`."""
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            return function(*args)
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - frame[1]
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def simplified(self, before, after):
+        self.nodes_before_simplify += count_nodes(before)
+        self.nodes_after_simplify += count_nodes(after)
+
+    def register_cache(self, name, cache):
+        """Include an LRUCache's hit rate in reports."""
+        self.caches[name] = cache
+
+    def register_rules(self, name, rule_set):
+        """Include a rewrite.RuleSet's firing profile in reports."""
+        self.rules[name] = rule_set
+
+    def as_dict(self):
+        return {
+            'enabled': enabled,
+            'stages': {stage: {'calls': self.calls[stage], 'seconds': self.seconds[stage]}
+                       for stage in self.seconds},
+            'simplify_nodes': {'before': self.nodes_before_simplify, 'after': self.nodes_after_simplify},
+            'folded_nodes': self.folded_nodes,
+            'symbolic_errors': self.symbolic_errors,
+            'caches': {name: {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache),
+                              'hit_rate': cache.hit_rate()}
+                       for name, cache in self.caches.items()},
+            'rules': {name: {rule: {'tried': tried, 'fired': fired} for rule, tried, fired in rule_set.profile()}
+                      for name, rule_set in self.rules.items()},
+        }
+
+    def format(self):
+        lines = [] if enabled else ["Instrumentation is off; use ':stats on' or --stats to enable it."]
+
+        if self.seconds:
+            lines.append(f"{'stage':<14}{'calls':>8}{'ms':>12}")
+            for stage, seconds in self.seconds.items():
+                lines.append(f"{stage:<14}{self.calls[stage]:>8}{seconds * 1000:>12.3f}")
+
+        lines.append(f"simplify nodes: {self.nodes_before_simplify} -> {self.nodes_after_simplify}")
+        lines.append(f"nodes folded while parsing: {self.folded_nodes}")
+        lines.append(f"symbolic errors: {self.symbolic_errors}")
+        for name, cache in self.caches.items():
+            lines.append(f"cache {name}: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.1%})")
+        for name, rule_set in self.rules.items():
+            for rule, tried, fired in rule_set.profile():
+                lines.append(f"rule {name}/{rule}: fired {fired} of {tried} tries")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        import json
+
+        with open(path, 'w') as out:
+            json.dump(self.as_dict(), out, indent=2)
+
+current = Stats()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def count_nodes(node):
+    """Number of distinct node objects in `node`; shared subtrees count once."""
+    seen = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for name in ('operand', 'left', 'right', 'expression'):
+            child = getattr(node, name, None)
+            if child is not None:
+                stack.append(child)
+    return len(seen)
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from ast_eval import *
+import frontend
+import main
+import stats
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        frontend.clear_caches()
+        stats.current.reset()
+        stats.enable()
+
+    def tearDown(self):
+        stats.disable()
+        stats.current.reset()
+
+    def test_records_pipeline_stages(self):
+        frontend.evaluate("diff(x ^ 3 * y) + 0")
+        self.assertEqual(set(stats.current.calls),
+                         {'tokenise', 'parse', 'eval', 'differentiate', 'simplify', 'canonicalize'})
+        self.assertEqual(stats.current.calls['simplify'], 2)
+        self.assertGreater(stats.current.nodes_before_simplify, stats.current.nodes_after_simplify)
+
+    def test_counts_folded_nodes(self):
+        frontend.fold_constants = True
+        try:
+            frontend.evaluate("2 * 3 + -x")
+        finally:
+            frontend.fold_constants = False
+        self.assertEqual(stats.current.folded_nodes, 1)
+        self.assertIn("nodes folded while parsing: 1", stats.current.format())
+
+    def test_reports_simplify_rule_firings(self):
+        import symbolic
+
+        symbolic.clear_caches()
+        frontend.evaluate("diff(x ^ 2 + 3)")
+        report = stats.current.as_dict()['rules']['simplify']
+        self.assertEqual(report['add-zero-right']['fired'], 1)
+        self.assertIn("rule simplify/add-zero-right: fired 1 of", stats.current.format())
+        stats.current.reset()
+        self.assertEqual(stats.current.as_dict()['rules']['simplify'], {})
+
+    def test_nested_stages_are_exclusive(self):
+        def inner():
+            time.sleep(0.02)
+
+        def outer():
+            stats.current.timed('inner', inner)
+
+        stats.current.timed('outer', outer)
+        self.assertGreaterEqual(stats.current.seconds['inner'], 0.02)
+        self.assertLess(stats.current.seconds['outer'], 0.02)
+
+    def test_counts_symbolic_errors(self):
+        with self.assertRaises(SymbolicResultError):
+            eval(Operator(Op.ADD, Variable('x'), Literal(1)))
+        self.assertEqual(stats.current.symbolic_errors, 2)
+
+    def test_disabled_records_nothing(self):
+        stats.disable()
+        frontend.evaluate("diff(x ^ 2)")
+        with self.assertRaises(SymbolicResultError):
+            eval(Variable('x'))
+        self.assertEqual(stats.current.calls, {})
+        self.assertEqual(stats.current.symbolic_errors, 0)
+
+    def test_reports_cache_hit_rates(self):
+        frontend.evaluate("x + 1")
+        frontend.evaluate("x + 1")
+        report = stats.current.as_dict()
+        self.assertEqual(report['caches']['result']['hits'], 1)
+        self.assertEqual(report['caches']['result']['hit_rate'], 0.5)
+        self.assertIn("cache result: 1 hits, 1 misses (50.0%)", stats.current.format())
+
+    def test_dumps_json(self):
+        frontend.evaluate("2 * 3")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats.json")
+            stats.current.dump(path)
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(report['stages']['eval']['calls'], 1)
+
+    def test_repl_command(self):
+        self.assertEqual(main.stats_command(":stats off"), "Instrumentation off.")
+        self.assertFalse(stats.enabled)
+        self.assertTrue(main.stats_command(":stats").startswith("Instrumentation is off"))
+        self.assertEqual(main.stats_command(":stats on"), "Instrumentation on.")
+        self.assertTrue(stats.enabled)
+        self.assertEqual(main.stats_command(":stats bogus"), "Error: Unknown :stats option 'bogus'")
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
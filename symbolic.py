@@ -1,7 +1,52 @@
-from multiprocessing import Value
-from ast_eval import *
+from ast_eval import Diff, Expr, Let, Literal, Op, Operator, UnaryOp, Variable
+from cache import LRUCache
+from cse import expand
+from hashcons import hashcons
+from rewrite import Bin, Lit, Rule, RuleSet, Unary, Wild
+import stats
+
+differentiate_cache = LRUCache(maxsize=4096)
+simplify_cache = LRUCache(maxsize=4096)
+stats.current.register_cache('differentiate', differentiate_cache)
+stats.current.register_cache('simplify', simplify_cache)
+
+# A persistent_cache.PersistentCache for nth_derivative results, set through
+# frontend.use_persistent_cache.
+persistent_cache = None
+
+# Whether nth_derivative differentiates polynomials through polynomial.Polynomial,
+# set through frontend.use_polynomials.
+expand_polynomials = False
+
+def configure_caches(differentiate_size=None, simplify_size=None):
+    if differentiate_size is not None:
+        differentiate_cache.resize(differentiate_size)
+    if simplify_size is not None:
+        simplify_cache.resize(simplify_size)
+
+def cache_info():
+    return {'differentiate': differentiate_cache.info(), 'simplify': simplify_cache.info()}
+
+def clear_caches():
+    differentiate_cache.clear()
+    simplify_cache.clear()
 
 def differentiate(node: Expr, var_name: str):
+    # Leaves are cheaper to differentiate than to look up.
+    if isinstance(node, (Literal, Variable)):
+        return _differentiate(node, var_name)
+
+    # Memo keys use the identity of the interned node: structural equality would
+    # conflate Literal(2) with Literal(2.0). Entries keep their node alive.
+    node = hashcons(node)
+    key = (id(node), var_name)
+    entry = differentiate_cache.get(key)
+    if entry is None:
+        entry = (node, _differentiate(node, var_name))
+        differentiate_cache.put(key, entry)
+    return entry[1]
+
+def _differentiate(node: Expr, var_name: str):
         
     if isinstance(node, Literal):
         return Literal(0.0)
@@ -17,96 +62,210 @@ def differentiate(node: Expr, var_name: str):
         return UnaryOp(node.op, du)
 
     
+    elif isinstance(node, Diff):
+        return differentiate(nth_derivative(node.expression, node.var, node.order), var_name)
+
+    elif isinstance(node, Let):
+        return differentiate(expand(node), var_name)
+
     if isinstance(node, Operator):
-        u = node.left
-        v = node.right
-
-        du = differentiate(u, var_name)
-        dv = differentiate(v, var_name)
-
-        if node.op == Op.ADD:
-            return Operator(Op.ADD, du, dv)
-        if node.op == Op.SUBTRACT:
-            return Operator(Op.SUBTRACT, du, dv)
-
-        if node.op == Op.MULTIPLY:
-            left = Operator(Op.MULTIPLY, du, v)
-            right = Operator(Op.MULTIPLY, u, dv)
-            return Operator(Op.ADD, left, right)
-        if node.op == Op.DIVIDE:
-            du_v = Operator(Op.MULTIPLY, du, v)
-            u_v_prime = Operator(Op.MULTIPLY, u, dv)
-            numerator = Operator(Op.SUBTRACT, du_v, u_v_prime)
-            denominator = Operator(Op.EXPONENT, v, Literal(2.0))
-            return Operator(Op.DIVIDE, numerator, denominator)
-
-        if node.op == Op.EXPONENT:
-            if isinstance(v, Literal):
-                n = v
-            elif isinstance(v, UnaryOp) and v.op == Op.SUBTRACT and isinstance(v.operand, Literal):
-                n = Literal(-v.operand.value) 
-            else:
-                raise ValueError(f"Differentiation not implemented for non-constant exponent: {v}")
+        du = differentiate(node.left, var_name)
+        dv = differentiate(node.right, var_name)
+        return _operator_rule(node, du, dv)
 
+    raise ValueError(f"Differentiation not implemented for node: {node}")
 
-            new_expt_val = n.value - 1
-            new_expt = Literal(new_expt_val)
+def _operator_rule(node: Operator, du: Expr, dv: Expr):
+    """Derivative of a binary node given the derivatives of its operands."""
+    u = node.left
+    v = node.right
 
-            power = Operator(Op.MULTIPLY, n, Operator(Op.EXPONENT, u, new_expt))
+    if node.op == Op.ADD:
+        return Operator(Op.ADD, du, dv)
+    if node.op == Op.SUBTRACT:
+        return Operator(Op.SUBTRACT, du, dv)
 
-            return Operator(Op.MULTIPLY, power, du)
+    if node.op == Op.MULTIPLY:
+        left = Operator(Op.MULTIPLY, du, v)
+        right = Operator(Op.MULTIPLY, u, dv)
+        return Operator(Op.ADD, left, right)
+    if node.op == Op.DIVIDE:
+        du_v = Operator(Op.MULTIPLY, du, v)
+        u_v_prime = Operator(Op.MULTIPLY, u, dv)
+        numerator = Operator(Op.SUBTRACT, du_v, u_v_prime)
+        denominator = Operator(Op.EXPONENT, v, Literal(2.0))
+        return Operator(Op.DIVIDE, numerator, denominator)
+
+    if node.op == Op.EXPONENT:
+        if isinstance(v, Literal):
+            n = v
+        elif isinstance(v, UnaryOp) and v.op == Op.SUBTRACT and isinstance(v.operand, Literal):
+            n = Literal(-v.operand.value) 
+        else:
+            raise ValueError(f"Differentiation not implemented for non-constant exponent: {v}")
+
+
+        new_expt_val = n.value - 1
+        new_expt = Literal(new_expt_val)
+
+        power = Operator(Op.MULTIPLY, n, Operator(Op.EXPONENT, u, new_expt))
+
+        return Operator(Op.MULTIPLY, power, du)
 
     raise ValueError(f"Differentiation not implemented for operator type: {node.op}")
 
 def simplify(node: Expr):
-    
     if isinstance(node, (Literal, Variable)):
         return node
 
-    if isinstance(node, UnaryOp):
-        operand = simplify(node.operand)
+    node = hashcons(node)
+    entry = simplify_cache.get(id(node))
+    if entry is None:
+        entry = (node, _simplify(node))
+        simplify_cache.put(id(node), entry)
+    return entry[1]
 
-        if operand == Literal(0):
-            return Literal(0.0)
+def _divide(m, n):
+    if n == 0:
+        raise ZeroDivisionError("Cannot divide by zero")
+    return Literal(m / n)
 
-        if node.op == Op.SUBTRACT and isinstance(operand, UnaryOp) and operand.op == Op.SUBTRACT:
-            return operand.operand
+_A, _B = Wild('a'), Wild('b')
+_M, _N = Lit(name='m'), Lit(name='n')
 
-        return UnaryOp(node.op, operand)
+# Tried in this order among the rules that share an index key; the first
+# match is the simplified node.
+SIMPLIFY_RULES = RuleSet([
+    Rule('negate-zero', Unary(Op.SUBTRACT, Lit(0)), lambda: Literal(0.0)),
+    Rule('plus-zero', Unary(Op.ADD, Lit(0)), lambda: Literal(0.0)),
+    Rule('double-negation', Unary(Op.SUBTRACT, Unary(Op.SUBTRACT, _A)), lambda a: a),
 
-    if isinstance(node, Operator):
-        left = simplify(node.left)
-        right = simplify(node.right)
-
-        if isinstance(left, Literal) and isinstance(right, Literal):
-            if node.op == Op.ADD: return Literal(left.value + right.value)
-            if node.op == Op.SUBTRACT: return Literal(left.value - right.value)
-            if node.op == Op.MULTIPLY: return Literal(left.value * right.value)
-            if node.op == Op.EXPONENT: return Literal(left.value ** right.value)
-            if node.op == Op.DIVIDE:
-                if right == Literal(0.0):
-                    raise ZeroDivisionError("Cannot divide by zero")
-                return Literal(left.value / right.value)
-
-        if node.op == Op.ADD:
-            if right == Literal(0): return left
-            if left == Literal(0): return right
-
-        if node.op == Op.SUBTRACT:
-            if right == Literal(0): return left
-
-        if node.op == Op.MULTIPLY:
-            if right == Literal(1): return left
-            if left == Literal(1): return right
-            if right == Literal(0): return Literal(0.0)
-            if left == Literal(0): return Literal(0.0)
-
-        if node.op == Op.EXPONENT:
-            if right == Literal(1): return left
-            if right == Literal(0) and not (left == Literal(0)): return Literal(1.0)
-            if left == Literal(0): return Literal(0.0)
-
-        return Operator(node.op, left, right)
+    Rule('fold-add', Bin(Op.ADD, _M, _N), lambda m, n: Literal(m + n)),
+    Rule('fold-subtract', Bin(Op.SUBTRACT, _M, _N), lambda m, n: Literal(m - n)),
+    Rule('fold-multiply', Bin(Op.MULTIPLY, _M, _N), lambda m, n: Literal(m * n)),
+    Rule('fold-exponent', Bin(Op.EXPONENT, _M, _N), lambda m, n: Literal(m ** n)),
+    Rule('fold-divide', Bin(Op.DIVIDE, _M, _N), _divide),
+
+    Rule('add-zero-right', Bin(Op.ADD, _A, Lit(0)), lambda a: a),
+    Rule('add-zero-left', Bin(Op.ADD, Lit(0), _B), lambda b: b),
+    Rule('subtract-zero', Bin(Op.SUBTRACT, _A, Lit(0)), lambda a: a),
+    Rule('multiply-one-right', Bin(Op.MULTIPLY, _A, Lit(1)), lambda a: a),
+    Rule('multiply-one-left', Bin(Op.MULTIPLY, Lit(1), _B), lambda b: b),
+    Rule('multiply-zero-right', Bin(Op.MULTIPLY, _A, Lit(0)), lambda a: Literal(0.0)),
+    Rule('multiply-zero-left', Bin(Op.MULTIPLY, Lit(0), _B), lambda b: Literal(0.0)),
+    Rule('power-one', Bin(Op.EXPONENT, _A, Lit(1)), lambda a: a),
+    Rule('power-zero', Bin(Op.EXPONENT, _A, Lit(0)), lambda a: Literal(1.0), guard=lambda a: not (a == Literal(0))),
+    Rule('zero-power', Bin(Op.EXPONENT, Lit(0), _B), lambda b: Literal(0.0)),
+])
+stats.current.register_rules('simplify', SIMPLIFY_RULES)
+
+def _simplify(node: Expr):
+    if isinstance(node, Let):
+        return Let(tuple((name, simplify(value)) for name, value in node.bindings), simplify(node.body))
+    return SIMPLIFY_RULES.rewrite(node, simplify)
+
+def nth_derivative(node: Expr, var_name: str, order: int = 1):
+    """Simplified `order`-th derivative; each intermediate order is memoised."""
+    if persistent_cache is None:
+        return _nth_derivative(node, var_name, order)
 
+    kind = 'expanded-derivative' if expand_polynomials else 'derivative'
+    result = persistent_cache.derivative(node, var_name, order, kind)
+    if result is None:
+        result = _nth_derivative(node, var_name, order)
+        persistent_cache.put_derivative(node, var_name, order, result, kind)
+    return result
+
+def _nth_derivative(node: Expr, var_name: str, order: int):
+    if expand_polynomials:
+        import polynomial
+        for _ in range(order):
+            if stats.enabled:
+                node = stats.current.timed('differentiate', polynomial.differentiate, node, var_name)
+            else:
+                node = polynomial.differentiate(node, var_name)
+        return node
+
+    for _ in range(order):
+        if stats.enabled:
+            derivative = stats.current.timed('differentiate', differentiate, node, var_name)
+            node = stats.current.timed('simplify', simplify, derivative)
+            stats.current.simplified(derivative, node)
+        else:
+            node = simplify(differentiate(node, var_name))
     return node
-        
\ No newline at end of file
+
+def free_variables(node: Expr):
+    if isinstance(node, Variable):
+        return {node.name}
+    if isinstance(node, UnaryOp):
+        return free_variables(node.operand)
+    if isinstance(node, Operator):
+        return free_variables(node.left) | free_variables(node.right)
+    if isinstance(node, Diff):
+        return free_variables(node.expression)
+    if isinstance(node, Let):
+        names = free_variables(node.body)
+        for name, value in reversed(node.bindings):
+            names.discard(name)
+            names |= free_variables(value)
+        return names
+    return set()
+
+_ZERO = Literal(0.0)
+_ONE = Literal(1.0)
+
+def _gradient(node: Expr, variables, memo):
+    # Returns one derivative per variable. Zero derivatives are the shared _ZERO
+    # node, which lets the rules skip operands that do not depend on a variable.
+    if isinstance(node, Literal):
+        return (_ZERO,) * len(variables)
+
+    if isinstance(node, Variable):
+        return tuple(_ONE if name == node.name else _ZERO for name in variables)
+
+    entry = memo.get(id(node))
+    if entry is not None:
+        return entry[1]
+
+    if isinstance(node, Diff):
+        expanded = hashcons(nth_derivative(node.expression, node.var, node.order))
+        result = _gradient(expanded, variables, memo)
+
+    elif isinstance(node, Let):
+        result = _gradient(hashcons(expand(node)), variables, memo)
+
+    elif isinstance(node, UnaryOp):
+        result = tuple(d if d is _ZERO else UnaryOp(node.op, d)
+                       for d in _gradient(node.operand, variables, memo))
+
+    elif isinstance(node, Operator):
+        left = _gradient(node.left, variables, memo)
+        right = _gradient(node.right, variables, memo)
+        result = tuple(_ZERO if du is _ZERO and dv is _ZERO else _operator_rule(node, du, dv)
+                       for du, dv in zip(left, right))
+
+    else:
+        raise ValueError(f"Differentiation not implemented for node: {node}")
+
+    # Keep the node alive so its id cannot be reused while the memo exists.
+    memo[id(node)] = (node, result)
+    return result
+
+def grad(node: Expr, variables=None):
+    """Simplified partial derivatives of `node`, one per variable, from a single walk.
+
+    Variables default to the free variables of `node` in sorted order.
+    """
+    if variables is None:
+        variables = sorted(free_variables(node))
+    return [simplify(d) for d in _gradient(hashcons(node), tuple(variables), {})]
+
+def jacobian(nodes, variables=None):
+    """Rows of simplified partial derivatives, sharing work across all of `nodes`."""
+    if variables is None:
+        variables = sorted(set().union(*(free_variables(node) for node in nodes)))
+
+    memo = {}
+    return [[simplify(d) for d in _gradient(hashcons(node), tuple(variables), memo)]
+            for node in nodes]
@@ -150,6 +150,94 @@ class TestPipeline(unittest.TestCase):
         expected = Operator(Op.ADD, X, X)
         self.assertEqual(simplify(derivative_tree), expected)
 
+class TestMemoisation(unittest.TestCase):
+    """Tests the memo tables behind differentiate and simplify."""
+
+    def setUp(self):
+        clear_caches()
+
+    def tearDown(self):
+        configure_caches(differentiate_size=4096, simplify_size=4096)
+
+    def test_30_repeated_differentiate_hits_cache(self):
+        """A second d/dx(x * x) should be served from the memo table."""
+        expr = Operator(Op.MULTIPLY, X, X)
+        first = differentiate(expr, 'x')
+        second = differentiate(Operator(Op.MULTIPLY, X, X), 'x')
+        self.assertIs(first, second)
+        self.assertEqual(cache_info()['differentiate'].hits, 1)
+
+    def test_31_cache_is_keyed_on_variable(self):
+        """d/dx and d/dy of the same node are cached separately."""
+        expr = Operator(Op.MULTIPLY, X, Y)
+        self.assertNotEqual(differentiate(expr, 'x'), differentiate(expr, 'y'))
+
+    def test_32_shared_subtrees_simplified_once(self):
+        """A subtree repeated on both sides is simplified only once."""
+        shared = Operator(Op.ADD, X, L0)
+        simplify(Operator(Op.MULTIPLY, shared, shared))
+        self.assertEqual(cache_info()['simplify'].hits, 1)
+
+    def test_33_cache_size_is_bounded(self):
+        """The memo tables never grow past their configured size."""
+        configure_caches(differentiate_size=2, simplify_size=2)
+        expr = X
+        for _ in range(10):
+            expr = Operator(Op.MULTIPLY, expr, X)
+        simplify(differentiate(expr, 'x'))
+        self.assertLessEqual(cache_info()['differentiate'].currsize, 2)
+        self.assertLessEqual(cache_info()['simplify'].currsize, 2)
+
+    def test_34_int_and_float_literals_cached_separately(self):
+        """Memoised results keep the literal types of their own input."""
+        simplify(Operator(Op.MULTIPLY, L2, X))
+        result = simplify(Operator(Op.MULTIPLY, Literal(2.0), X))
+        self.assertEqual(repr(result), "(2.0 * x)")
+
+class TestHigherOrder(unittest.TestCase):
+    """Tests higher-order derivatives, gradients and Jacobians."""
+
+    POINT = {'x': 1.5, 'y': -2.0, 'z': 0.5}
+
+    def assertSameValue(self, first, second):
+        self.assertAlmostEqual(partial_eval(first, self.POINT), partial_eval(second, self.POINT))
+
+    def test_40_nth_derivative(self):
+        """d2/dx2(x^3) should be 3 * (2 * x)."""
+        expr = Operator(Op.EXPONENT, X, L3)
+        self.assertEqual(nth_derivative(expr, 'x', 2), Operator(Op.MULTIPLY, L3, Operator(Op.MULTIPLY, L2, X)))
+
+    def test_41_differentiate_diff_node(self):
+        """d/dx(Diff(x^3, x)) should equal the second derivative."""
+        expr = Operator(Op.EXPONENT, X, L3)
+        self.assertEqual(simplify(differentiate(Diff(expr, 'x'), 'x')), nth_derivative(expr, 'x', 2))
+
+    def test_42_grad_matches_per_variable_derivatives(self):
+        """grad(x^2 * y / (x + z)) agrees with differentiate for every variable."""
+        expr = Operator(Op.DIVIDE,
+                        Operator(Op.MULTIPLY, Operator(Op.EXPONENT, X, L2), Y),
+                        Operator(Op.ADD, X, Variable('z')))
+        partials = grad(expr)
+        self.assertEqual(len(partials), 3)
+        for name, partial in zip(['x', 'y', 'z'], partials):
+            self.assertSameValue(partial, simplify(differentiate(expr, name)))
+
+    def test_43_grad_of_absent_variable_is_zero(self):
+        """Partials for variables that do not appear are 0."""
+        self.assertEqual(grad(Operator(Op.MULTIPLY, X, L2), ['x', 'y']), [L2, L0])
+
+    def test_44_grad_of_product(self):
+        """grad((x + 1) * (y + 1)) should be [y + 1, x + 1]."""
+        product = Operator(Op.MULTIPLY, Operator(Op.ADD, X, L1), Operator(Op.ADD, Y, L1))
+        d_dx, d_dy = grad(product, ['x', 'y'])
+        self.assertEqual(d_dx, Operator(Op.ADD, Y, L1))
+        self.assertEqual(d_dy, Operator(Op.ADD, X, L1))
+
+    def test_45_jacobian(self):
+        """jacobian([x * y, x + y]) should be [[y, x], [1, 1]]."""
+        rows = jacobian([Operator(Op.MULTIPLY, X, Y), Operator(Op.ADD, X, Y)])
+        self.assertEqual(rows, [[Y, X], [Literal(1.0), Literal(1.0)]])
+
 
 if __name__ == '__main__':
     # Running with high verbosity to see all test details
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from ast_eval import AST_NODE_TYPES
+import frontend
+from symbolic import free_variables
+from vectorised import evaluate_batch
+
+# Grid points evaluated per chunk; memory use is a small multiple of this.
+CHUNK_SIZE = 1 << 20
+
+FORMATS = ('npy', 'raw')
+
+def progress_path(path):
+    """The sidecar file recording how far a tabulation into `path` has got."""
+    return path + ".progress"
+
+def tabulate(expression, ranges, steps, path, format='npy', chunk_size=CHUNK_SIZE, resume=True,
+             progress=None):
+    """Evaluate `expression` over a regular grid and write the values to `path`.
+
+    `ranges` maps each grid variable, in axis order, to its (start, stop)
+    interval; `steps` is the number of evenly spaced points per axis, either
+    one count for all of them or one per variable. The expression (a string or
+    tree) is parsed, differentiated and simplified once, then evaluated chunk by
+    chunk into a float64 file of shape (steps...) in C order: a .npy file, or
+    headerless values with `format='raw'`. The output is memory-mapped, so only
+    one chunk is ever held in memory.
+
+    After each chunk the file is flushed and the number of finished points is
+    recorded in progress_path(path). With `resume`, a run with the same
+    expression and grid picks up from there; the sidecar is removed once the
+    grid is complete. `progress`, if given, is called as progress(done, total)
+    after every chunk. Returns the memory-mapped output.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown output format '{format}'")
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+
+    tree = frontend.compile(expression) if isinstance(expression, str) else expression
+    result = frontend.evaluate_tree(tree)
+    axes = _axes(ranges, steps)
+    if isinstance(result, AST_NODE_TYPES):
+        unbound = free_variables(result) - {name for name, _ in axes}
+        if unbound:
+            raise ValueError(f"No range given for variable '{min(unbound)}'")
+
+    shape = tuple(len(values) for _, values in axes)
+    total = int(np.prod(shape, dtype=np.int64))
+    header = {
+        'expression': repr(tree),
+        'ranges': [[name, float(values[0]), float(values[-1]), len(values)] for name, values in axes],
+        'format': format,
+    }
+
+    done = _resumed(path, header) if resume else 0
+    mode = 'r+' if done else 'w+'
+    if format == 'npy':
+        output = np.lib.format.open_memmap(path, mode=mode, dtype=np.float64, shape=shape)
+    else:
+        output = np.memmap(path, dtype=np.float64, mode=mode, shape=shape)
+    flat = output.reshape(-1)
+
+    while done < total:
+        stop = min(done + chunk_size, total)
+        indices = np.unravel_index(np.arange(done, stop), shape)
+        bindings = {name: values[index] for (name, values), index in zip(axes, indices)}
+        flat[done:stop] = evaluate_batch(result, **bindings) if isinstance(result, AST_NODE_TYPES) else result
+
+        # Data first, then the record of it, so the sidecar never runs ahead of the file.
+        output.flush()
+        done = stop
+        _save_progress(path, dict(header, done=done))
+        if progress is not None:
+            progress(done, total)
+
+    os.remove(progress_path(path))
+    return output
+
+def _axes(ranges, steps):
+    if not ranges:
+        raise ValueError("At least one variable range is needed")
+    counts = [steps] * len(ranges) if isinstance(steps, int) else list(steps)
+    if len(counts) != len(ranges):
+        raise ValueError(f"Expected 1 or {len(ranges)} step counts, got {len(counts)}")
+
+    axes = []
+    for (name, (start, stop)), count in zip(ranges.items(), counts):
+        if count < 1:
+            raise ValueError(f"Step count for '{name}' must be positive")
+        axes.append((name, np.linspace(start, stop, count)))
+    return axes
+
+def _resumed(path, header):
+    """Points already written by an interrupted run matching `header`, else 0."""
+    try:
+        with open(progress_path(path)) as sidecar:
+            saved = json.load(sidecar)
+    except FileNotFoundError:
+        return 0
+
+    done = saved.pop('done')
+    if saved != header:
+        raise ValueError(f"'{path}' holds an interrupted tabulation of a different expression or grid; "
+                         f"delete it or pass resume=False")
+    if not os.path.exists(path):
+        return 0
+    return done
+
+def _save_progress(path, record):
+    # Write then rename, so an interruption leaves the old record or the new one.
+    temporary = progress_path(path) + ".tmp"
+    with open(temporary, 'w') as sidecar:
+        json.dump(record, sidecar)
+    os.replace(temporary, progress_path(path))
+
+def _range(text):
+    name, separator, interval = text.partition('=')
+    start, colon, stop = interval.partition(':')
+    if not separator or not colon:
+        raise argparse.ArgumentTypeError(f"expected NAME=START:STOP, got '{text}'")
+    try:
+        return name.strip(), (float(start), float(stop))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected numbers in '{text}'")
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Tabulate an expression over a grid into a file")
+    arg_parser.add_argument('expression')
+    arg_parser.add_argument('ranges', metavar='NAME=START:STOP', nargs='+', type=_range,
+                            help="one grid axis per variable, in order")
+    arg_parser.add_argument('--steps', required=True,
+                            help="points per axis: one count, or comma-separated counts per variable")
+    arg_parser.add_argument('--out', required=True, metavar='PATH')
+    arg_parser.add_argument('--format', choices=FORMATS, default='npy',
+                            help="a .npy file, or raw float64 values in C order")
+    arg_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="grid points per chunk")
+    arg_parser.add_argument('--restart', action='store_true',
+                            help="start over instead of resuming an interrupted run")
+    args = arg_parser.parse_args(argv)
+
+    steps = [int(count) for count in args.steps.split(',')]
+    def report(done, total):
+        print(f"\r{done}/{total} points ({done / total:.1%})", end='', file=sys.stderr, flush=True)
+
+    try:
+        tabulate(args.expression, dict(args.ranges), steps[0] if len(steps) == 1 else steps, args.out,
+                 args.format, args.chunk_size, resume=not args.restart, progress=report)
+    except (ValueError, ZeroDivisionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
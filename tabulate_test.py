@@ -0,0 +1,97 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+if HAS_NUMPY:
+    import numpy as np
+    from tabulate import *
+
+
+class Interrupted(Exception):
+    pass
+
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+class TestTabulate(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "grid.npy")
+
+    def expected(self, function, *axes):
+        return function(*np.meshgrid(*axes, indexing='ij'))
+
+    def test_writes_npy_grid(self):
+        tabulate("x * y - y ^ 2", {'x': (0, 1), 'y': (-1, 1)}, (5, 4), self.path, chunk_size=3)
+        expected = self.expected(lambda x, y: x * y - y ** 2, np.linspace(0, 1, 5), np.linspace(-1, 1, 4))
+        np.testing.assert_allclose(np.load(self.path), expected)
+        self.assertFalse(os.path.exists(progress_path(self.path)))
+
+    def test_writes_raw_grid_of_a_derivative(self):
+        tabulate("diff(x ^ 3 * y, x)", {'x': (0, 2), 'y': (1, 3), 'z': (0, 1)}, 3, self.path,
+                 format='raw', chunk_size=4)
+        expected = self.expected(lambda x, y, z: 3 * x ** 2 * y + 0 * z, *[np.linspace(0, 2, 3),
+                                 np.linspace(1, 3, 3), np.linspace(0, 1, 3)])
+        np.testing.assert_allclose(np.fromfile(self.path).reshape(3, 3, 3), expected)
+
+    def test_constant_and_undefined_points(self):
+        tabulate("2 ^ 3", {'x': (0, 1)}, 4, self.path)
+        self.assertEqual(np.load(self.path).tolist(), [8.0] * 4)
+        tabulate("1 / x", {'x': (0, 1)}, 2, self.path)
+        self.assertEqual(np.isnan(np.load(self.path)).tolist(), [True, False])
+        # Simplifying x * y / x to y must not make x = 0 defined.
+        tabulate("x * y / x", {'x': (0, 1), 'y': (2, 3)}, 2, self.path)
+        self.assertEqual(np.isnan(np.load(self.path)).tolist(), [[True, True], [False, False]])
+
+    def test_resumes_from_last_completed_chunk(self):
+        def interrupt(done, total):
+            if done == 6:
+                raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            tabulate("x + 10 * y", {'x': (0, 3), 'y': (0, 2)}, (4, 3), self.path, chunk_size=3, progress=interrupt)
+        with open(progress_path(self.path)) as sidecar:
+            self.assertEqual(json.load(sidecar)['done'], 6)
+
+        reports = []
+        tabulate("x + 10 * y", {'x': (0, 3), 'y': (0, 2)}, (4, 3), self.path, chunk_size=3,
+                 progress=lambda done, total: reports.append(done))
+        self.assertEqual(reports, [9, 12])
+        self.assertEqual(np.load(self.path).tolist(), [[x + 10 * y for y in range(3)] for x in range(4)])
+        self.assertFalse(os.path.exists(progress_path(self.path)))
+
+    def test_refuses_to_resume_a_different_grid(self):
+        def interrupt(done, total):
+            raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            tabulate("x", {'x': (0, 1)}, 10, self.path, chunk_size=2, progress=interrupt)
+        with self.assertRaises(ValueError):
+            tabulate("x", {'x': (0, 2)}, 10, self.path)
+        tabulate("x", {'x': (0, 2)}, 3, self.path, resume=False)
+        self.assertEqual(np.load(self.path).tolist(), [0.0, 1.0, 2.0])
+
+    def test_rejects_unbound_variables(self):
+        with self.assertRaises(ValueError):
+            tabulate("x * y", {'x': (0, 1)}, 2, self.path)
+        with self.assertRaises(ValueError):
+            tabulate("x", {'x': (0, 1)}, (2, 3), self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_command_line(self):
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            status = main(["x * y", "x=0:1", "y=0:2", "--steps", "2,3", "--out", self.path, "--chunk-size", "4"])
+        self.assertEqual(status, 0)
+        self.assertIn("6/6 points", err.getvalue())
+        self.assertEqual(np.load(self.path).tolist(), [[0.0, 0.0, 0.0], [0.0, 1.0, 2.0]])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
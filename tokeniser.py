@@ -1,56 +1,84 @@
-from ast_eval import *
+import re
+
+from ast_eval import Literal, Op, Variable
+
+_OPS = {member.value: member for member in Op}
+
+# Leading spaces are consumed with each token; the match's lastindex says which
+# alternative fired. A run of digits and dots that is not a well-formed number
+# is caught by the MALFORMED group, and anything else unrecognised by UNKNOWN.
+_TOKEN_RE = re.compile(r"""
+    \ *(?:
+        ([-+*/^(),])                                        # 1: operator
+      | ([0-9]+(?:\.[0-9]*)?(?![0-9.])|\.[0-9]+(?![0-9.]))  # 2: number
+      | ([^\W\d_][^\W_]*)                                   # 3: identifier
+      | ([0-9.]+)                                           # 4: malformed number
+      | (.)                                                 # 5: unknown character
+      | $                                                   # trailing spaces
+    )
+""", re.VERBOSE | re.DOTALL)
+
+_OP, _NUMBER, _IDENTIFIER, _MALFORMED, _UNKNOWN = range(1, 6)
+
+# Splits text into candidate token spellings without validating them, for the
+# list-building fast path in Tokeniser.tokenise.
+_SPLIT_RE = re.compile(r" *([-+*/^(),]|[0-9.]+|[^\W\d_][^\W_]*|.)", re.DOTALL)
+_DIGITS = frozenset("0123456789.")
 
 class Tokeniser:
     def __init__(self, text):
         self.text = text
         self.pos = 0
-        self.current_char = self.text[0] if text else None
-
-    def advance(self):
-        self.pos += 1
-        if self.pos < len(self.text):
-            self.current_char = self.text[self.pos]
-        else:
-            self.current_char = None
 
     def tokenise(self):
-        tokens = []
-        valid_ops = {member.value for member in Op}
-
-        while self.current_char is not None:
+        spellings = _SPLIT_RE.findall(self.text, self.pos)
 
-            if self.current_char == " ":
-                self.advance()
+        # Each distinct spelling is classified once, then mapped in bulk.
+        tokens = dict(_OPS)
+        for text in set(spellings).difference(tokens):
+            first = text[0]
+            if first in _DIGITS:
+                # A run of digits and dots is a number exactly when float()
+                # accepts it, which is cheaper than matching it again.
+                try:
+                    tokens[text] = Literal(float(text))
+                    continue
+                except ValueError:
+                    pass
+            elif first.isalpha():
+                tokens[text] = Variable(text)
                 continue
+            # Rescan token by token to report the offending position.
+            return list(self.iter_tokenise())
 
-            if self.current_char in valid_ops:
-                tokens.append(Op(self.current_char))
-                self.advance()
-                continue
+        self.pos = len(self.text)
+        return list(map(tokens.__getitem__, spellings))
 
-            if self.current_char in "0123456789.":
-                tokens.append(Literal(self.find_literal()))
-                continue
+    def iter_tokenise(self, positions=False):
+        """Lazily yield tokens, or (position, token) pairs when `positions` is set."""
+        # Tokens are immutable, so repeated spellings share one token object.
+        seen = dict(_OPS)
 
-            if self.current_char.isalpha():
-                name = self.find_identifier()
-                tokens.append(Variable(name))
-                continue
+        for match in _TOKEN_RE.finditer(self.text, self.pos):
+            kind = match.lastindex
+            if kind is None:
+                break
 
-            raise ValueError(f"Unknown character '{self.current_char}' at position {self.pos}")
+            text = match.group(kind)
+            self.pos = match.start(kind)
 
-        return tokens
+            token = seen.get(text)
+            if token is None:
+                if kind == _NUMBER:
+                    token = Literal(float(text))
+                elif kind == _IDENTIFIER:
+                    token = Variable(text)
+                elif kind == _MALFORMED:
+                    raise ValueError(f"Malformed number '{text}' at position {self.pos}")
+                else:
+                    raise ValueError(f"Unknown character '{text}' at position {self.pos}")
+                seen[text] = token
 
-    def find_literal(self):
-        literal = []
-        while self.current_char is not None and self.current_char in "0123456789.":
-            literal.append(self.current_char)
-            self.advance()
-        return float("".join(literal))
+            yield (self.pos, token) if positions else token
 
-    def find_identifier(self):
-        chars = []
-        while self.current_char is not None and self.current_char.isalnum():
-            chars.append(self.current_char)
-            self.advance()
-        return "".join(chars)
\ No newline at end of file
+        self.pos = len(self.text)
@@ -44,6 +44,37 @@ class TestASTEval(unittest.TestCase):
         
         self.assertEqual(tokeniser.tokenise(), expected_tokens)
 
+    def test_rejects_malformed_number(self):
+        tokeniser = Tokeniser("1 + 1.2.3")
+        with self.assertRaisesRegex(ValueError, "Malformed number '1.2.3' at position 4"):
+            tokeniser.tokenise()
+
+    def test_rejects_unknown_character(self):
+        tokeniser = Tokeniser("2 # 3")
+        with self.assertRaisesRegex(ValueError, "Unknown character '#' at position 2"):
+            tokeniser.tokenise()
+
+    def test_can_iterate_tokens_with_positions(self):
+        tokeniser = Tokeniser("diff(x1, x)")
+        expected = [
+            (0, Variable('diff')),
+            (4, Op.LPAREN),
+            (5, Variable('x1')),
+            (7, Op.COMMA),
+            (9, Variable('x')),
+            (10, Op.RPAREN)
+        ]
+        self.assertEqual(list(tokeniser.iter_tokenise(positions=True)), expected)
+
+    def test_iteration_is_lazy(self):
+        tokens = Tokeniser("1 + 2 # 3").iter_tokenise()
+        self.assertEqual(next(tokens), Literal(1.0))
+        self.assertEqual(next(tokens), Op.ADD)
+
+    def test_iteration_matches_tokenise(self):
+        expr = "  (x1 ^ -2.5) * .5/ y  "
+        self.assertEqual(list(Tokeniser(expr).iter_tokenise()), Tokeniser(expr).tokenise())
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)
\ No newline at end of file
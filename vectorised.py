@@ -0,0 +1,71 @@
+import numpy as np
+
+from ast_eval import *
+
+def evaluate_batch(ast, **bindings):
+    """Evaluate an expression over arrays of variable values in one call.
+
+    Each keyword binds a variable name to an array (or scalar); the bindings
+    are broadcast together and the result has their common shape. Division by
+    zero, including 0 raised to a negative power, produces NaN in the affected
+    elements instead of raising.
+    """
+    arrays = {name: np.asarray(value, dtype=float) for name, value in bindings.items()}
+    shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        result = _evaluate(ast, arrays, {})
+
+    return np.broadcast_to(result, shape).astype(float, copy=True)
+
+def _evaluate(node, arrays, memo):
+    if isinstance(node, Literal):
+        return np.float64(node.value)
+
+    if isinstance(node, Variable):
+        if node.name not in arrays:
+            raise ValueError(f"No values bound for variable '{node.name}'")
+        return arrays[node.name]
+
+    if isinstance(node, Let):
+        # The memo is keyed by structure, so a subtree reading a temporary must
+        # not be reused under another binding of the same name.
+        arrays, memo = dict(arrays), {}
+        for name, value in node.bindings:
+            arrays[name] = _evaluate(value, arrays, memo)
+        return _evaluate(node.body, arrays, memo)
+
+    if node in memo:
+        return memo[node]
+
+    if isinstance(node, UnaryOp):
+        operand = _evaluate(node.operand, arrays, memo)
+        result = np.negative(operand) if node.op == Op.SUBTRACT else operand
+
+    elif isinstance(node, Operator):
+        left = _evaluate(node.left, arrays, memo)
+        right = _evaluate(node.right, arrays, memo)
+
+        if node.op == Op.ADD:
+            result = np.add(left, right)
+        elif node.op == Op.SUBTRACT:
+            result = np.subtract(left, right)
+        elif node.op == Op.MULTIPLY:
+            result = np.multiply(left, right)
+        elif node.op == Op.DIVIDE:
+            result = np.where(right == 0, np.nan, np.divide(left, right))
+        elif node.op == Op.EXPONENT:
+            # 0 ^ -n divides by zero, so it is NaN like 1 / 0 rather than inf.
+            result = np.where((left == 0) & (right < 0), np.nan, np.power(left, right))
+        else:
+            raise ValueError(f"Cannot evaluate operator: {node.op}")
+
+    elif isinstance(node, Diff):
+        from symbolic import nth_derivative
+        result = _evaluate(nth_derivative(node.expression, node.var, node.order), arrays, memo)
+
+    else:
+        raise TypeError(f"Unknown expression type: {type(node)}")
+
+    memo[node] = result
+    return result
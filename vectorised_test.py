@@ -0,0 +1,66 @@
+import importlib.util
+import math
+import unittest
+
+from ast_eval import *
+from symbolic import differentiate
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+if HAS_NUMPY:
+    import numpy as np
+    from vectorised import *
+
+X = Variable('x')
+Y = Variable('y')
+
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+class TestVectorised(unittest.TestCase):
+
+    def test_can_evaluate_over_array(self):
+        expr = Operator(Op.ADD, Operator(Op.EXPONENT, X, Literal(2)), Literal(1))
+        result = evaluate_batch(expr, x=np.array([0.0, 1.0, 2.0]))
+        self.assertEqual(result.tolist(), [1.0, 2.0, 5.0])
+
+    def test_can_evaluate_two_variables(self):
+        expr = Operator(Op.SUBTRACT, Operator(Op.MULTIPLY, X, Y), UnaryOp(Op.SUBTRACT, Y))
+        result = evaluate_batch(expr, x=[1, 2, 3], y=[4, 5, 6])
+        self.assertEqual(result.tolist(), [8.0, 15.0, 24.0])
+
+    def test_constant_expression_is_broadcast(self):
+        result = evaluate_batch(Literal(3), x=np.zeros(4))
+        self.assertEqual(result.tolist(), [3.0] * 4)
+
+    def test_divide_by_zero_gives_nan_per_element(self):
+        expr = Operator(Op.DIVIDE, Literal(1), X)
+        result = evaluate_batch(expr, x=[2.0, 0.0, -4.0])
+        self.assertEqual(result[0], 0.5)
+        self.assertTrue(math.isnan(result[1]))
+        self.assertEqual(result[2], -0.25)
+
+    def test_negative_power_of_zero_gives_nan_like_division(self):
+        expr = Operator(Op.EXPONENT, X, Literal(-1))
+        result = evaluate_batch(expr, x=[2.0, 0.0, -4.0])
+        self.assertEqual(result[0], 0.5)
+        self.assertTrue(math.isnan(result[1]))
+        self.assertEqual(result[2], -0.25)
+        self.assertEqual(evaluate_batch(Operator(Op.EXPONENT, X, Literal(2)), x=[0.0]).tolist(), [0.0])
+
+    def test_can_evaluate_derivative(self):
+        expr = differentiate(Operator(Op.MULTIPLY, X, X), 'x')
+        result = evaluate_batch(expr, x=[1.0, 2.0, 3.0])
+        self.assertEqual(result.tolist(), [2.0, 4.0, 6.0])
+
+    def test_can_evaluate_diff_node(self):
+        expr = Diff(Operator(Op.EXPONENT, X, Literal(3)), 'x')
+        result = evaluate_batch(expr, x=[1.0, 2.0])
+        self.assertEqual(result.tolist(), [3.0, 12.0])
+
+    def test_unbound_variable_raises(self):
+        with self.assertRaises(ValueError):
+            evaluate_batch(Operator(Op.ADD, X, Y), x=[1.0])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False, verbosity=2)